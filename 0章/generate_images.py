@@ -4,14 +4,39 @@ Gemini API を使用して画像を生成するスクリプト
 モデル: gemini-3-pro-image-preview
 """
 
+import argparse
+import functools
 import os
 import json
 import time
-import urllib.request
 import urllib.parse
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from asset_manifest import load_manifest, split_only
+from file_utils import atomic_write, file_sha256, remove_stale_temp_files
+from generate_placeholder_images import forget_placeholders, is_placeholder, load_placeholder_manifest
+from generation_cache import GenerationCache, generation_key
+from http_client import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, configure_client, get_client
+)
+from inline_data_stream import CHUNK_SIZE, NoImageData, stream_inline_data
+from job_journal import DONE, FAILED, IN_FLIGHT, JOURNAL_DIR, PENDING, JobJournal
+from metrics import ImageMetrics, MetricsRecorder
+from optimize_images import optimize_batch, print_results
+from rate_limiter import TokenBucket
+from retry_policy import (
+    DEFAULT_BREAKER_COOLDOWN, DEFAULT_BREAKER_THRESHOLD, CircuitBreaker, RetryPolicy,
+    parse_retry_after
+)
+from validate_images import EXTENSION_FORMATS, InvalidImage, check_or_quarantine, probe_image, quarantine
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow が無ければ形式違いの画像は変換せずに失敗とする
+    Image = None
+
 # .envファイルを直接読み込み
 def load_env():
     env_path = Path(__file__).parent / '.env'
@@ -25,146 +50,131 @@ def load_env():
                     env_vars[key.strip()] = value.strip()
     return env_vars
 
-env_vars = load_env()
 
-# APIキーを取得
-API_KEY = env_vars.get('GEMINI_API')
-if not API_KEY:
-    raise ValueError("GEMINI_API key not found in .env file")
+@functools.lru_cache(maxsize=None)
+def get_api_key():
+    """
+    APIキーを取得（.env になければ環境変数を参照）
+    import 時ではなく、最初にAPIを呼ぶときに読み込む
+    """
+    api_key = load_env().get('GEMINI_API') or os.environ.get('GEMINI_API')
+    if not api_key:
+        raise ValueError("GEMINI_API key not found in .env file")
+    return api_key
+
 
 # 画像保存先ディレクトリ
 IMAGES_DIR = Path(__file__).parent / "images"
-IMAGES_DIR.mkdir(exist_ok=True)
 
 # Gemini API エンドポイント
 # gemini-2.5-flash-image を使用
-API_ENDPOINT = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-image:generateContent?key={API_KEY}"
-
-# 画像生成プロンプトのリスト
-IMAGE_PROMPTS = [
-    {
-        "filename": "hero-bg.jpg",
-        "prompt": "A warm and inviting acupuncture treatment room with soft natural light streaming through windows. A patient lying peacefully on a treatment bed while a compassionate therapist stands beside them with a gentle expression. Warm tones, professional medical setting, blurred background effect, photorealistic style, 1920x1080 resolution.",
-        "size": "1920x1080"
-    },
-    {
-        "filename": "problem-therapist.jpg",
-        "prompt": "A Japanese therapist looking worried and stressed, sitting at a desk with elbows on the table, hand on forehead. Medical charts and papers scattered on the desk. Light coming from a window creating a sense of solitude. Monochrome or desaturated colors, photorealistic style, 1200x800 resolution.",
-        "size": "1200x800"
-    },
-    {
-        "filename": "profile-toyoda.jpg",
-        "prompt": "Professional portrait of a Japanese male acupuncturist in his 40s named Toyoda. Warm and gentle smile, wearing white medical coat or clean professional attire. Chest-up shot against a clean white background or subtle treatment room background. Conveys warmth and trustworthiness, photorealistic style, 800x800 resolution, square format.",
-        "size": "800x800"
-    },
-    {
-        "filename": "story-sunset.jpg",
-        "prompt": "Silhouette of a lone therapist standing by a window at sunset. Beautiful orange and purple sunset visible through the window. Figure in contemplation, conveying both solitude and determination. Cinematic photography style, dramatic lighting, 1200x800 resolution.",
-        "size": "1200x800"
-    },
-    {
-        "filename": "5-layers-diagram.jpg",
-        "prompt": "Infographic diagram showing 5 layers of the mind in a pyramid structure. From surface to deep: 1) Cognitive distortions (thinking patterns), 2) Schema (unconscious negative self-image), 3) Meta-cognition (ability to view oneself objectively), 4) Psychological tunnel vision (lack of mental space), 5) Self-acceptance (accepting oneself as is). Arrows connecting layers showing relationships. Clean modern design, blue and orange color scheme, simple and clear, 1000x800 resolution.",
-        "size": "1000x800"
-    },
-    {
-        "filename": "mind-flow-diagram.jpg",
-        "prompt": "Flowchart diagram showing the flow of mental processes: Cognition → Emotion → Mental distress → Autonomic nervous system disruption → Physical symptoms. Each stage with brief explanatory text. Arrows showing the flow. Clean infographic style, blue and orange color scheme, simple and clear, 1000x600 resolution.",
-        "size": "1000x600"
-    },
-    {
-        "filename": "counseling-illustration.jpg",
-        "prompt": "Gentle illustration of a Japanese therapist and patient facing each other. The patient has tears in her eyes while speaking, therapist listening with compassion and kindness. Warm colors, soft artistic style, conveys emotional release and trust, illustrated or soft photographic style, 1000x800 resolution.",
-        "size": "1000x800"
-    },
-    {
-        "filename": "before-after-comparison.jpg",
-        "prompt": "Before and after comparison image split in two halves. LEFT: Dark mood, therapist and patient with strained expressions, feeling disconnected. RIGHT: Bright mood, therapist and patient smiling and engaged in conversation. Arrow showing transformation from left to right. Illustrated or photo composite style, 1200x600 resolution.",
-        "size": "1200x600"
-    },
-    {
-        "filename": "case1-stage1.jpg",
-        "prompt": "Japanese woman in her late 20s with an unnaturally bright smile but eyes that don't match the smile. Expression conveys tension and forced cheerfulness. Soft illustration or photographic style, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage2.jpg",
-        "prompt": "Dark-toned abstract illustration showing a young child being scolded. Heavy and oppressive mood representing a difficult past. Monochrome or sepia tone, artistic illustration style, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage3.jpg",
-        "prompt": "Three-stage facial expression transformation of a Japanese woman shown side by side: 1) Bright smile, 2) Tense expression, 3) Tears flowing. Comic or illustration style showing emotional progression, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage4.jpg",
-        "prompt": "Japanese woman speaking through tears while therapist watches over her kindly. Light streaming in creating bright tones. Conveys sense of emotional liberation. Soft illustration or photographic style, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage5.jpg",
-        "prompt": "Japanese woman with clear, hopeful expression walking forward. Bright colors and composition conveying hope. Light spreading in the background. Illustrated or cinematic photographic style, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "case2-symptoms.jpg",
-        "prompt": "Japanese woman in her 30s-40s with pained expression. Visual effects showing nausea, palpitations, and anxiety. Ripple-like effects emanating from the body representing discomfort. Dark color tones, illustration style, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "case2-assessment.jpg",
-        "prompt": "Diagram showing mental structure. Center shows 'I have no value' schema. Arrows radiating outward showing cognitive distortions. Text around the diagram reading 'I don't know my true self' and 'I don't know my value'. Infographic style, blue and orange color scheme, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "case2-future.jpg",
-        "prompt": "Japanese woman in her 30s-40s with bright hopeful expression, sitting at a desk studying. Atmosphere full of hope. Soft illustration or photographic style, 800x600 resolution.",
-        "size": "800x600"
-    },
-    {
-        "filename": "course-materials.jpg",
-        "prompt": "Flat lay photograph of course materials. Laptop, tablet, printed textbook, worksheets, and pen neatly arranged on clean white background. Shot from above, clean and professional educational setting, 1200x800 resolution.",
-        "size": "1200x800"
-    },
-    {
-        "filename": "online-learning.jpg",
-        "prompt": "Person viewing an online course on laptop or tablet. Screen shows instructor teaching. Textbooks and notebook visible nearby. Bright natural light, clean desk setting. Focus on hands and study materials, photorealistic style, 1200x800 resolution.",
-        "size": "1200x800"
-    },
-    {
-        "filename": "diverse-therapists.jpg",
-        "prompt": "Group of diverse Japanese healthcare professionals including acupuncturists and therapists. Various ages and genders, all in clean white coats with bright expressions. Professional atmosphere, photorealistic style, 1200x600 resolution.",
-        "size": "1200x600"
-    },
-    {
-        "filename": "toyoda-message.jpg",
-        "prompt": "Japanese male acupuncturist in his 40s with serious or gentle smile. Arms crossed or relaxed posture. Background is treatment room or naturally lit interior. Conveys trustworthiness and warmth, photorealistic portrait style, 800x1000 resolution, vertical format.",
-        "size": "800x1000"
-    },
-    {
-        "filename": "therapist-patient-handshake.jpg",
-        "prompt": "Japanese therapist and patient shaking hands with smiles. Warm lighting conveying trust and connection. Background blurred, focus on the people. Photorealistic style, 1200x800 resolution.",
-        "size": "1200x800"
-    },
-    {
-        "filename": "bright-future.jpg",
-        "prompt": "Bright treatment room with Japanese therapist confidently engaging with smiling patient. Sunlight streaming through windows conveying hope. Photorealistic style, 1200x800 resolution.",
-        "size": "1200x800"
-    },
-    {
-        "filename": "final-message-bg.jpg",
-        "prompt": "Treatment room interior with warm light streaming in, or silhouette of therapist walking forward. Composition conveying hope. Blurred background suitable for text overlay. Cinematic photography style, 1920x1080 resolution.",
-        "size": "1920x1080"
+# GEMINI_API_BASE で接続先を差し替え可能（mock_server.py での計測用）
+MODEL = "gemini-2.5-flash-image"
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com"
+
+
+def api_endpoint():
+    api_base = os.environ.get("GEMINI_API_BASE", DEFAULT_API_BASE)
+    return f"{api_base}/v1beta/models/{MODEL}:generateContent?key={get_api_key()}"
+
+
+# 生成設定（キャッシュキーにも含まれる）
+GENERATION_CONFIG = {
+    "response_mime_type": "image/jpeg"
+}
+
+# 並列実行の既定値（同時実行数と1分あたりのリクエスト上限）
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 30
+
+# APIリクエストのタイムアウト（秒）
+REQUEST_TIMEOUT = 60
+
+
+def image_prompts(only=None):
+    """
+    画像生成プロンプトのリスト（assets.json から読み込む）
+    """
+    return load_manifest().image_prompts(only)
+
+
+def generation_config_for(prompt_data):
+    """
+    生成設定（variant があれば seed として渡し、別の画像を生成させる）
+    """
+    if not prompt_data.get("variant"):
+        return GENERATION_CONFIG
+    return dict(GENERATION_CONFIG, seed=prompt_data["variant"])
+
+
+def build_request_body(prompt_data):
+    """
+    リクエストボディ（Gemini API形式）を生成
+    """
+    return {
+        "contents": [{
+            "parts": [{
+                "text": f"Generate an image: {prompt_data['prompt']}"
+            }]
+        }],
+        "generationConfig": generation_config_for(prompt_data)
     }
-]
 
 
-def generate_image(prompt_data, retry=3):
+def cache_key_for(prompt_data):
+    """
+    プロンプト定義からキャッシュキーを計算
+    """
+    return generation_key(MODEL, prompt_data["prompt"], generation_config_for(prompt_data),
+                          prompt_data.get("size", "1024x1024"))
+
+
+# 形式違いの画像を拡張子の形式に変換するときの保存設定
+CONVERT_OPTIONS = {
+    "jpeg": {"format": "JPEG", "quality": 95},
+    "png": {"format": "PNG"},
+    "webp": {"format": "WEBP", "quality": 95},
+}
+
+
+class UnconvertibleFormat(Exception):
+    """
+    指定と違う形式で返ってきて、変換もできない画像（再試行しても結果は変わらない）
+    """
+
+
+def convert_to_extension_format(path):
+    """
+    response_mime_type の指定と違う形式（JPEG 指定で PNG など）で保存された画像を、
+    拡張子の形式に変換する。変換した場合は元の形式を返す（同じ形式・壊れたデータは None）
+    """
+    path = Path(path)
+    expected = EXTENSION_FORMATS.get(path.suffix.lower())
+    info = probe_image(path)
+    if not info.complete or info.format == expected or info.format not in CONVERT_OPTIONS \
+            or expected not in CONVERT_OPTIONS:
+        return None
+    if Image is None:
+        problem = f"{info.format} data saved as {path.suffix} (install Pillow to convert)"
+        quarantine(path, [problem])
+        raise UnconvertibleFormat(problem)
+    with Image.open(path) as image:
+        image.load()
+        if expected == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        with atomic_write(path) as f:
+            image.save(f, **CONVERT_OPTIONS[expected])
+    return info.format
+
+
+def generate_image(prompt_data, retry=3, client=None, policy=None, metrics=None):
     """
     Gemini APIを使用して画像を生成
     """
     filename = prompt_data["filename"]
+    client = client or get_client()
+    policy = policy or RetryPolicy()
+    metrics = metrics or ImageMetrics(filename)
     prompt = prompt_data["prompt"]
     size = prompt_data.get("size", "1024x1024")
 
@@ -174,115 +184,317 @@ def generate_image(prompt_data, retry=3):
     print(f"Size: {size}")
 
     # リクエストボディ（Gemini API形式）
-    request_body = {
-        "contents": [{
-            "parts": [{
-                "text": f"Generate an image: {prompt}"
-            }]
-        }],
-        "generationConfig": {
-            "response_mime_type": "image/jpeg"
-        }
-    }
+    request_body = build_request_body(prompt_data)
 
     for attempt in range(retry):
+        error = None
+        retry_after = None
+        policy.before_attempt()
+        metrics.attempts += 1
         try:
             print(f"Attempt {attempt + 1}/{retry}...")
 
-            # APIリクエスト
-            req = urllib.request.Request(
-                API_ENDPOINT,
-                data=json.dumps(request_body).encode('utf-8'),
+            # APIリクエスト（接続はリトライ・画像間で再利用される）
+            with client.post(
+                api_endpoint(),
+                json.dumps(request_body).encode('utf-8'),
                 headers={
                     "Content-Type": "application/json"
                 }
-            )
-
-            with urllib.request.urlopen(req, timeout=60) as response:
-                response_data = json.loads(response.read().decode('utf-8'))
-
-                # Gemini APIのレスポンスから画像データを取得
-                if "candidates" in response_data and len(response_data["candidates"]) > 0:
-                    candidate = response_data["candidates"][0]
-
-                    if "content" in candidate and "parts" in candidate["content"]:
-                        parts = candidate["content"]["parts"]
-
-                        for part in parts:
-                            # インラインデータ（Base64）の場合
-                            if "inlineData" in part:
-                                import base64
-                                inline_data = part["inlineData"]
-                                if "data" in inline_data:
-                                    image_bytes = base64.b64decode(inline_data["data"])
-
-                                    # 画像を保存
-                                    output_path = IMAGES_DIR / filename
-                                    with open(output_path, "wb") as f:
-                                        f.write(image_bytes)
-
-                                    print(f"✓ Successfully saved: {output_path}")
-                                    return True
-                            # テキストレスポンスの場合（画像生成失敗の可能性）
-                            elif "text" in part:
-                                print(f"✗ Text response received: {part['text'][:100]}")
-
-                print(f"✗ No image data in response. Response structure: {list(response_data.keys())}")
-
+            ) as response:
+                # レスポンスを逐次解析し、Base64をデコードしながら一時ファイルへ書き込む
+                # 画像データが揃ったときだけ出力ファイルに置き換わる
+                output_path = IMAGES_DIR / filename
+                try:
+                    with atomic_write(output_path) as f:
+                        result = stream_inline_data(response.iter_chunks(CHUNK_SIZE), f)
+                        if not result.found:
+                            raise NoImageData(result)
+                finally:
+                    metrics.add_response(response)
+                metrics.decode += result.decode_time
+                metrics.write += result.write_time
+                # 指定と違う形式（JPEG 指定で PNG など）は作り直しても変わらないため、変換して使う
+                converted_from = convert_to_extension_format(output_path)
+                # 壊れたデータなどは隔離して作り直す
+                info, _ = check_or_quarantine(output_path, size)
+                policy.record(None)
+                converted = f", converted from {converted_from}" if converted_from else ""
+                print(f"✓ Successfully saved: {output_path} ({info.format} {info.size}{converted})")
+                return True
+
+        except UnconvertibleFormat as e:
+            print(f"✗ Not retrying {filename}: {e}")
+            return False
+        except InvalidImage as e:
+            print(f"✗ Invalid image quarantined: {'; '.join(e.problems)}")
+            error = e
+        except NoImageData as e:
+            # テキストレスポンスの場合（画像生成失敗の可能性）
+            for text in e.result.texts:
+                print(f"✗ Text response received: {text[:100]}")
+
+            print(f"✗ No image data in response. Response structure: {e.result.top_level_keys}")
+            error = e
         except urllib.error.HTTPError as e:
             error_body = e.read().decode('utf-8')
             print(f"✗ HTTP Error {e.code}: {error_body}")
+            error = e
+            retry_after = parse_retry_after(e.headers, error_body)
         except Exception as e:
             print(f"✗ Exception occurred: {str(e)}")
+            error = e
+
+        # 400/401/403/404 などはリトライしても結果が変わらないため打ち切る
+        if error is not None and not policy.is_retryable(error):
+            print(f"✗ Not retrying {filename}: error is not retryable")
+            return False
+
+        pause = policy.record(error, retry_after)
+        if pause:
+            print(f"⏸ API saturated, pausing all requests for {pause:.1f} seconds")
 
         if attempt < retry - 1:
-            wait_time = (attempt + 1) * 2
-            print(f"Waiting {wait_time} seconds before retry...")
+            wait_time = policy.backoff(attempt, retry_after)
+            print(f"Waiting {wait_time:.1f} seconds before retry...")
             time.sleep(wait_time)
 
     print(f"✗ Failed to generate {filename} after {retry} attempts")
     return False
 
 
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Gemini API Image Generation Script")
+    parser.add_argument("--only", action="append", default=None, metavar="NAME",
+                        help="対象を id かファイル名で絞り込む（複数回・カンマ区切り可）")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"同時に実行する生成リクエスト数 (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"1分あたりの最大リクエスト数 (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"ホストごとの最大コネクション数 (default: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help=f"接続タイムアウト秒数 (default: {DEFAULT_CONNECT_TIMEOUT})")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT,
+                        help=f"レスポンス待ちのタイムアウト秒数 (default: {REQUEST_TIMEOUT})")
+    parser.add_argument("--breaker-threshold", type=int, default=DEFAULT_BREAKER_THRESHOLD,
+                        help=f"全体を一時停止するまでの連続 429/503 回数 (default: {DEFAULT_BREAKER_THRESHOLD})")
+    parser.add_argument("--breaker-cooldown", type=float, default=DEFAULT_BREAKER_COOLDOWN,
+                        help=f"一時停止する秒数 (default: {DEFAULT_BREAKER_COOLDOWN:g})")
+    parser.add_argument("--metrics-report", default=None,
+                        help="計測レポート(JSON)の保存先 (default: .cache/reports/ 以下)")
+    parser.add_argument("--optimize", action="store_true",
+                        help="取得後に定義サイズへリサイズし WebP/AVIF を書き出す（要 Pillow）")
+    parser.add_argument("--optimize-workers", type=int, default=None,
+                        help="最適化のプロセス数 (default: CPU数)")
+    parser.add_argument("--journal", default=str(JOURNAL_DIR / "generate-images.jsonl"),
+                        help="ジョブジャーナルの保存先 (default: .cache/jobs/generate-images.jsonl)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="生成キャッシュを使わず、既存ファイルの有無だけで判定する")
+    return parser.parse_args()
+
+
 def main():
     """
     メイン処理
     """
+    args = parse_args()
+    try:
+        prompts = image_prompts(split_only(args.only))
+    except KeyError as e:
+        raise SystemExit(f"✗ {e.args[0]}")
+    get_api_key()  # APIキーが無ければ生成を始める前に止める
+    IMAGES_DIR.mkdir(exist_ok=True)
+    concurrency = max(1, args.concurrency)
+    client = configure_client(pool_size=max(1, args.pool_size),
+                              connect_timeout=args.connect_timeout, read_timeout=args.timeout)
+    # リトライ方針とサーキットブレーカーは全ワーカーで共有する
+    policy = RetryPolicy(breaker=CircuitBreaker(args.breaker_threshold, args.breaker_cooldown))
+
     print("="*80)
     print("Gemini API Image Generation Script")
-    print(f"Model: gemini-2.5-flash-image")
-    print(f"Total images to generate: {len(IMAGE_PROMPTS)}")
+    print(f"Model: {MODEL}")
+    print(f"Total images to generate: {len(prompts)}")
     print(f"Output directory: {IMAGES_DIR}")
+    print(f"Concurrency: {concurrency}, Rate limit: {args.rpm:g} requests/min")
     print("="*80)
 
     success_count = 0
     failed_list = []
+    pending = []
+
+    cache = None if args.no_cache else GenerationCache(IMAGES_DIR)
+    recorder = MetricsRecorder("generate-images")
+    journal = JobJournal(args.journal)
+
+    remove_stale_temp_files(IMAGES_DIR)
+
+    # 取得できなかったときに代用したプレースホルダーは、既存の生成結果として扱わない
+    placeholders = load_placeholder_manifest()
+    placeholder_shas = {entry.get("sha256") for entry in placeholders.values()}
+
+    # 前回 in-flight のまま中断されたジョブは出力ファイルを信用せず作り直す
+    interrupted = set(journal.interrupted())
+    if interrupted:
+        print(f"\n↻ Resuming interrupted run: {len(interrupted)} job(s) were in flight")
+
+    for i, prompt_data in enumerate(prompts, 1):
+        filename = prompt_data["filename"]
+        output_path = IMAGES_DIR / filename
+        key = cache_key_for(prompt_data)
 
-    for i, prompt_data in enumerate(IMAGE_PROMPTS, 1):
-        print(f"\n[{i}/{len(IMAGE_PROMPTS)}]")
+        if filename in interrupted and output_path.exists() and not journal.is_done(filename, output_path):
+            output_path.unlink()
+            print(f"\n[{i}/{len(prompts)}]")
+            print(f"✗ Discarded {filename} (interrupted while generating)")
 
-        # 既に画像が存在する場合はスキップ
-        output_path = IMAGES_DIR / prompt_data["filename"]
+        # 空ファイル・HTML・形式違いなどの既存ファイルは隔離して作り直す（ヘッダーだけを読む）
         if output_path.exists():
-            print(f"⊘ Skipping {prompt_data['filename']} (already exists)")
+            try:
+                check_or_quarantine(output_path, prompt_data.get("size"))
+            except InvalidImage as e:
+                print(f"\n[{i}/{len(prompts)}]")
+                print(f"✗ Quarantined {filename}: {'; '.join(e.problems)}")
+
+        placeholder = is_placeholder(output_path, placeholders)
+
+        if cache is None:
+            # 既に画像が存在する場合はスキップ
+            # ジャーナル上で未完了・失敗のファイルや内容が記録と異なるファイル、プレースホルダーは作り直す
+            state = journal.state(filename)
+            if output_path.exists() and not placeholder \
+                    and (state is None or journal.is_done(filename, output_path)):
+                print(f"\n[{i}/{len(prompts)}]")
+                print(f"⊘ Skipping {filename} (already exists)")
+                recorder.skip(filename, "exists")
+                success_count += 1
+                continue
+            pending.append((i, prompt_data))
+            continue
+
+        # 同じ条件で生成済みの画像が配置されていればスキップ
+        if not placeholder and cache.is_current(filename, key, output_path):
+            print(f"\n[{i}/{len(prompts)}]")
+            print(f"⊘ Skipping {filename} (up to date)")
+            recorder.skip(filename, "up-to-date")
+            success_count += 1
+            continue
+
+        # キャッシュにあればAPIを呼ばずに復元
+        if cache.has(key):
+            sha256 = cache.restore(key, output_path)
+            if sha256 in placeholder_shas:
+                # 以前プレースホルダーが生成結果として取り込まれていた（作り直して置き換える）
+                print(f"\n[{i}/{len(prompts)}]")
+                print(f"✗ Ignored cached {filename} (placeholder)")
+                pending.append((i, prompt_data))
+                continue
+            try:
+                check_or_quarantine(output_path, prompt_data.get("size"))
+            except InvalidImage as e:
+                print(f"\n[{i}/{len(prompts)}]")
+                print(f"✗ Quarantined cached {filename}: {'; '.join(e.problems)}")
+                pending.append((i, prompt_data))
+                continue
+            cache.record(filename, key, sha256, model=MODEL)
+            journal.record(filename, DONE, key=key, sha256=sha256, source="cache")
+            print(f"\n[{i}/{len(prompts)}]")
+            print(f"↺ Restored {filename} from cache")
+            recorder.skip(filename, "cache")
             success_count += 1
             continue
 
-        # 画像生成
-        if generate_image(prompt_data):
+        # マニフェスト・ジャーナル導入前の既存画像は現行プロンプトの結果として取り込む
+        if output_path.exists() and not placeholder and filename not in cache.manifest \
+                and journal.state(filename) is None:
+            sha256 = cache.store(key, output_path, model=MODEL, filename=filename)
+            cache.record(filename, key, sha256, model=MODEL)
+            journal.record(filename, DONE, key=key, sha256=sha256, source="existing")
+            print(f"\n[{i}/{len(prompts)}]")
+            print(f"⊘ Skipping {filename} (already exists, added to cache)")
+            recorder.skip(filename, "exists")
             success_count += 1
+            continue
+
+        pending.append((i, prompt_data))
+
+    # 実行予定のジョブを記録しておき、強制終了されても残りが分かるようにする
+    for _, prompt_data in pending:
+        journal.record(prompt_data["filename"], PENDING, key=cache_key_for(prompt_data))
+
+    # API制限はトークンバケットで制御（固定の待機は行わない）
+    limiter = TokenBucket(args.rpm, burst=concurrency)
+
+    def worker(index, prompt_data, metrics):
+        filename = prompt_data["filename"]
+        key = cache_key_for(prompt_data)
+        metrics.start()
+        metrics.throttle_wait = limiter.acquire()
+        print(f"\n[{index}/{len(prompts)}]")
+        journal.record(filename, IN_FLIGHT, key=key)
+        ok = generate_image(prompt_data, client=client, policy=policy, metrics=metrics)
+        metrics.finish(ok)
+        if not ok:
+            journal.record(filename, FAILED, key=key)
+            return False
+        if cache is not None:
+            sha256 = cache.store(key, IMAGES_DIR / filename, model=MODEL, filename=filename,
+                                 prompt=prompt_data["prompt"], size=prompt_data.get("size"))
+            cache.record(filename, key, sha256, model=MODEL)
         else:
-            failed_list.append(prompt_data["filename"])
+            sha256 = file_sha256(IMAGES_DIR / filename)
+        journal.record(filename, DONE, key=key, sha256=sha256, source="api")
+        return True
+
+    # 画像生成
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(worker, index, prompt_data, recorder.new(prompt_data["filename"])):
+                prompt_data["filename"]
+            for index, prompt_data in pending
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"✗ Unexpected error for {filename}: {str(e)}")
+                ok = False
+            if ok:
+                success_count += 1
+            else:
+                failed_list.append(filename)
+
+    # 本画像に置き換わったプレースホルダーの記録を外す
+    forget_placeholders(IMAGES_DIR / p["filename"] for p in prompts)
+
+    # 失敗リストは定義順に並べる
+    order = {p["filename"]: n for n, p in enumerate(prompts)}
+    failed_list.sort(key=order.get)
+
+    # 定義サイズへのリサイズとWebP/AVIFへの再エンコード
+    if args.optimize:
+        print("\n" + "="*80)
+        print("Optimizing images (WebP/AVIF)")
+        print("="*80)
+        entries = [(IMAGES_DIR / item["filename"], item["size"]) for item in prompts]
+        try:
+            print_results(*optimize_batch(entries, workers=args.optimize_workers))
+        except RuntimeError as e:
+            print(f"✗ Optimization skipped: {str(e)}")
 
-        # API制限を避けるため、少し待機
-        if i < len(IMAGE_PROMPTS):
-            time.sleep(2)
+    client.close()
+    report_path = recorder.write_report(args.metrics_report, model=MODEL, concurrency=concurrency,
+                                        rpm=args.rpm)
 
     # 結果サマリー
     print("\n" + "="*80)
     print("SUMMARY")
     print("="*80)
-    print(f"Total: {len(IMAGE_PROMPTS)}")
+    print(f"Total: {len(prompts)}")
     print(f"Success: {success_count}")
     print(f"Failed: {len(failed_list)}")
 
@@ -293,6 +505,7 @@ def main():
     else:
         print("\n✓ All images generated successfully!")
 
+    print(f"\nMetrics report: {report_path}")
     print("="*80)
 
 
@@ -1,41 +1,57 @@
 #!/usr/bin/env python3
 """
 美しいプレースホルダー画像をSVG形式で生成するスクリプト
-依存ライブラリ不要
+最小化した SVG と、静的ホスティング用の .svg.gz / .svg.br を書き出す
+全件を <symbol> にまとめたスプライト（1リクエストで全プレースホルダーを取得できる）も作る
+--raster を付けると、定義どおりのサイズの PNG / WebP / JPEG を書き出す（プロセスプールで並列）
+依存ライブラリ不要（.svg.br は brotli、--raster は Pillow と NumPy がインストールされている場合のみ）
 """
 
+import argparse
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from asset_manifest import load_manifest, split_only
+from file_utils import atomic_write_bytes, atomic_write_json, file_sha256
+from svg_optimize import build_sprite, optimize_svg, precompressed_paths, write_precompressed
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # --raster を使わなければ不要
+    np = None
+    Image = None
+
+# ラスター形式で書き出せるか（Pillow と NumPy の有無）
+RASTER_AVAILABLE = np is not None and Image is not None
+
 # 画像保存先ディレクトリ
 IMAGES_DIR = Path(__file__).parent / "images"
-IMAGES_DIR.mkdir(exist_ok=True)
-
-# 画像定義
-IMAGES = [
-    {"filename": "hero-bg.jpg", "width": 1920, "height": 1080, "gradient": ["#2C5F8D", "#1a4564"], "text": "Hero Background", "icon": "🏥"},
-    {"filename": "problem-therapist.jpg", "width": 1200, "height": 800, "gradient": ["#666", "#999"], "text": "Problem Therapist", "icon": "😔"},
-    {"filename": "profile-toyoda.jpg", "width": 800, "height": 800, "gradient": ["#2C5F8D", "#4A90E2"], "text": "Toyoda Profile", "icon": "👨‍⚕️"},
-    {"filename": "story-sunset.jpg", "width": 1200, "height": 800, "gradient": ["#E59B3C", "#D4A574"], "text": "Story Sunset", "icon": "🌅"},
-    {"filename": "5-layers-diagram.jpg", "width": 1000, "height": 800, "gradient": ["#2C5F8D", "#E59B3C"], "text": "5 Layers Diagram", "icon": "📊"},
-    {"filename": "mind-flow-diagram.jpg", "width": 1000, "height": 600, "gradient": ["#4A90E2", "#2C5F8D"], "text": "Mind Flow", "icon": "→"},
-    {"filename": "counseling-illustration.jpg", "width": 1000, "height": 800, "gradient": ["#D4A574", "#E59B3C"], "text": "Counseling", "icon": "💬"},
-    {"filename": "before-after-comparison.jpg", "width": 1200, "height": 600, "gradient": ["#666", "#4A90E2"], "text": "Before/After", "icon": "⚡"},
-    {"filename": "case1-stage1.jpg", "width": 800, "height": 600, "gradient": ["#E59B3C", "#F0A040"], "text": "Case 1 - Stage 1", "icon": "😊"},
-    {"filename": "case1-stage2.jpg", "width": 800, "height": 600, "gradient": ["#666", "#888"], "text": "Case 1 - Stage 2", "icon": "🌧️"},
-    {"filename": "case1-stage3.jpg", "width": 800, "height": 600, "gradient": ["#888", "#4A90E2"], "text": "Case 1 - Stage 3", "icon": "😢"},
-    {"filename": "case1-stage4.jpg", "width": 800, "height": 600, "gradient": ["#4A90E2", "#D4A574"], "text": "Case 1 - Stage 4", "icon": "💫"},
-    {"filename": "case1-stage5.jpg", "width": 800, "height": 600, "gradient": ["#D4A574", "#FFD700"], "text": "Case 1 - Stage 5", "icon": "🌟"},
-    {"filename": "case2-symptoms.jpg", "width": 800, "height": 600, "gradient": ["#8B4513", "#A0522D"], "text": "Case 2 - Symptoms", "icon": "😰"},
-    {"filename": "case2-assessment.jpg", "width": 800, "height": 600, "gradient": ["#2C5F8D", "#4A90E2"], "text": "Case 2 - Assessment", "icon": "🔍"},
-    {"filename": "case2-future.jpg", "width": 800, "height": 600, "gradient": ["#4A90E2", "#87CEEB"], "text": "Case 2 - Future", "icon": "✨"},
-    {"filename": "course-materials.jpg", "width": 1200, "height": 800, "gradient": ["#F8F9FA", "#E8EAED"], "text": "Course Materials", "icon": "📚"},
-    {"filename": "online-learning.jpg", "width": 1200, "height": 800, "gradient": ["#4A90E2", "#2C5F8D"], "text": "Online Learning", "icon": "💻"},
-    {"filename": "diverse-therapists.jpg", "width": 1200, "height": 600, "gradient": ["#2C5F8D", "#4A90E2"], "text": "Diverse Therapists", "icon": "👥"},
-    {"filename": "toyoda-message.jpg", "width": 800, "height": 1000, "gradient": ["#2C5F8D", "#1a4564"], "text": "Toyoda Message", "icon": "💭"},
-    {"filename": "therapist-patient-handshake.jpg", "width": 1200, "height": 800, "gradient": ["#D4A574", "#E59B3C"], "text": "Handshake", "icon": "🤝"},
-    {"filename": "bright-future.jpg", "width": 1200, "height": 800, "gradient": ["#FFD700", "#FFA500"], "text": "Bright Future", "icon": "🌞"},
-    {"filename": "final-message-bg.jpg", "width": 1920, "height": 1080, "gradient": ["#2C5F8D", "#1a4564"], "text": "Final Message", "icon": "🎯"},
-]
+
+# 書き出した SVG の内容ハッシュを記録するマニフェスト
+MANIFEST_NAME = ".placeholder-manifest.json"
+
+# 全プレースホルダーの <symbol> をまとめたスプライトと、id → viewBox の対応表
+SPRITE_NAME = "placeholders-sprite.svg"
+SPRITE_MAP_NAME = "placeholders-sprite.json"
+
+# --raster の形式 → (Pillow の形式名, 拡張子, 保存オプション)
+RASTER_FORMATS = {
+    "png": ("PNG", ".png", {"optimize": True}),
+    "webp": ("WEBP", ".webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", ".jpg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+
+def placeholder_images(only=None):
+    """
+    プレースホルダーの定義（assets.json から読み込む）
+    """
+    return load_manifest().placeholders(only)
 
 
 def generate_svg_placeholder(image_data):
@@ -73,43 +89,252 @@ def generate_svg_placeholder(image_data):
     return svg_content
 
 
+def _rgb(color):
+    color = color.lstrip("#")
+    if len(color) == 3:
+        color = "".join(c * 2 for c in color)
+    return np.array([int(color[i:i + 2], 16) for i in (0, 2, 4)], dtype=np.float32)
+
+
+def gradient_array(width, height, gradient):
+    """
+    SVG と同じ左上→右下の2色グラデーションを (高さ, 幅, 3) の uint8 配列で返す
+    画素中心の位置 t = (x/幅 + y/高さ) / 2 を1回の演算で全画素に適用する
+    """
+    start, end = _rgb(gradient[0]), _rgb(gradient[1])
+    u = (np.arange(width, dtype=np.float32) + 0.5) / width
+    v = (np.arange(height, dtype=np.float32) + 0.5) / height
+    t = (v[:, None] + u[None, :]) * 0.5
+    return (start + (end - start) * t[..., None] + 0.5).astype(np.uint8)
+
+
+def raster_filename(filename, format):
+    return Path(filename).stem + RASTER_FORMATS[format][1]
+
+
+def render_raster(image_data, format="png"):
+    """
+    定義どおりのサイズのグラデーション画像をエンコードしたバイト列を返す
+    （文字は描かない。絵文字の描画は環境によって変わるため）
+    """
+    if not RASTER_AVAILABLE:
+        raise RuntimeError("Pillow and NumPy are required for --raster: pip install Pillow numpy")
+    pil_format, _, options = RASTER_FORMATS[format]
+    pixels = gradient_array(image_data["width"], image_data["height"], image_data["gradient"])
+    buffer = io.BytesIO()
+    Image.fromarray(pixels, "RGB").save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def load_placeholder_manifest():
+    try:
+        with open(IMAGES_DIR / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_placeholder_manifest(manifest):
+    if manifest != load_placeholder_manifest():
+        atomic_write_json(IMAGES_DIR / MANIFEST_NAME, manifest, sort_keys=True)
+
+
+def is_placeholder(path, manifest=None):
+    """
+    path がこのスクリプトの書いた内容のまま（マニフェストの sha256 と一致する）かどうか
+    同じ名前で本画像に置き換わっていれば False
+    """
+    path = Path(path)
+    entry = (load_placeholder_manifest() if manifest is None else manifest).get(path.name)
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return False
+    return bool(entry) and size == entry.get("size") and file_sha256(path) == entry.get("sha256")
+
+
+def remove_placeholders(paths):
+    """
+    paths のうちプレースホルダーのままのものを消し、マニフェストからも外す
+    本画像に置き換わったもの・既に無いものは消さず、残っている記録だけ外す。消したパスを返す
+    """
+    manifest = load_placeholder_manifest()
+    removed = []
+    for path in map(Path, paths):
+        if is_placeholder(path, manifest):
+            path.unlink()
+            removed.append(path)
+        manifest.pop(path.name, None)
+    save_placeholder_manifest(manifest)
+    return removed
+
+
+def forget_placeholders(paths):
+    """
+    paths のうち本画像に置き換わった（内容が記録と異なる）もの・消えたものの記録を外す
+    """
+    manifest = load_placeholder_manifest()
+    for path in map(Path, paths):
+        if path.name in manifest and not is_placeholder(path, manifest):
+            del manifest[path.name]
+    save_placeholder_manifest(manifest)
+
+
+def is_unchanged(manifest, svg_filename, output_path, sha256, size):
+    """
+    output_path が既に sha256 の内容かどうか
+    マニフェストのサイズ・更新日時と一致すればファイルは読まない。
+    一致しなければ内容のハッシュで確かめ、同じならマニフェストだけ更新する
+    """
+    try:
+        stat = output_path.stat()
+    except FileNotFoundError:
+        return False
+    entry = manifest.get(svg_filename)
+    if entry and entry.get("sha256") == sha256 and entry.get("size") == stat.st_size \
+            and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    if stat.st_size == size and file_sha256(output_path) == sha256:
+        manifest[svg_filename] = {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return True
+    return False
+
+
+def write_if_changed(manifest, output_path, content, force=False):
+    """
+    内容が変わっていれば output_path と .gz / .br を書き出し、マニフェストを更新する
+    書き出したかどうかを返す
+    """
+    name = output_path.name
+    sha256 = hashlib.sha256(content).hexdigest()
+    if not force and is_unchanged(manifest, name, output_path, sha256, len(content)):
+        # 事前圧縮ファイルだけ欠けていれば作る
+        if output_path.suffix == ".svg" and not all(path.exists() for path in precompressed_paths(output_path)):
+            write_precompressed(output_path, content)
+        return False
+
+    atomic_write_bytes(output_path, content)
+    # 静的ホスティングがそのまま返せる .svg.gz / .svg.br
+    if output_path.suffix == ".svg":
+        write_precompressed(output_path, content)
+    stat = output_path.stat()
+    manifest[name] = {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return True
+
+
+def write_raster_placeholders(images, manifest, format, force=False, workers=None):
+    """
+    ラスター形式のプレースホルダーをプロセスプールでエンコードし、変わったものだけ書き出す
+    同名のファイルがあれば、内容がマニフェストの記録どおり（このスクリプトが書いたまま）の
+    ときだけ上書きする。生成・ダウンロード済みの本画像は --force でも上書きせず、記録を外す
+    """
+    written, unchanged, kept = [], 0, []
+    targets = []
+    for image_data in images:
+        output_path = IMAGES_DIR / raster_filename(image_data["filename"], format)
+        if output_path.exists() and not is_placeholder(output_path, manifest):
+            manifest.pop(output_path.name, None)
+            kept.append(output_path.name)
+            continue
+        targets.append((image_data, output_path))
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [(output_path, executor.submit(render_raster, image_data, format))
+                   for image_data, output_path in targets]
+        for i, (output_path, future) in enumerate(futures, 1):
+            if not write_if_changed(manifest, output_path, future.result(), force):
+                unchanged += 1
+                continue
+            print(f"[{i}/{len(futures)}] ✓ Successfully created: {output_path}")
+            written.append(output_path.name)
+
+    save_placeholder_manifest(manifest)
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Total: {len(images)}")
+    print(f"Written: {len(written)}")
+    print(f"Unchanged: {unchanged}")
+    print(f"Kept (real images): {len(kept)}")
+    print("="*80)
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="SVG Placeholder Generator")
+    parser.add_argument("--only", action="append", default=None, metavar="NAME",
+                        help="対象を id かファイル名で絞り込む（複数回・カンマ区切り可）")
+    parser.add_argument("--force", action="store_true", help="内容が同じでも書き直す")
+    parser.add_argument("--raster", choices=sorted(RASTER_FORMATS), default=None,
+                        help="SVG の代わりに定義サイズのラスター画像を書き出す")
+    parser.add_argument("--workers", type=int, default=None, help="--raster のプロセス数 (default: CPU数)")
+    return parser.parse_args()
+
+
 def main():
     """
     メイン処理
     """
+    args = parse_args()
+    try:
+        images = placeholder_images(split_only(args.only))
+    except KeyError as e:
+        raise SystemExit(f"✗ {e.args[0]}")
+    IMAGES_DIR.mkdir(exist_ok=True)
+
     print("="*80)
     print("SVG Placeholder Generator")
-    print(f"Total images to generate: {len(IMAGES)}")
+    print(f"Total images to generate: {len(images)}")
     print(f"Output directory: {IMAGES_DIR}")
     print("="*80)
 
-    success_count = 0
+    manifest = load_placeholder_manifest()
+    if args.raster:
+        write_raster_placeholders(images, manifest, args.raster, args.force, args.workers)
+        return
+    written, unchanged = [], 0
 
-    for i, image_data in enumerate(IMAGES, 1):
+    for i, image_data in enumerate(images, 1):
         filename = image_data["filename"]
-        print(f"\n[{i}/{len(IMAGES)}] Generating: {filename}")
 
         # SVGファイル名に変更
         svg_filename = filename.replace('.jpg', '.svg')
         output_path = IMAGES_DIR / svg_filename
 
-        # SVG生成
-        svg_content = generate_svg_placeholder(image_data)
+        # SVGはメモリ上で生成し、内容が変わったときだけ書き込む
+        # （更新日時が変わらないので、ブラウザ・CDN のキャッシュも無駄に切れない）
+        # 空白・既定値の除去や数値の丸めをした最小化済みの SVG を書き出す
+        content = optimize_svg(generate_svg_placeholder(image_data)).encode("utf-8")
+        if not write_if_changed(manifest, output_path, content, args.force):
+            unchanged += 1
+            continue
+        print(f"[{i}/{len(images)}] ✓ Successfully created: {output_path}")
+        written.append(svg_filename)
 
-        # ファイル保存
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(svg_content)
+    # 全プレースホルダーを1ファイルにまとめたスプライト（--only の指定にかかわらず全件）
+    # HTML からは <svg viewBox="..."><use href="images/placeholders-sprite.svg#hero-bg"/></svg> で使う
+    sprite_docs = [(Path(data["filename"]).stem, generate_svg_placeholder(data)) for data in placeholder_images()]
+    sprite, symbols = build_sprite(sprite_docs)
+    sprite_map = {"sprite": f"{IMAGES_DIR.name}/{SPRITE_NAME}", "symbols": symbols}
+    for path, content in ((IMAGES_DIR / SPRITE_NAME, sprite.encode("utf-8")),
+                          (IMAGES_DIR / SPRITE_MAP_NAME,
+                           (json.dumps(sprite_map, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))):
+        if write_if_changed(manifest, path, content, args.force):
+            print(f"✓ Successfully created: {path}")
+            written.append(path.name)
 
-        print(f"✓ Successfully created: {output_path}")
-        success_count += 1
+    save_placeholder_manifest(manifest)
 
     # 結果サマリー
     print("\n" + "="*80)
     print("SUMMARY")
     print("="*80)
-    print(f"Total: {len(IMAGES)}")
-    print(f"Success: {success_count}")
-    print("\n✓ All SVG placeholders generated successfully!")
+    print(f"Total: {len(images)}")
+    print(f"Written: {len(written)}")
+    print(f"Unchanged: {unchanged}")
     print("="*80)
 
 
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+画像生成結果のキャッシュ
+(モデル, プロンプト, generationConfig, サイズ) のハッシュをキーに生成画像を共有ストア
+（blob_store.py）に保存し、images/ 側のサイドカーマニフェストでどのキーの画像が配置済みかを管理する。
+ストアは 0章/ と docs/ で共有するため、同じ画像を生成するのは1回だけで済む
+依存ライブラリ不要
+"""
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+from blob_store import BlobStore
+from file_utils import atomic_write_json, file_sha256
+
+# 共有ストア導入前のサイトごとのキャッシュ（見つかればストアに取り込む）
+LEGACY_CACHE_DIR = Path(__file__).parent / ".cache" / "generations"
+
+# 共有ストア内の名前空間
+REF_NAMESPACE = "generations"
+
+# images/ に置くマニフェストのファイル名
+MANIFEST_NAME = ".generation-manifest.json"
+
+
+def generation_key(model, prompt, generation_config, size):
+    """
+    生成条件からキャッシュキー（SHA-256）を計算
+    """
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "generationConfig": generation_config, "size": size},
+        sort_keys=True, ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    生成キー → 画像ファイルのキャッシュと、配置済み画像のマニフェスト
+    """
+
+    def __init__(self, images_dir, store=None, legacy_dir=LEGACY_CACHE_DIR):
+        self.blobs = store or BlobStore()
+        self.legacy_dir = Path(legacy_dir)
+        self.manifest_path = Path(images_dir) / MANIFEST_NAME
+        self.lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        # 途中で中断されても壊れないよう一時ファイル経由で置き換える
+        atomic_write_json(self.manifest_path, self.manifest, sort_keys=True)
+
+    def _ref(self, key):
+        ref = self.blobs.get_ref(REF_NAMESPACE, key)
+        if ref is None:
+            # 旧キャッシュ（.cache/generations/{先頭2文字}/{key}.bin）にあればストアへ移す
+            legacy = self.legacy_dir / key[:2] / f"{key}.bin"
+            if legacy.exists():
+                self.blobs.set_ref(REF_NAMESPACE, key, self.blobs.put_file(legacy), stored_at=int(time.time()))
+                ref = self.blobs.get_ref(REF_NAMESPACE, key)
+        return ref
+
+    def is_current(self, filename, key, output_path):
+        """
+        output_path が key の生成結果として配置済みかどうか
+        書きかけ・差し替えられたファイルを信用しないよう、内容ハッシュも照合する
+        """
+        entry = self.manifest.get(filename)
+        if not entry or entry.get("key") != key or not Path(output_path).exists():
+            return False
+        return file_sha256(output_path) == entry.get("sha256")
+
+    def has(self, key):
+        return self._ref(key) is not None
+
+    def store(self, key, source_path, **meta):
+        """
+        生成済みファイルを共有ストアに取り込み（source_path はストアへのリンクになる）、内容ハッシュを返す
+        """
+        sha256 = self.blobs.put_file(source_path)
+        self.blobs.set_ref(REF_NAMESPACE, key, sha256, stored_at=int(time.time()), **meta)
+        return sha256
+
+    def restore(self, key, output_path):
+        """
+        共有ストアから output_path に画像を配置し（ハードリンクなど）、内容ハッシュを返す
+        """
+        self.blobs.link(self._ref(key)["sha256"], output_path)
+        return file_sha256(output_path)
+
+    def record(self, filename, key, sha256, **meta):
+        """
+        filename に key の生成結果を配置したことをマニフェストに記録
+        """
+        with self.lock:
+            self.manifest[filename] = dict(meta, key=key, sha256=sha256)
+            self._save_manifest()
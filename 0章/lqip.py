@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+低画質プレースホルダー（LQIP）の生成
+images/ の各画像から BlurHash・約 1KB のぼかし WebP（data URI）・平均色を計算し、
+images/lqip.json にまとめる。HTML 側はこれを埋め込めば、本画像の到着前にプレビューを表示できる。
+縮小は NumPy のブロック平均で行い、内容（sha256）が変わっていない画像は再計算しない
+（lqip.json はリポジトリに含めるため、clone ごとに変わる更新日時はキーにしない）。
+プレースホルダーのままの画像は対象にしない
+依存ライブラリ: Pillow, NumPy
+
+使い方:
+    python lqip.py
+    python lqip.py --components 4x3 --width 24
+    python lqip.py --embed
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from file_utils import atomic_write_bytes, atomic_write_json, file_sha256
+from generate_placeholder_images import is_placeholder, load_placeholder_manifest
+
+try:
+    import numpy as np
+    from PIL import Image, ImageFilter
+except ImportError:  # 未インストールでも import 自体は失敗させない
+    np = None
+    Image = None
+    ImageFilter = None
+
+# 画像保存先ディレクトリ
+IMAGES_DIR = Path(__file__).parent / "images"
+
+# --embed で書き換える HTML
+HTML_PATH = Path(__file__).parent / "index.html"
+
+# 出力するマニフェスト（HTML ビルドが読む）
+LQIP_MANIFEST_NAME = "lqip.json"
+
+# 対象にする画像の拡張子（SVG は元々軽いため対象外）
+RASTER_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".avif")
+
+# BlurHash の成分数（横x縦）と、計算前に縮小する幅
+DEFAULT_COMPONENTS = (4, 3)
+BLURHASH_SAMPLE = 32
+
+# data URI 用 WebP の幅と品質
+DEFAULT_PREVIEW_WIDTH = 32
+PREVIEW_QUALITY = 40
+PREVIEW_BLUR = 1.0
+
+# images/ 以下を参照する <img> タグ（埋め込み済みの印は data-lqip 属性）
+IMG_TAG = re.compile(r'<img\b[^>]*\bsrc="images/([^"]+)"[^>]*>')
+LQIP_ATTRIBUTES = re.compile(r'\s+(?:data-lqip|style="background:[^"]*")(?:="")?')
+
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def require_dependencies():
+    if np is None or Image is None:
+        raise RuntimeError("Pillow and NumPy are required for LQIP generation: pip install Pillow numpy")
+
+
+def _base83(value, length):
+    return "".join(BASE83[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def srgb_to_linear(values):
+    values = values / 255.0
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def linear_to_srgb(value):
+    value = min(1.0, max(0.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def block_downsample(pixels, width):
+    """
+    (高さ, 幅, 3) の配列を、幅 width 前後になるよう整数倍率のブロック平均で縮小する
+    """
+    height_in, width_in = pixels.shape[:2]
+    factor = max(1, width_in // width)
+    height_out, width_out = height_in // factor, width_in // factor
+    trimmed = pixels[:height_out * factor, :width_out * factor].astype(np.float64)
+    return trimmed.reshape(height_out, factor, width_out, factor, -1).mean(axis=(1, 3))
+
+
+def blurhash_encode(pixels, components=DEFAULT_COMPONENTS):
+    """
+    sRGB の (高さ, 幅, 3) 配列から BlurHash 文字列を作る
+    全成分の DCT 係数は einsum でまとめて計算する
+    """
+    cx, cy = components
+    height, width = pixels.shape[:2]
+    linear = srgb_to_linear(pixels.astype(np.float64))
+
+    cos_x = np.cos(np.pi * np.arange(cx)[:, None] * np.arange(width)[None, :] / width)
+    cos_y = np.cos(np.pi * np.arange(cy)[:, None] * np.arange(height)[None, :] / height)
+    factors = np.einsum("jy,ix,yxc->jic", cos_y, cos_x, linear) / (width * height)
+    factors *= 2.0
+    factors[0, 0] /= 2.0
+    factors = factors.reshape(cx * cy, 3)
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((cx - 1) + (cy - 1) * 9, 1)
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        maximum = 1.0
+        result += _base83(0, 1)
+
+    r, g, b = (linear_to_srgb(value) for value in dc)
+    result += _base83((r << 16) + (g << 8) + b, 4)
+
+    quantised = np.floor(np.clip(np.sign(ac) * np.abs(ac / maximum) ** 0.5 * 9 + 9.5, 0, 18)).astype(int)
+    for qr, qg, qb in quantised:
+        result += _base83(qr * 19 * 19 + qg * 19 + qb, 2)
+    return result
+
+
+def preview_data_uri(image, width=DEFAULT_PREVIEW_WIDTH):
+    """
+    幅 width のぼかし WebP を data URI にする（1KB 前後）
+    """
+    height = max(1, round(image.height * width / image.width))
+    small = image.resize((width, height), Image.BILINEAR).filter(ImageFilter.GaussianBlur(PREVIEW_BLUR))
+    buffer = io.BytesIO()
+    small.save(buffer, format="WEBP", quality=PREVIEW_QUALITY, method=6)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def compute_lqip(task):
+    """
+    1枚分の LQIP を計算する（プロセスプールから呼ばれるため引数は辞書1つ）
+    """
+    require_dependencies()
+    path = Path(task["path"])
+    with Image.open(path) as image:
+        width, height = image.size
+        # JPEG は縮小デコードし、全画素を展開しない
+        image.draft("RGB", (task["preview_width"] * 8, task["preview_width"] * 8))
+        rgb = image.convert("RGB")
+
+    pixels = np.asarray(rgb)
+    sample = block_downsample(pixels, BLURHASH_SAMPLE)
+    color = sample.reshape(-1, 3).mean(axis=0)
+    return {
+        "width": width,
+        "height": height,
+        "blurhash": blurhash_encode(sample, tuple(task["components"])),
+        "dataUri": preview_data_uri(rgb, task["preview_width"]),
+        "color": "#%02x%02x%02x" % tuple(int(round(c)) for c in color),
+    }
+
+
+def load_lqip_manifest(images_dir=IMAGES_DIR):
+    try:
+        with open(Path(images_dir) / LQIP_MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_lqip(images_dir=IMAGES_DIR, components=DEFAULT_COMPONENTS, preview_width=DEFAULT_PREVIEW_WIDTH,
+               workers=None, force=False):
+    """
+    images_dir の画像について LQIP マニフェストを更新する
+    戻り値は (マニフェスト, 計算した件数, 失敗したファイルと理由のリスト)
+    """
+    require_dependencies()
+    images_dir = Path(images_dir)
+    previous = load_lqip_manifest(images_dir)
+    settings = {"components": list(components), "preview_width": preview_width}
+    placeholders = load_placeholder_manifest()
+
+    manifest, tasks = {}, []
+    for path in sorted(images_dir.iterdir()):
+        if path.suffix.lower() not in RASTER_EXTENSIONS or path.name.startswith("."):
+            continue
+        if is_placeholder(path, placeholders):
+            continue
+        source = {"size": path.stat().st_size, "sha256": file_sha256(path)}
+        entry = previous.get(path.name)
+        if not force and entry and entry.get("source") == source and entry.get("settings") == settings:
+            manifest[path.name] = entry
+            continue
+        tasks.append((path, source))
+
+    failures = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [
+                (path, source, executor.submit(compute_lqip, dict(settings, path=str(path))))
+                for path, source in tasks
+            ]
+            for path, source, future in futures:
+                try:
+                    manifest[path.name] = dict(future.result(), source=source, settings=settings)
+                except Exception as e:
+                    failures.append((path.name, str(e)))
+
+    manifest = dict(sorted(manifest.items()))
+    if manifest != previous:
+        atomic_write_json(images_dir / LQIP_MANIFEST_NAME, manifest)
+    return manifest, len(tasks) - len(failures), failures
+
+
+def lqip_style(entry):
+    """
+    本画像が届くまで表示する背景（平均色 + ぼかしプレビュー）の style 属性値
+    """
+    return f"background:{entry['color']} url({entry['dataUri']}) center/cover no-repeat"
+
+
+def embed_lqip(html, manifest):
+    """
+    HTML 内の <img src="images/..."> にプレビューを style として埋め込む
+    以前に埋め込んだ style は置き換えるため、何度実行しても結果は同じ
+    """
+    def replace(match):
+        tag = match.group(0)
+        entry = manifest.get(match.group(1))
+        if entry is None:
+            return tag
+        if "data-lqip" in tag:
+            tag = LQIP_ATTRIBUTES.sub("", tag)
+        elif "style=" in tag:
+            return tag
+        return tag[:4] + f' style="{lqip_style(entry)}" data-lqip' + tag[4:]
+
+    return IMG_TAG.sub(replace, html)
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Generate BlurHash / tiny WebP placeholders for images")
+    parser.add_argument("--components", default="x".join(map(str, DEFAULT_COMPONENTS)),
+                        help="BlurHash の成分数 横x縦 (default: 4x3)")
+    parser.add_argument("--width", type=int, default=DEFAULT_PREVIEW_WIDTH,
+                        help=f"data URI 用プレビューの幅 (default: {DEFAULT_PREVIEW_WIDTH})")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数 (default: CPU数)")
+    parser.add_argument("--force", action="store_true", help="変更がなくても計算し直す")
+    parser.add_argument("--embed", action="store_true",
+                        help="index.html の <img> にプレビューを style として埋め込む")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    components = tuple(int(n) for n in args.components.lower().split("x"))
+    if len(components) != 2 or not all(1 <= n <= 9 for n in components):
+        raise SystemExit("✗ --components must be like 4x3 (each 1-9)")
+
+    print("="*80)
+    print("LQIP Generator")
+    print(f"Directory: {IMAGES_DIR}")
+    print(f"BlurHash components: {components[0]}x{components[1]}, Preview width: {args.width}px")
+    print("="*80)
+
+    manifest, computed, failures = build_lqip(IMAGES_DIR, components, args.width, args.workers, args.force)
+    for filename, entry in manifest.items():
+        size_kb = len(entry["dataUri"]) / 1024
+        print(f"✓ {filename}: {entry['blurhash']} ({size_kb:.2f} KB data URI, {entry['color']})")
+    for filename, reason in failures:
+        print(f"✗ Failed: {filename}: {reason}")
+
+    embedded = False
+    if args.embed:
+        html = HTML_PATH.read_text(encoding="utf-8")
+        updated = embed_lqip(html, manifest)
+        embedded = updated != html
+        if embedded:
+            atomic_write_bytes(HTML_PATH, updated.encode("utf-8"))
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Images: {len(manifest)}")
+    print(f"Computed: {computed}")
+    print(f"Failed: {len(failures)}")
+    print(f"Manifest: {IMAGES_DIR / LQIP_MANIFEST_NAME}")
+    if args.embed:
+        print(f"HTML: {HTML_PATH} ({'updated' if embedded else 'unchanged'})")
+    print("="*80)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
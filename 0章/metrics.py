@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+画像取得の計測値（画像ごと）と実行レポート
+キュー待ち・接続・最初のバイトまでの時間・総時間・受信バイト数・デコード時間・
+書き込み時間・リトライ回数を記録し、実行終了時にヒストグラム付きのJSONを書き出す
+依存ライブラリ不要
+"""
+
+import threading
+import time
+from pathlib import Path
+
+from file_utils import atomic_write_json
+
+# レポートの既定保存先
+REPORTS_DIR = Path(__file__).parent / ".cache" / "reports"
+
+# ヒストグラムの区切り（秒）
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+# ヒストグラムの区切り（バイト）
+BYTES_BUCKETS = [16 * 1024 * 4 ** n for n in range(7)]
+
+# 集計対象の項目と単位
+TIMING_FIELDS = ["queue_wait", "throttle_wait", "connect", "ttfb", "total", "decode", "write"]
+COUNT_FIELDS = ["bytes_received", "retries"]
+
+
+class ImageMetrics:
+    """
+    1画像分の計測値
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.status = "pending"
+        self.queue_wait = 0.0
+        self.throttle_wait = 0.0
+        self.connect = 0.0
+        self.ttfb = 0.0
+        self.total = 0.0
+        self.decode = 0.0
+        self.write = 0.0
+        self.bytes_received = 0
+        self.attempts = 0
+        self.not_modified = False
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+
+    @property
+    def retries(self):
+        return max(0, self.attempts - 1)
+
+    def start(self):
+        """
+        ワーカーが処理を開始した時点で呼ぶ（キュー待ち時間を確定する）
+        """
+        self.started_at = time.perf_counter()
+        self.queue_wait = self.started_at - self.submitted_at
+
+    def finish(self, ok):
+        if self.started_at is not None:
+            self.total = time.perf_counter() - self.started_at
+        self.status = "success" if ok else "failed"
+
+    def add_response(self, response):
+        """
+        HTTPレスポンスの接続時間・TTFB・受信バイト数を取り込む
+        """
+        self.connect += response.timings.get("connect", 0.0)
+        self.ttfb = response.timings.get("ttfb", 0.0)
+        self.bytes_received += response.bytes_read
+
+    def to_dict(self):
+        data = {"filename": self.filename, "status": self.status}
+        for field in TIMING_FIELDS:
+            data[field] = round(getattr(self, field), 6)
+        for field in COUNT_FIELDS:
+            data[field] = getattr(self, field)
+        if self.not_modified:
+            data["not_modified"] = True
+        return data
+
+
+def histogram(values, buckets):
+    """
+    区切りごとの件数（各区切り以下の件数、最後は上限超え）
+    """
+    counts = [0] * (len(buckets) + 1)
+    for value in values:
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = [f"<={bound:g}" for bound in buckets] + [f">{buckets[-1]:g}"]
+    return dict(zip(labels, counts))
+
+
+def summarize(values, buckets):
+    """
+    件数・合計・パーセンタイル・ヒストグラム
+    """
+    ordered = sorted(values)
+
+    def pct(p):
+        if not ordered:
+            return 0
+        return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "sum": round(sum(ordered), 6),
+        "p50": pct(50),
+        "p95": pct(95),
+        "max": ordered[-1] if ordered else 0,
+        "histogram": histogram(ordered, buckets),
+    }
+
+
+class MetricsRecorder:
+    """
+    実行中の計測値を集め、JSONレポートとして書き出す（スレッドセーフ）
+    """
+
+    def __init__(self, run_name):
+        self.run_name = run_name
+        self.started = time.time()
+        self.started_perf = time.perf_counter()
+        self.items = []
+        self.skipped = []
+        self.lock = threading.Lock()
+
+    def new(self, filename):
+        metrics = ImageMetrics(filename)
+        with self.lock:
+            self.items.append(metrics)
+        return metrics
+
+    def skip(self, filename, reason):
+        with self.lock:
+            self.skipped.append({"filename": filename, "reason": reason})
+
+    def build_report(self, **extra):
+        with self.lock:
+            items = [m for m in self.items if m.status != "pending"]
+            skipped = list(self.skipped)
+
+        elapsed = time.perf_counter() - self.started_perf
+        succeeded = [m for m in items if m.status == "success"]
+
+        summary = {}
+        for field in TIMING_FIELDS:
+            summary[field] = summarize([getattr(m, field) for m in items], SECONDS_BUCKETS)
+        summary["bytes_received"] = summarize([m.bytes_received for m in items], BYTES_BUCKETS)
+        summary["retries"] = summarize([m.retries for m in items], [0, 1, 2, 3, 5, 10])
+
+        return dict(extra, **{
+            "run": self.run_name,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "elapsed_sec": round(elapsed, 3),
+            "requested": len(items),
+            "succeeded": len(succeeded),
+            "failed": len(items) - len(succeeded),
+            "not_modified": sum(1 for m in items if m.not_modified),
+            "skipped": skipped,
+            "images_per_sec": round(len(succeeded) / elapsed, 3) if elapsed else 0.0,
+            "summary": summary,
+            "images": [m.to_dict() for m in items],
+        })
+
+    def write_report(self, path=None, **extra):
+        """
+        レポートを書き出し、保存先パスを返す
+        """
+        if path is None:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+            path = REPORTS_DIR / f"{self.run_name}-{stamp}.json"
+        path = Path(path)
+        atomic_write_json(path, self.build_report(**extra))
+        return path
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+任意サイズのプレースホルダーを返すローカル HTTP サーバー
+/placeholder/{幅}x{高さ}/{名前}.svg に generate_svg_placeholder() で描いた最小化済み SVG を返す。
+Pillow と NumPy があれば .png / .webp / .jpg でグラデーションのみのラスター画像も返す。
+名前は assets.json の id かファイル名（拡張子なし）で、定義にない名前は既定の配色で描く。
+描画結果は上限付きの LRU キャッシュに保持し、ETag / If-None-Match に対応する。
+同じ画像への同時リクエストは1回だけ描画し、残りはその結果を待って返す
+依存ライブラリ不要（ラスター形式は Pillow と NumPy がインストールされている場合のみ）
+
+使い方:
+    python placeholder_server.py --port 8766
+    curl http://127.0.0.1:8766/placeholder/640x360/hero-bg.svg
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asset_manifest import load_manifest
+from generate_placeholder_images import RASTER_AVAILABLE, generate_svg_placeholder, render_raster
+from svg_optimize import optimize_svg
+
+PLACEHOLDER_PATH = re.compile(r"^/placeholder/(?P<width>\d{1,5})x(?P<height>\d{1,5})/(?P<name>[\w.-]+)\.(?P<ext>\w+)$")
+
+# 受け付ける最大の幅・高さ
+MAX_DIMENSION = 4096
+
+# キャッシュの上限（件数・合計バイト数）
+DEFAULT_CACHE_ENTRIES = 1024
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# listen の待ち行列（既定の 5 では同時接続が多いと接続を拒否する）
+REQUEST_QUEUE_SIZE = 1024
+
+# 既定の配色（assets.json の placeholder と同じ既定値）
+DEFAULT_GRADIENT = ["#2C5F8D", "#4A90E2"]
+
+
+def render_svg(data):
+    return optimize_svg(generate_svg_placeholder(data)).encode("utf-8")
+
+
+# 拡張子 → (Content-Type, 描画関数)
+RENDERERS = {
+    "svg": ("image/svg+xml", render_svg),
+}
+if RASTER_AVAILABLE:
+    RENDERERS.update({
+        "png": ("image/png", lambda data: render_raster(data, "png")),
+        "webp": ("image/webp", lambda data: render_raster(data, "webp")),
+        "jpg": ("image/jpeg", lambda data: render_raster(data, "jpeg")),
+    })
+
+
+def placeholder_definition(name, width, height):
+    """
+    name（id かファイル名の stem）の配色・文言を、指定サイズで返す
+    """
+    manifest = load_manifest()
+    asset = manifest.by_id.get(name) or manifest.by_filename.get(f"{name}.jpg")
+    if asset is None:
+        return {"filename": f"{name}.jpg", "width": width, "height": height,
+                "gradient": DEFAULT_GRADIENT, "text": name, "icon": "📷"}
+    data = dict(manifest.placeholders([asset["id"]])[0])
+    data.update(width=width, height=height)
+    return data
+
+
+class RenderCache:
+    """
+    描画結果の LRU キャッシュ（件数と合計バイト数の両方で上限を設ける）
+    キーごとに描画中の印を持ち、同じキーの同時リクエストは先行する描画の完了を待つ
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "renders": 0, "waits": 0, "evictions": 0}
+
+    def get_or_render(self, key, render):
+        """
+        key の (本文, ETag) を返す。無ければ render() で描画して保存する
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            event = self.pending.get(key)
+            owner = event is None
+            if owner:
+                event = self.pending[key] = threading.Event()
+                self.stats["misses"] += 1
+            else:
+                self.stats["waits"] += 1
+
+        if not owner:
+            event.wait()
+            with self.lock:
+                entry = self.entries.get(key)
+            # 描画が失敗した、または直後に追い出された場合は自分で描画する
+            return entry if entry is not None else self._store(key, render())
+
+        try:
+            return self._store(key, render())
+        finally:
+            with self.lock:
+                del self.pending[key]
+            event.set()
+
+    def _store(self, key, body):
+        entry = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:20])
+        with self.lock:
+            self.stats["renders"] += 1
+            if key not in self.entries:
+                self.entries[key] = entry
+                self.bytes += len(body)
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (old_body, _) = self.entries.popitem(last=False)
+                self.bytes -= len(old_body)
+                self.stats["evictions"] += 1
+        return entry
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.bytes)
+
+
+class PlaceholderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "PlaceholderServer/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="text/plain; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/stats":
+            self._send(200, json.dumps(self.server.cache.snapshot()).encode("utf-8"),
+                       content_type="application/json")
+            return
+
+        match = PLACEHOLDER_PATH.match(path)
+        if not match:
+            self._send(404, b"Not found")
+            return
+        width, height = int(match.group("width")), int(match.group("height"))
+        name, ext = match.group("name"), match.group("ext").lower()
+        if ext not in RENDERERS:
+            self._send(415, f"Unsupported format: {ext}".encode("utf-8"))
+            return
+        if not (1 <= width <= MAX_DIMENSION and 1 <= height <= MAX_DIMENSION):
+            self._send(400, f"Size must be between 1 and {MAX_DIMENSION}".encode("utf-8"))
+            return
+
+        content_type, render = RENDERERS[ext]
+        body, etag = self.server.cache.get_or_render(
+            (width, height, name, ext), lambda: render(placeholder_definition(name, width, height)))
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+        if etag in (value.strip() for value in (self.headers.get("If-None-Match") or "").split(",")):
+            self.send_response(304)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            return
+        self._send(200, body, content_type=content_type, headers=headers)
+
+    do_HEAD = do_GET
+
+
+class _ThreadingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+class PlaceholderServer:
+    """
+    別スレッドでも動かせるプレースホルダーサーバー
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, cache=None, verbose=False):
+        self.httpd = _ThreadingServer((host, port), PlaceholderHandler)
+        self.httpd.cache = cache or RenderCache()
+        self.httpd.verbose = verbose
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def cache(self):
+        return self.httpd.cache
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Serve placeholders at arbitrary sizes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766, help="0 を指定すると空きポートを使用")
+    parser.add_argument("--cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES,
+                        help=f"キャッシュする最大件数 (default: {DEFAULT_CACHE_ENTRIES})")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024),
+                        help=f"キャッシュの最大サイズ MB (default: {DEFAULT_CACHE_BYTES // (1024 * 1024)})")
+    parser.add_argument("--verbose", action="store_true", help="アクセスログを表示")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    cache = RenderCache(args.cache_entries, args.cache_mb * 1024 * 1024)
+    server = PlaceholderServer(args.host, args.port, cache, verbose=args.verbose)
+
+    print("="*80)
+    print("Placeholder Server")
+    print(f"URL: {server.url}/placeholder/{{width}}x{{height}}/{{name}}.{{{','.join(RENDERERS)}}}")
+    print(f"Stats: {server.url}/stats")
+    print(f"Cache: {args.cache_entries} entries / {args.cache_mb} MB")
+    print("="*80)
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"\nCache: {cache.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
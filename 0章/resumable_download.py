@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+画像ファイルのストリーミングダウンロード（中断からの再開つき）
+ボディを一定サイズのチャンクでディスクに書き込むためメモリ使用量は画像サイズに依存しない。
+途中で切れた場合は受信済み部分（.{ファイル名}.part）を残し、次回は HTTP Range で続きから取得する。
+受信後にサイズ（Content-Length / Content-Range）とハッシュ（Repr-Digest など）を照合してから
+本来のファイル名に置き換える
+依存ライブラリ不要
+"""
+
+import base64
+import binascii
+import contextlib
+import hashlib
+import json
+import os
+import re
+import time
+import urllib.error
+from pathlib import Path
+
+from http_cache import conditional_headers
+
+# 1回に読み書きするバイト数
+CHUNK_SIZE = 256 * 1024
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+DIGEST_FIELD = re.compile(r"sha-256=:?([A-Za-z0-9+/=]+):?", re.IGNORECASE)
+
+
+class IntegrityError(Exception):
+    """
+    受信したファイルのサイズまたはハッシュがサーバーの申告と一致しない
+    """
+
+
+class DownloadResult:
+    """
+    1ファイル分のダウンロード結果
+    """
+
+    def __init__(self, path, bytes_total, sha256, resumed_from=0, url=None, etag=None,
+                 last_modified=None, not_modified=False):
+        self.path = path
+        self.bytes_total = bytes_total
+        self.sha256 = sha256
+        self.resumed_from = resumed_from
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+
+
+def parse_content_range(value):
+    """
+    "bytes 100-199/1000" → (100, 199, 1000)（全体サイズ不明なら None）
+    """
+    match = CONTENT_RANGE.match((value or "").strip())
+    if not match:
+        return None
+    total = None if match.group(3) == "*" else int(match.group(3))
+    return int(match.group(1)), int(match.group(2)), total
+
+
+def expected_sha256(headers, partial=False):
+    """
+    レスポンスヘッダーから画像全体の SHA-256（16進）を取得
+    Repr-Digest / Digest は常に全体、Content-Digest は 200 のときだけ全体を表す
+    """
+    names = ["Repr-Digest", "Digest"] + ([] if partial else ["Content-Digest"])
+    for name in names:
+        match = DIGEST_FIELD.search(headers.get(name) or "")
+        if match:
+            try:
+                return base64.b64decode(match.group(1), validate=True).hex()
+            except (binascii.Error, ValueError):
+                continue
+    return None
+
+
+class PartialDownload:
+    """
+    受信途中のファイル（.{name}.part）と、再開に必要な情報（.{name}.part.json）
+    """
+
+    def __init__(self, output_path):
+        output_path = Path(output_path)
+        self.output_path = output_path
+        self.part_path = output_path.with_name(f".{output_path.name}.part")
+        self.meta_path = output_path.with_name(f".{output_path.name}.part.json")
+
+    def offset(self):
+        try:
+            return self.part_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def load_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_meta(self, meta):
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def discard(self):
+        for path in (self.part_path, self.meta_path):
+            with contextlib.suppress(FileNotFoundError):
+                path.unlink()
+
+    def resume_request(self, source_url):
+        """
+        続きから取得できる場合は (取得先URL, 追加ヘッダー, 開始位置) を返す
+        検証子（ETag / Last-Modified）が無い、または取得元が変わった場合は最初から
+        """
+        offset = self.offset()
+        meta = self.load_meta()
+        if not offset or meta.get("source") != source_url or not meta.get("validator"):
+            self.discard()
+            return source_url, {}, 0
+        if meta.get("total") is not None and offset >= meta["total"]:
+            self.discard()
+            return source_url, {}, 0
+        # If-Range: 画像が差し替わっていれば 206 ではなく全体（200）が返る
+        headers = {"Range": f"bytes={offset}-", "If-Range": meta["validator"]}
+        return meta.get("url") or source_url, headers, offset
+
+
+def _hash_file(path, digest):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+
+def download_to_file(client, url, output_path, chunk_size=CHUNK_SIZE, headers=None, metrics=None,
+                     cached=None):
+    """
+    url の内容を output_path にストリーミングで保存し、DownloadResult を返す
+    受信が途中で切れた場合は例外を送出し、受信済み部分は次回の再開用に残す
+    サイズ・ハッシュが一致しない場合は受信済み部分を破棄して IntegrityError を送出する
+
+    cached に前回の記録（http_cache.HTTPCache.lookup の戻り値）を渡すと、最終URLへ
+    条件付きリクエストを送り、304 なら output_path に触れず not_modified=True を返す
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    partial = PartialDownload(output_path)
+    request_url, range_headers, offset = partial.resume_request(url)
+    request_headers = dict(headers or {}, **range_headers)
+    if cached and not offset:
+        request_url = cached.get("url") or url
+        request_headers.update(conditional_headers(cached))
+
+    try:
+        response = client.get(request_url, headers=request_headers)
+    except urllib.error.HTTPError as e:
+        # 416: 受信済み部分がサーバー側の画像と合わない
+        if e.code == 416 and offset:
+            partial.discard()
+            raise IntegrityError("range not satisfiable, restarting from the beginning") from e
+        raise
+
+    if response.status == 304:
+        with response:
+            response.read()
+            if metrics is not None:
+                metrics.add_response(response)
+        return DownloadResult(output_path, cached["size"], cached["sha256"], url=response.url,
+                              etag=response.headers.get("ETag") or cached.get("etag"),
+                              last_modified=response.headers.get("Last-Modified") or cached.get("last_modified"),
+                              not_modified=True)
+
+    write_time = 0.0
+    with response:
+        try:
+            if response.status == 206:
+                content_range = parse_content_range(response.headers.get("Content-Range"))
+                if content_range is None or content_range[0] != offset:
+                    partial.discard()
+                    raise IntegrityError(f"unexpected Content-Range: {response.headers.get('Content-Range')}")
+                total = content_range[2]
+            else:
+                # 200 なら最初から受信し直す
+                offset = 0
+                length = response.headers.get("Content-Length")
+                total = int(length) if length and length.isdigit() else None
+
+            final_url = response.url
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            partial.save_meta({
+                "source": url,
+                "url": final_url,
+                "validator": etag or last_modified,
+                "total": total,
+            })
+            expected = expected_sha256(response.headers, partial=response.status == 206)
+
+            digest = hashlib.sha256()
+            if offset:
+                _hash_file(partial.part_path, digest)
+
+            with open(partial.part_path, "ab" if offset else "wb") as f:
+                for chunk in response.iter_chunks(chunk_size):
+                    digest.update(chunk)
+                    started = time.perf_counter()
+                    f.write(chunk)
+                    write_time += time.perf_counter() - started
+                started = time.perf_counter()
+                f.flush()
+                os.fsync(f.fileno())
+                write_time += time.perf_counter() - started
+        finally:
+            if metrics is not None:
+                metrics.add_response(response)
+                metrics.write += write_time
+
+    size = partial.offset()
+    if total is not None and size < total:
+        # 接続が途中で切れた: 受信済み部分は残し、次の試行で続きから取得する
+        raise IntegrityError(f"connection closed early: received {size} of {total} bytes")
+    if total is not None and size != total:
+        partial.discard()
+        raise IntegrityError(f"size mismatch: received {size} bytes, expected {total}")
+    sha256 = digest.hexdigest()
+    if expected and sha256 != expected:
+        partial.discard()
+        raise IntegrityError(f"SHA-256 mismatch: got {sha256[:12]}…, expected {expected[:12]}…")
+
+    os.replace(partial.part_path, output_path)
+    partial.discard()
+    return DownloadResult(output_path, size, sha256, resumed_from=offset, url=final_url, etag=etag,
+                          last_modified=last_modified)
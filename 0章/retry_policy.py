@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Gemini API / Unsplash 共通のリトライ方針
+エラーをリトライ可能・不可能に分類し、Retry-After を尊重した
+ジッター付き指数バックオフと、API飽和時にバッチ全体を止めるサーキットブレーカーを提供する
+依存ライブラリ不要
+"""
+
+import email.utils
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+
+# リトライしても結果が変わらない可能性が低いステータス以外はリトライ不可
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# API側の処理能力・クォータ不足を示すステータス（サーキットブレーカーの対象）
+SATURATION_STATUS = {429, 503}
+
+# 既定値
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_BREAKER_THRESHOLD = 3
+DEFAULT_BREAKER_COOLDOWN = 30.0
+
+_RETRY_DELAY = re.compile(r"^\s*(\d+(?:\.\d+)?)s\s*$")
+
+
+def parse_retry_after(headers, body=None):
+    """
+    Retry-After ヘッダー（秒数または HTTP-date）か、
+    Gemini API のエラーボディ（RetryInfo.retryDelay）から待機秒数を取得
+    """
+    value = headers.get("Retry-After") if headers is not None else None
+    if value:
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    if body:
+        try:
+            details = json.loads(body).get("error", {}).get("details", [])
+        except (ValueError, AttributeError):
+            return None
+        for detail in details:
+            match = _RETRY_DELAY.match(str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+def status_of(error):
+    """
+    例外から HTTP ステータスを取り出す（HTTP エラー以外は None）
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    return None
+
+
+class CircuitBreaker:
+    """
+    API飽和（429/503）が連続したらバッチ全体の新規リクエストを一時停止する
+    """
+
+    def __init__(self, threshold=DEFAULT_BREAKER_THRESHOLD, cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        ブレーカーが開いている間は待機し、待機秒数を返す
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                remaining = self.open_until - time.monotonic()
+            if remaining <= 0:
+                return waited
+            time.sleep(remaining)
+            waited += remaining
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def record_saturation(self, retry_after=None):
+        """
+        飽和エラーを記録し、しきい値に達したらブレーカーを開く
+        開いた場合は停止秒数を返す
+        """
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return None
+            pause = max(self.cooldown, retry_after or 0.0)
+            until = time.monotonic() + pause
+            if until <= self.open_until:
+                return None
+            self.open_until = until
+            return pause
+
+
+class RetryPolicy:
+    """
+    エラー分類・バックオフ計算・サーキットブレーカーをまとめたリトライ方針
+    スレッド間で共有して使う
+    """
+
+    def __init__(self, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY, breaker=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+
+    def is_retryable(self, error):
+        """
+        リトライで回復しうるエラーかどうか
+        HTTP エラーはステータスで判定し、接続・タイムアウト・途中切断などはリトライ可能とする
+        """
+        status = status_of(error)
+        if status is not None:
+            return status in RETRYABLE_STATUS
+        return True
+
+    def before_attempt(self):
+        """
+        リクエスト前に呼ぶ。ブレーカーが開いていれば閉じるまで待つ
+        """
+        return self.breaker.wait()
+
+    def record(self, error, retry_after=None):
+        """
+        試行結果を記録する。ブレーカーが開いた場合は停止秒数を返す
+        """
+        if error is None:
+            self.breaker.record_success()
+            return None
+        if status_of(error) in SATURATION_STATUS:
+            return self.breaker.record_saturation(retry_after)
+        return None
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        次の試行までの待機秒数
+        Retry-After があればそれに従い、なければジッター付き指数バックオフ
+        """
+        if retry_after is not None:
+            return retry_after
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(self.base_delay / 2, max(self.base_delay / 2, ceiling))
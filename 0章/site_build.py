@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+公開用サイトのビルド（ファイル名に内容ハッシュを付ける）
+style.css / script.js を最小化し、index.html と CSS が参照するファイルを
+{名前}.{ハッシュ}.{拡張子} として dist/ に配置して参照を書き換える。
+ハッシュ付きのファイルは内容が変われば名前も変わるため、Cache-Control: immutable で配信できる
+（index.html と asset-manifest.json だけは毎回確認させる）。対応表は dist/asset-manifest.json、
+Netlify / Cloudflare Pages 形式のヘッダー指定は dist/_headers に書き出す
+依存ライブラリ不要（.br は brotli がインストールされている場合のみ）
+
+使い方:
+    python site_build.py
+    python site_build.py --output ../public
+"""
+
+import argparse
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from blob_store import place
+from file_utils import atomic_write_bytes
+from svg_optimize import is_precompressed, precompressed_paths, write_precompressed
+
+SITE_DIR = Path(__file__).parent
+
+# 出力先
+DEFAULT_OUTPUT_DIR = SITE_DIR / "dist"
+
+# 入口の HTML（名前は変えない）
+HTML_NAME = "index.html"
+
+# 出力する対応表（元のパス → ハッシュ付きのパス）
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+
+# ファイル名に付けるハッシュの桁数
+HASH_LENGTH = 10
+
+# 事前圧縮する拡張子
+COMPRESSIBLE = (".html", ".css", ".js", ".svg", ".json")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+ATTRIBUTE_URL = re.compile(r'\b(src|href)="([^"]+)"')
+SRCSET = re.compile(r'\bsrcset="([^"]+)"')
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+JS_PUNCTUATION = re.compile(r"[ \t]*([{}()\[\];,=:<>!&|?*])[ \t]*")
+JS_JOINABLE_NEWLINE = re.compile(r"([{(\[;,])\n|\n([})\]])")
+
+
+def _is_local(url):
+    return not re.match(r"^(?:[a-z][a-z0-9+.-]*:|//|#)", url, re.IGNORECASE)
+
+
+def _segments(text, line_comments=False, regexes=False):
+    """
+    text を (コードか, 文字列) に分ける。文字列・正規表現リテラルはそのまま、コメントは空白1つにする
+    """
+    segments, code, i = [], [], 0
+    last = ""
+    while i < len(text):
+        char = text[i]
+        if char in "'\"`" or (regexes and char == "/" and not text.startswith(("//", "/*"), i)
+                                and last in "(,=:[!&|?{};+-*%<>~^"):
+            end, in_class = i + 1, False
+            while end < len(text):
+                if text[end] == "\\":
+                    end += 2
+                    continue
+                if char == "/" and text[end] in "[]":
+                    in_class = text[end] == "["
+                elif text[end] == char and not in_class:
+                    break
+                end += 1
+            end += 1
+            if char == "/":
+                while end < len(text) and text[end].isalpha():
+                    end += 1
+            segments.append((True, "".join(code)))
+            segments.append((False, text[i:end]))
+            code, i, last = [], end, char
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end == -1 else end + 2
+            code.append(" ")
+        elif line_comments and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+        else:
+            code.append(char)
+            if not char.isspace():
+                last = char
+            i += 1
+    segments.append((True, "".join(code)))
+    return segments
+
+
+def minify_css(text):
+    """
+    コメント・インデント・記号まわりの空白と、} の直前の ; を取り除く
+    """
+    parts = []
+    for is_code, segment in _segments(text):
+        if is_code:
+            segment = re.sub(r"\s+", " ", segment)
+            segment = re.sub(r"\s*([{};,>])\s*", r"\1", segment)
+            segment = re.sub(r":\s+", ":", segment)
+        parts.append(segment)
+    return "".join(parts).replace(";}", "}").strip() + "\n"
+
+
+def minify_js(text):
+    """
+    コメント・インデント・空行と記号まわりの空白を取り除く
+    自動セミコロン挿入に頼るコードを壊さないよう、文の区切りになり得る改行は残す
+    """
+    parts = []
+    for is_code, segment in _segments(text, line_comments=True, regexes=True):
+        if is_code:
+            segment = re.sub(r"[ \t]+", " ", segment)
+            segment = re.sub(r"\s*\n\s*", "\n", segment)
+            segment = JS_PUNCTUATION.sub(r"\1", segment)
+            segment = JS_JOINABLE_NEWLINE.sub(lambda m: m.group(1) or m.group(2), segment)
+        parts.append(segment)
+    return "".join(parts).strip() + "\n"
+
+
+def hashed_name(path, content):
+    """
+    images/hero.webp → images/hero.{内容ハッシュ}.webp
+    """
+    path = Path(path)
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+
+
+class SiteBuild:
+    """
+    参照をたどりながらハッシュ付きのファイルを出力先に配置する
+    """
+
+    def __init__(self, site_dir=SITE_DIR, output_dir=DEFAULT_OUTPUT_DIR):
+        self.site_dir = Path(site_dir)
+        self.output_dir = Path(output_dir)
+        self.manifest = {}
+        self.written = 0
+
+    def _output(self, name, content=None, source=None):
+        target = self.output_dir / name
+        if not target.exists():
+            if content is None:
+                place(source, target)
+            else:
+                atomic_write_bytes(target, content)
+            self.written += 1
+        # 本体が既にあっても .gz / .br は別に確かめる（欠けた・後から brotli を入れた場合など）
+        if target.suffix in COMPRESSIBLE:
+            self._precompress(target, content if content is not None else target.read_bytes())
+
+    def _precompress(self, target, content):
+        if not is_precompressed(target, content):
+            write_precompressed(target, content)
+            self.written += 1
+
+    def asset(self, name):
+        """
+        サイト内のパス name をハッシュ付きで配置し、新しいパスを返す（無いファイルは None）
+        """
+        name = Path(name).as_posix()
+        if name in self.manifest:
+            return self.manifest[name]
+        source = self.site_dir / name
+        if not source.is_file():
+            return None
+
+        content = None
+        if source.suffix == ".css":
+            content = self._rewrite_css(source.read_text(encoding="utf-8"), Path(name).parent)
+            content = minify_css(content).encode("utf-8")
+        elif source.suffix == ".js":
+            content = minify_js(source.read_text(encoding="utf-8")).encode("utf-8")
+        hashed = hashed_name(name, content if content is not None else source.read_bytes())
+        self._output(hashed, content, source)
+        self.manifest[name] = hashed
+        return hashed
+
+    def _resolve(self, url, base=Path(".")):
+        """
+        url を置き換え後の URL にする（外部 URL・存在しないファイルはそのまま）
+        """
+        if not _is_local(url):
+            return url
+        path, sep, suffix = url.partition("?")
+        path, hash_sep, fragment = path.partition("#")
+        name = (base / path).as_posix()
+        hashed = self.asset(name)
+        if hashed is None:
+            return url
+        relative = Path(hashed).relative_to(base).as_posix() if base != Path(".") else hashed
+        return relative + (hash_sep + fragment if hash_sep else "") + (sep + suffix if sep else "")
+
+    def _rewrite_css(self, css, base):
+        return CSS_URL.sub(lambda m: f"url({m.group(1)}{self._resolve(m.group(2), base)}{m.group(1)})", css)
+
+    def rewrite_html(self, html):
+        html = ATTRIBUTE_URL.sub(lambda m: f'{m.group(1)}="{self._resolve(m.group(2))}"', html)
+        html = SRCSET.sub(lambda m: 'srcset="%s"' % ", ".join(
+            " ".join([self._resolve(candidate.split()[0]), *candidate.split()[1:]])
+            for candidate in m.group(1).split(",")), html)
+        # style 属性・<style> 内の url()（data: URI はそのまま）
+        return self._rewrite_css(html, Path("."))
+
+    def headers(self):
+        """
+        Netlify / Cloudflare Pages の _headers 形式
+        """
+        lines = []
+        for name in sorted(self.manifest.values()):
+            lines += [f"/{name}", f"  Cache-Control: {IMMUTABLE}"]
+        for name in ("/", f"/{HTML_NAME}", f"/{ASSET_MANIFEST_NAME}"):
+            lines += [name, f"  Cache-Control: {REVALIDATE}"]
+        return "\n".join(lines) + "\n"
+
+    def previous_manifest(self):
+        """
+        前回このツールが書き出した対応表。出力先が空でないのに対応表が無ければ
+        別の用途のディレクトリとみなし、ValueError で止める
+        """
+        try:
+            with open(self.output_dir / ASSET_MANIFEST_NAME, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            if self.output_dir.is_dir() and any(self.output_dir.iterdir()):
+                raise ValueError(f"{self.output_dir} is not empty and has no {ASSET_MANIFEST_NAME}; "
+                                 "choose an empty directory or one created by site_build.py")
+            return {}
+
+    def prune(self, previous):
+        """
+        前回書き出したハッシュ付きファイル（previous の値）のうち、今回参照されなくなったものを
+        .gz / .br と合わせて消す。このツールが書いていないファイルには触れない
+        """
+        keep = set(self.manifest.values())
+        removed = 0
+        for name in sorted(set(previous.values()) - keep):
+            path = self.output_dir / name
+            for target in (path, *precompressed_paths(path, include_unavailable=True)):
+                if target.is_file():
+                    target.unlink()
+                    removed += 1
+            # 空になったディレクトリだけ消す（出力先自体は残す）
+            parent = path.parent
+            while parent != self.output_dir and parent.is_dir() and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        return removed
+
+    def run(self):
+        previous = self.previous_manifest()
+        html = (self.site_dir / HTML_NAME).read_text(encoding="utf-8")
+        html = self.rewrite_html(html).encode("utf-8")
+        manifest = (json.dumps(dict(sorted(self.manifest.items())), ensure_ascii=False, indent=2) + "\n").encode()
+        for name, content in ((HTML_NAME, html), (ASSET_MANIFEST_NAME, manifest),
+                              ("_headers", self.headers().encode("utf-8"))):
+            target = self.output_dir / name
+            if not target.exists() or target.read_bytes() != content:
+                atomic_write_bytes(target, content)
+                self.written += 1
+            if target.suffix in COMPRESSIBLE:
+                self._precompress(target, content)
+        return self.prune(previous)
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Build a fingerprinted static site")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT_DIR),
+                        help=f"出力先 (default: {DEFAULT_OUTPUT_DIR.name}/)")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    build = SiteBuild(SITE_DIR, Path(args.output))
+
+    print("="*80)
+    print("Static Site Build")
+    print(f"Source: {SITE_DIR / HTML_NAME}")
+    print(f"Output: {build.output_dir}")
+    print("="*80)
+
+    try:
+        removed = build.run()
+    except ValueError as e:
+        raise SystemExit(f"✗ {e}")
+    for name, hashed in sorted(build.manifest.items()):
+        before = (SITE_DIR / name).stat().st_size
+        after = (build.output_dir / hashed).stat().st_size
+        size = f"{before / 1024:.1f} → {after / 1024:.1f} KB" if before != after else f"{after / 1024:.1f} KB"
+        print(f"✓ {name} → {hashed} ({size})")
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Assets: {len(build.manifest)}")
+    print(f"Written: {build.written}")
+    print(f"Removed: {removed}")
+    print(f"Manifest: {build.output_dir / ASSET_MANIFEST_NAME}")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
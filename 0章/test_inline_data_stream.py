@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+inline_data_stream.py の往復テスト
+同じレスポンスを色々な位置（エスケープの途中・キーの途中を含む）で分割して流し、
+json.loads で読んだ結果と一致するかを確かめる
+
+使い方:
+    python -m pytest test_inline_data_stream.py
+"""
+
+import base64
+import io
+import json
+import random
+
+import pytest
+
+from inline_data_stream import stream_inline_data
+
+IMAGE = bytes(random.Random(0).randrange(256) for _ in range(700))
+
+
+def gemini_response(image=IMAGE, mime_type="image/png", text='説明: "引用" \\ 改行\nあり / 終わり'):
+    """
+    Gemini API 形式のレスポンス（Base64 の / は \\/ にエスケープし、76文字ごとに \\n を入れる）
+    """
+    encoded = base64.b64encode(image).decode("ascii")
+    wrapped = "\n".join(encoded[i:i + 76] for i in range(0, len(encoded), 76))
+    body = {
+        "candidates": [{
+            "content": {"parts": [
+                {"text": text},
+                {"inlineData": {"mimeType": mime_type, "data": wrapped}},
+                # 2枚目の画像は書き出さない
+                {"inlineData": {"mimeType": "image/jpeg", "data": "AAAA"}},
+            ], "role": "model"},
+            "metadata": {"data": "not an image", "inlineData": [1, 2, {"x": None}]},
+            "finishReason": "STOP",
+        }],
+        "usageMetadata": {"promptTokenCount": 12, "totalTokenCount": 34},
+        "modelVersion": "gemini-test",
+    }
+    return json.dumps(body, ensure_ascii=False, indent=1).replace("/", "\\/").encode("utf-8")
+
+
+def expected(raw):
+    body = json.loads(raw)
+    parts = body["candidates"][0]["content"]["parts"]
+    return {
+        "image": base64.b64decode(next(p["inlineData"]["data"] for p in parts if "inlineData" in p)),
+        "mime_type": next(p["inlineData"]["mimeType"] for p in parts if "inlineData" in p),
+        "texts": [p["text"] for p in parts if "text" in p],
+        "top_level_keys": list(body),
+    }
+
+
+def scan(chunks):
+    out = io.BytesIO()
+    result = stream_inline_data(chunks, out)
+    return {"image": out.getvalue(), "mime_type": result.mime_type, "texts": result.texts,
+            "top_level_keys": result.top_level_keys}
+
+
+def test_whole_body_matches_json_loads():
+    raw = gemini_response()
+    assert scan([raw]) == expected(raw)
+
+
+def test_every_split_point_matches_json_loads():
+    raw = gemini_response()
+    want = expected(raw)
+    # エスケープ（\\/ \\n \\"）やキー名の途中で切れる位置をすべて含む
+    for cut in range(1, len(raw)):
+        assert scan([raw[:cut], raw[cut:]]) == want, f"split at {cut}: {raw[cut - 10:cut + 10]!r}"
+
+
+def test_one_byte_and_random_chunks_match_json_loads():
+    raw = gemini_response()
+    want = expected(raw)
+    assert scan([raw[i:i + 1] for i in range(len(raw))]) == want
+    rng = random.Random(1)
+    for _ in range(50):
+        cuts = sorted(rng.sample(range(1, len(raw)), 20))
+        chunks = [raw[a:b] for a, b in zip([0, *cuts], [*cuts, len(raw)])]
+        assert scan(chunks) == want
+
+
+def test_text_only_response_has_no_image():
+    raw = json.dumps({"candidates": [{"content": {"parts": [{"text": "I can't draw that"}]}}]}).encode()
+    result = stream_inline_data([raw[:17], raw[17:]], io.BytesIO())
+    assert not result.found
+    assert result.texts == ["I can't draw that"]
+
+
+@pytest.mark.parametrize("raw", [
+    b'{"candidates": [{"content": {"parts": [{"inlineData": {"data": "AAA',
+    b'{"candidates": [',
+    b'{"a": 1}}',
+])
+def test_truncated_or_unbalanced_json_is_rejected(raw):
+    with pytest.raises(ValueError):
+        stream_inline_data([raw], io.BytesIO())
+
+
+def test_mime_type_is_taken_from_the_written_image_when_it_follows_data():
+    encoded = base64.b64encode(IMAGE).decode("ascii")
+    raw = json.dumps({"candidates": [{"content": {"parts": [
+        {"inlineData": {"data": encoded, "mimeType": "image/webp"}},
+        {"inlineData": {"mimeType": "image/jpeg", "data": "AAAA"}},
+    ]}}]}).encode()
+    out = io.BytesIO()
+    result = stream_inline_data([raw[:40], raw[40:]], out)
+    assert (out.getvalue(), result.mime_type) == (IMAGE, "image/webp")
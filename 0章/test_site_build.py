@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+site_build.py の最小化の往復テスト
+JS は Node.js で最小化の前後を実行して結果を比べ（Node.js が無ければスキップ）、
+CSS は規則・宣言の並びに分解して比べる
+
+使い方:
+    python -m pytest test_site_build.py
+"""
+
+import json
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from site_build import minify_css, minify_js
+
+SITE_DIR = Path(__file__).parent
+
+NODE = shutil.which("node")
+requires_node = pytest.mark.skipif(NODE is None, reason="Node.js is not installed")
+
+# 標準入力の JS を実行し、console.log の出力と DOM 操作の記録を JSON で出力する
+# DOM は何を読んでも呼んでも記録用の Proxy を返すスタブで、渡されたコールバックもその場で呼ぶ
+NODE_HARNESS = r"""
+const vm = require("vm");
+const source = require("fs").readFileSync(0, "utf8");
+const log = [];
+let depth = 0;
+const describe = (v) => (typeof v === "function" ? "fn" : v === undefined ? "undefined" : v);
+function stub(path) {
+  return new Proxy(function () {}, {
+    get(target, prop) {
+      if (prop === Symbol.toPrimitive) return () => 1;
+      if (typeof prop === "symbol" || prop === "then") return undefined;
+      return stub(path + "." + prop);
+    },
+    set(target, prop, value) { log.push(["set", path + "." + prop, describe(value)]); return true; },
+    apply(target, self, args) { return call(path, args); },
+    construct(target, args) { call("new " + path, args); return stub("new " + path); },
+  });
+}
+function call(path, args) {
+  log.push(["call", path, args.map(describe)]);
+  if (depth < 4) {
+    depth++;
+    for (const arg of args) {
+      if (typeof arg === "function") arg.call(stub(path + "#this"), stub(path + "#arg0"), stub(path + "#arg1"));
+    }
+    depth--;
+  }
+  return stub(path + "()");
+}
+const context = { console: { log: (...args) => log.push(["log", ...args.map(describe)]) } };
+for (const name of ["document", "window", "IntersectionObserver", "setTimeout", "requestAnimationFrame"]) {
+  context[name] = stub(name);
+}
+try {
+  vm.runInNewContext(source, context);
+} catch (e) {
+  log.push(["error", String(e)]);
+}
+process.stdout.write(JSON.stringify(log));
+"""
+
+JS_CASES = {
+    "asi": "let a = 1\nlet b = a\n++a\nconsole.log(a, b)\nfunction f() {\n  return\n  42\n}\nconsole.log(f())",
+    "division_and_regex": "const x = 10 / 2 / 5, re = /a\\/b[/]c/g; // comment\n"
+                          "console.log(x, re.test('a/b/c'), 'a//b'.split(/\\//).length)",
+    "comment_like_strings": "console.log('// not', \"/* not */\", `t ${1 + 2} // not`) /* gone */",
+    "punctuation": "const o = { k : [ 1 , 2 ] , s : 'a  b' };\n"
+                   "if ( o.k.length > 1 && !false ) console.log( o.k [ 0 ] , o.s )\nelse console.log('no')",
+    "arrow_and_template": "const add = ( a , b ) =>\n  a + b\nconsole.log(`${ add( 1 , 2 ) }px`, add(-1, - -2))",
+}
+
+
+def run_node(source):
+    result = subprocess.run([NODE, "-e", NODE_HARNESS], input=source, capture_output=True, text=True,
+                            timeout=30, check=True)
+    return json.loads(result.stdout)
+
+
+@requires_node
+@pytest.mark.parametrize("name", sorted(JS_CASES))
+def test_minified_js_behaves_the_same(name):
+    source = JS_CASES[name]
+    before = run_node(source)
+    assert before and not any(entry[0] == "error" for entry in before)
+    assert run_node(minify_js(source)) == before
+
+
+@requires_node
+def test_minified_script_js_makes_the_same_dom_calls():
+    source = (SITE_DIR / "script.js").read_text(encoding="utf-8")
+    minified = minify_js(source)
+    assert len(minified) < len(source)
+    before = run_node(source)
+    assert before and not any(entry[0] == "error" for entry in before)
+    assert run_node(minified) == before
+
+
+def _strip_comments(css):
+    # 文字列の中の /* */ はコメントではない
+    return re.sub(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/',
+                  lambda m: m.group(1) or " ", css, flags=re.S)
+
+
+def css_rules(css):
+    """
+    CSS を [(セレクタ・@規則, [(プロパティ, 値), ...] または入れ子の規則), ...] に分解する
+    空白の有無で意味が変わらない箇所（> と , の前後、: の後、連続する空白）だけをそろえる
+    """
+    def normalize(text):
+        text = " ".join(text.split())
+        text = re.sub(r"\s*([>,])\s*", r"\1", text)
+        return re.sub(r":\s+", ":", text)
+
+    def parse(text, pos):
+        rules = []
+        while True:
+            brace = text.find("{", pos)
+            close = text.find("}", pos)
+            if brace == -1 or (close != -1 and close < brace):
+                return rules, close + 1
+            prelude = normalize(text[pos:brace])
+            if prelude.startswith("@media") or prelude.startswith("@supports"):
+                children, pos = parse(text, brace + 1)
+                rules.append((prelude, children))
+                continue
+            end = text.find("}", brace)
+            declarations = []
+            for declaration in text[brace + 1:end].split(";"):
+                if declaration.strip():
+                    prop, _, value = declaration.partition(":")
+                    declarations.append((prop.strip(), normalize(value)))
+            rules.append((prelude, declarations))
+            pos = end + 1
+
+    return parse(_strip_comments(css), 0)[0]
+
+
+def test_minified_style_css_has_the_same_rules():
+    source = (SITE_DIR / "style.css").read_text(encoding="utf-8")
+    minified = minify_css(source)
+    assert len(minified) < len(source)
+    rules = css_rules(source)
+    assert rules
+    assert css_rules(minified) == rules
+
+
+@pytest.mark.parametrize("source, expected", [
+    # 子孫セレクタの空白は意味があるので残す
+    (".a :hover { color: red; }", ".a :hover{color:red}"),
+    ('.b::after { content: " ; /* x */ > , "; }', '.b::after{content:" ; /* x */ > , "}'),
+    (".c { width: calc(100% - 10px); margin: 0 auto !important }",
+     ".c{width:calc(100% - 10px);margin:0 auto !important}"),
+    ("@media (min-width: 600px) and (max-width: 900px) {\n  .d > .e , .f { top: 0 }\n}",
+     "@media (min-width:600px) and (max-width:900px){.d>.e,.f{top:0}}"),
+    (".g { background: url(http://example.com/a.png) } /* end */", ".g{background:url(http://example.com/a.png)}"),
+])
+def test_minify_css_keeps_meaningful_whitespace_and_strings(source, expected):
+    assert minify_css(source) == expected + "\n"
+    assert css_rules(minify_css(source)) == css_rules(source)
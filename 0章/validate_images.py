@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+画像ファイルのヘッダー検証
+先頭のマジックバイトとヘッダーだけを読んで形式・幅・高さを調べ（ピクセルはデコードしない）、
+拡張子・assets.json のサイズと照合する。HTML のエラーページ・空ファイル・途中で切れたファイル・
+拡張子と中身の形式が違うファイルは .cache/quarantine/ に隔離する
+依存ライブラリ不要
+
+使い方:
+    python validate_images.py
+    python validate_images.py --quarantine --strict-size
+"""
+
+import argparse
+import re
+import shutil
+import struct
+import time
+from pathlib import Path
+
+from asset_manifest import load_manifest, parse_size, split_only
+
+# 画像保存先ディレクトリ
+IMAGES_DIR = Path(__file__).parent / "images"
+
+# 不正なファイルの隔離先
+QUARANTINE_DIR = Path(__file__).parent / ".cache" / "quarantine"
+
+# ヘッダー判定のために読む先頭バイト数（JPEG は APP セグメントを読み飛ばすため別途シーク）
+HEAD_BYTES = 4096
+
+# JPEG の EOI を探す末尾の範囲（EOI の後ろにパディングやメタデータが付いたファイルを許容する）
+JPEG_TAIL_BYTES = 64 * 1024
+
+# 拡張子 → 期待する形式
+EXTENSION_FORMATS = {
+    ".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp",
+    ".avif": "avif", ".gif": "gif", ".svg": "svg",
+}
+
+# JPEG の SOF マーカー（DHT / JPG / DAC を除く C0〜CF）
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+SVG_SIZE = re.compile(rb'<svg[^>]*?\swidth="(\d+)(?:px)?"[^>]*?\sheight="(\d+)(?:px)?"', re.S)
+
+
+class ImageInfo:
+    """
+    ヘッダーから分かる画像の情報
+    """
+
+    def __init__(self, format, width=None, height=None, complete=True):
+        self.format = format
+        self.width = width
+        self.height = height
+        # 終端マーカー（JPEG の EOI / PNG の IEND）まで揃っているか
+        self.complete = complete
+
+    @property
+    def size(self):
+        if self.width is None or self.height is None:
+            return None
+        return f"{self.width}x{self.height}"
+
+
+class InvalidImage(Exception):
+    """
+    画像として使えないファイル
+    """
+
+    def __init__(self, path, problems):
+        super().__init__(f"{Path(path).name}: {'; '.join(problems)}")
+        self.path = path
+        self.problems = problems
+
+
+def _jpeg_dimensions(f):
+    """
+    SOI の後ろのセグメントを長さフィールドで読み飛ばし、SOF の幅・高さを返す
+    """
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in (0x01, 0xD8) or 0xD0 <= code <= 0xD7:
+            continue
+        if code in (0xD9, 0xDA):
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if code in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        f.seek(length - 2, 1)
+
+
+def _ends_with(f, trailer, file_size):
+    if file_size < len(trailer):
+        return False
+    f.seek(file_size - len(trailer))
+    return f.read(len(trailer)) == trailer
+
+
+def _jpeg_has_eoi(f, start, file_size):
+    """
+    start（SOF の直後）以降の末尾 JPEG_TAIL_BYTES に EOI（FFD9）があるかどうか
+    圧縮データ中の FF はスタッフィングされるため、途中で切れたファイルには EOI が現れない
+    （EXIF サムネイルの EOI は SOF より前にあるので対象外）
+    """
+    start = max(start, file_size - JPEG_TAIL_BYTES)
+    f.seek(start)
+    return b"\xff\xd9" in f.read(file_size - start)
+
+
+def probe_image(path):
+    """
+    先頭バイトとヘッダーだけを読んで ImageInfo を返す（画像でなければ format が "html" / "empty" / "unknown"）
+    """
+    path = Path(path)
+    file_size = path.stat().st_size
+    if file_size == 0:
+        return ImageInfo("empty", complete=False)
+
+    with open(path, "rb") as f:
+        head = f.read(HEAD_BYTES)
+
+        if head.startswith(b"\xff\xd8\xff"):
+            dimensions = _jpeg_dimensions(f)
+            # JPEG は圧縮データの後に EOI（FFD9）が来る。途中で切れたファイルは末尾が画像データのまま
+            # EOI の後ろに付いたデータ（パディング・追記されたメタデータ）は許容する
+            complete = _jpeg_has_eoi(f, f.tell(), file_size)
+            if dimensions is None:
+                return ImageInfo("jpeg", complete=complete)
+            return ImageInfo("jpeg", *dimensions, complete=complete)
+
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            width, height = struct.unpack(">II", head[16:24])
+            complete = _ends_with(f, b"IEND\xaeB`\x82", file_size)
+            return ImageInfo("png", width, height, complete=complete)
+
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            complete = 8 + struct.unpack("<I", head[4:8])[0] <= file_size
+            chunk = head[12:16]
+            if chunk == b"VP8 " and len(head) >= 30:
+                width, height = struct.unpack("<HH", head[26:30])
+                return ImageInfo("webp", width & 0x3FFF, height & 0x3FFF, complete=complete)
+            if chunk == b"VP8L" and len(head) >= 25:
+                bits = int.from_bytes(head[21:25], "little")
+                return ImageInfo("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, complete=complete)
+            if chunk == b"VP8X" and len(head) >= 30:
+                width = int.from_bytes(head[24:27], "little") + 1
+                height = int.from_bytes(head[27:30], "little") + 1
+                return ImageInfo("webp", width, height, complete=complete)
+            return ImageInfo("webp", complete=complete)
+
+        if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+            # ispe（image spatial extents）ボックスに幅・高さがある
+            index = head.find(b"ispe")
+            if index != -1 and len(head) >= index + 16:
+                width, height = struct.unpack(">II", head[index + 8:index + 16])
+                return ImageInfo("avif", width, height)
+            return ImageInfo("avif")
+
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            width, height = struct.unpack("<HH", head[6:10])
+            complete = _ends_with(f, b";", file_size)
+            return ImageInfo("gif", width, height, complete=complete)
+
+    text = head.lstrip()[:256].lower()
+    if text.startswith((b"<!doctype html", b"<html")) or b"<html" in text:
+        return ImageInfo("html", complete=False)
+    if text.startswith((b"<?xml", b"<svg")) and b"<svg" in head:
+        match = SVG_SIZE.search(head)
+        if match:
+            return ImageInfo("svg", int(match.group(1)), int(match.group(2)))
+        return ImageInfo("svg")
+    if text.startswith((b"{", b"[")):
+        return ImageInfo("json", complete=False)
+    return ImageInfo("unknown", complete=False)
+
+
+def validate_image(path, expected_size=None, strict_size=False):
+    """
+    path を検証し、(ImageInfo, 致命的な問題のリスト, 警告のリスト) を返す
+    定義サイズとの違いは、生成画像が後段の最適化でリサイズされるため通常は警告にとどめる
+    """
+    path = Path(path)
+    info = probe_image(path)
+    problems, warnings = [], []
+
+    expected_format = EXTENSION_FORMATS.get(path.suffix.lower())
+    if info.format == "empty":
+        problems.append("empty file")
+    elif info.format in ("html", "json", "unknown"):
+        problems.append(f"not an image ({info.format})")
+    else:
+        if expected_format and info.format != expected_format:
+            problems.append(f"{info.format} data saved as {path.suffix}")
+        if not info.complete:
+            problems.append("truncated file")
+        if info.size is None and info.format != "svg":
+            problems.append(f"{info.format} header without dimensions")
+
+    if expected_size and info.size and not problems:
+        width, height = parse_size(expected_size)
+        if (info.width, info.height) != (width, height):
+            message = f"size {info.size} differs from manifest {expected_size}"
+            (problems if strict_size else warnings).append(message)
+
+    return info, problems, warnings
+
+
+def quarantine(path, problems=None, quarantine_dir=QUARANTINE_DIR):
+    """
+    不正なファイルを隔離先へ移動し、移動先のパスを返す
+    同名ファイルを上書きしないよう時刻を付け、理由を .txt に残す
+    """
+    path = Path(path)
+    quarantine_dir = Path(quarantine_dir)
+    quarantine_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    target = quarantine_dir / f"{path.stem}.{stamp}{path.suffix}"
+    shutil.move(str(path), str(target))
+    if problems:
+        target.with_name(target.name + ".txt").write_text("\n".join(problems) + "\n", encoding="utf-8")
+    return target
+
+
+def check_or_quarantine(path, expected_size=None, strict_size=False):
+    """
+    検証して問題があれば隔離し InvalidImage を送出する。問題がなければ (ImageInfo, 警告のリスト) を返す
+    generate_images.py / download_images_unsplash.py が保存直後・スキップ判定前に使う
+    """
+    info, problems, warnings = validate_image(path, expected_size, strict_size)
+    if problems:
+        quarantine(path, problems)
+        raise InvalidImage(path, problems)
+    return info, warnings
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Validate image headers against assets.json")
+    parser.add_argument("--only", action="append", default=None, metavar="NAME",
+                        help="対象を id かファイル名で絞り込む（複数回・カンマ区切り可）")
+    parser.add_argument("--quarantine", action="store_true",
+                        help="問題のあるファイルを .cache/quarantine/ に移動する")
+    parser.add_argument("--strict-size", action="store_true",
+                        help="定義サイズと異なる画像も不正として扱う")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    try:
+        assets = load_manifest().select(split_only(args.only))
+    except KeyError as e:
+        raise SystemExit(f"✗ {e.args[0]}")
+
+    print("="*80)
+    print("Image Header Validator")
+    print(f"Assets: {len(assets)}")
+    print(f"Directory: {IMAGES_DIR}")
+    print("="*80)
+
+    checked = missing = 0
+    invalid, warned = [], []
+    for asset in assets:
+        path = IMAGES_DIR / asset["filename"]
+        if not path.exists():
+            missing += 1
+            continue
+        checked += 1
+        info, problems, warnings = validate_image(path, asset.get("size"), args.strict_size)
+        if problems:
+            invalid.append(asset["filename"])
+            print(f"✗ {asset['filename']}: {'; '.join(problems)}")
+            if args.quarantine:
+                print(f"  → quarantined: {quarantine(path, problems)}")
+        elif warnings:
+            warned.append(asset["filename"])
+            print(f"⚠ {asset['filename']} ({info.format} {info.size}): {'; '.join(warnings)}")
+        else:
+            print(f"✓ {asset['filename']} ({info.format} {info.size})")
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Checked: {checked}")
+    print(f"Missing: {missing}")
+    print(f"Invalid: {len(invalid)}")
+    print(f"Size warnings: {len(warned)}")
+    print("="*80)
+    # 隔離した場合も失敗として返し、ビルドの後続ステージを止める（次回の取得で作り直す）
+    if invalid:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
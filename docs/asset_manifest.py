@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+画像アセット定義（assets.json）の読み込み
+Gemini 生成・Unsplash ダウンロード・SVG プレースホルダーの3スクリプトが共有する。
+初回アクセス時に一度だけ読み込み、id とファイル名の索引で O(1) に引ける
+依存ライブラリ不要
+"""
+
+import functools
+import json
+import re
+from pathlib import Path
+
+from file_utils import atomic_write
+
+# アセット定義ファイル
+MANIFEST_PATH = Path(__file__).parent / "assets.json"
+
+DEFAULT_SIZE = "1024x1024"
+
+
+class AssetManifest:
+    """
+    アセット定義の一覧と索引
+    """
+
+    def __init__(self, assets, path=None):
+        self.path = path
+        self.assets = list(assets)
+        self.by_id = {}
+        self.by_filename = {}
+        for asset in self.assets:
+            if asset["id"] in self.by_id or asset["filename"] in self.by_filename:
+                raise ValueError(f"duplicate asset in manifest: {asset['id']}")
+            self.by_id[asset["id"]] = asset
+            self.by_filename[asset["filename"]] = asset
+
+    def __len__(self):
+        return len(self.assets)
+
+    def get(self, name):
+        """
+        id（hero-bg）またはファイル名（hero-bg.jpg）でアセットを取得
+        """
+        asset = self.by_id.get(name) or self.by_filename.get(name)
+        if asset is None:
+            raise KeyError(name)
+        return asset
+
+    def select(self, only=None):
+        """
+        only に指定された id / ファイル名のアセットを定義順で返す（未指定なら全件）
+        """
+        if not only:
+            return list(self.assets)
+        unknown = [name for name in only if name not in self.by_id and name not in self.by_filename]
+        if unknown:
+            raise KeyError(f"unknown asset(s): {', '.join(unknown)}")
+        wanted = {self.get(name)["id"] for name in only}
+        return [asset for asset in self.assets if asset["id"] in wanted]
+
+    def image_prompts(self, only=None):
+        """
+        generate_images.py 用の定義（filename / prompt / size）
+        """
+        return [
+            dict({"filename": asset["filename"], "prompt": asset["prompt"],
+                  "size": asset.get("size", DEFAULT_SIZE)}, **_variant_of(asset))
+            for asset in self.select(only) if asset.get("prompt")
+        ]
+
+    def image_downloads(self, only=None):
+        """
+        download_images_unsplash.py 用の定義（filename / query / size）
+        """
+        return [
+            dict({"filename": asset["filename"], "query": asset["query"],
+                  "size": asset.get("size", DEFAULT_SIZE)}, **_variant_of(asset))
+            for asset in self.select(only) if asset.get("query")
+        ]
+
+    def placeholders(self, only=None):
+        """
+        generate_placeholder_images.py 用の定義（filename / width / height / gradient / text / icon）
+        """
+        images = []
+        for asset in self.select(only):
+            width, height = parse_size(asset.get("size", DEFAULT_SIZE))
+            placeholder = asset.get("placeholder", {})
+            images.append({
+                "filename": asset["filename"], "width": width, "height": height,
+                "gradient": placeholder.get("gradient", ["#2C5F8D", "#4A90E2"]),
+                "text": placeholder.get("text", asset["id"]),
+                "icon": placeholder.get("icon", "📷"),
+            })
+        return images
+
+
+def _variant_of(asset):
+    # variant: 重複などで別の画像を取り直したときの番号（未指定なら含めない）
+    return {"variant": asset["variant"]} if asset.get("variant") else {}
+
+
+def parse_size(size):
+    """
+    "1920x1080" → (1920, 1080)
+    """
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+@functools.lru_cache(maxsize=None)
+def load_manifest(path=MANIFEST_PATH):
+    """
+    アセット定義を読み込む（同じパスは一度だけ読み込む）
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return AssetManifest(data["assets"], path=Path(path))
+
+
+def split_only(values):
+    """
+    --only の指定（複数回・カンマ区切りのどちらも可）を名前のリストにする
+    """
+    names = []
+    for value in values or []:
+        names.extend(name.strip() for name in value.split(",") if name.strip())
+    return names
+
+
+def _without_variant(asset):
+    return {key: value for key, value in asset.items() if key != "variant"}
+
+
+def mirrored_manifests(name, path=MANIFEST_PATH):
+    """
+    name と同じ定義（variant 以外）のアセットを持つ、他のサイトの assets.json
+    （0章/ と docs/ のように、リポジトリ直下の別ディレクトリにある写し）
+    """
+    path = Path(path).resolve()
+    asset = _without_variant(load_manifest(path).get(name))
+    mirrors = []
+    for other in sorted(path.parent.parent.glob(f"*/{path.name}")):
+        if other.resolve() == path:
+            continue
+        try:
+            mirrored = load_manifest(other).get(asset["id"])
+        except (KeyError, ValueError, OSError):
+            continue
+        if _without_variant(mirrored) == asset:
+            mirrors.append(other)
+    return mirrors
+
+
+def bump_variant(name, path=MANIFEST_PATH):
+    """
+    アセットの variant を1つ進めて assets.json と、同じ定義を持つ他のサイトの写しに書き戻し、
+    新しい番号を返す（写しどうしで番号がずれていれば大きい方から進めて揃える）
+    サイト間で生成キーが揃うため、共有ストアの結果をそのまま使い回せる
+    """
+    paths = [Path(path), *mirrored_manifests(name, path)]
+    asset_id = load_manifest(Path(path)).get(name)["id"]
+    variant = max(int(load_manifest(p).get(asset_id).get("variant", 0)) for p in paths) + 1
+    for manifest_path in paths:
+        _write_variant(manifest_path, asset_id, variant)
+    load_manifest.cache_clear()
+    return variant
+
+
+def _write_variant(path, asset_id, variant):
+    """
+    手で整えた書式を崩さないよう、該当アセットの行だけを書き換える
+    """
+    text = path.read_text(encoding="utf-8")
+    start = text.index(f'"id": {json.dumps(asset_id, ensure_ascii=False)},')
+    end = text.find('"id": ', start + 1)
+    end = len(text) if end == -1 else end
+    block = text[start:end]
+    if '"variant":' in block:
+        block = re.sub(r'"variant": \d+', f'"variant": {variant}', block, count=1)
+    else:
+        block = re.sub(r'(\n(\s*)"size": [^\n]*,)', rf'\1\n\2"variant": {variant},', block, count=1)
+    with atomic_write(path, "w", encoding="utf-8") as f:
+        f.write(text[:start] + block + text[end:])
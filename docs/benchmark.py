@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+画像取得スクリプトのスループット・レイテンシ計測
+mock_server.py を別プロセスで起動し、generate_image() / download_image() を
+実行モード（同時実行数）ごとに計測する。本番サービスには接続しない
+依存ライブラリ不要
+
+使い方:
+    python benchmark.py --modes 1,4,8 --latency 0.3 --payload-kb 1500
+    python benchmark.py --target unsplash --count 100 --json bench.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from http_client import HTTPClient
+from retry_policy import CircuitBreaker, RetryPolicy
+
+MOCK_SERVER = Path(__file__).parent / "mock_server.py"
+
+
+class MockProcess:
+    """
+    mock_server.py を子プロセスとして起動する
+    サーバー側のメモリ使用量が計測値に混ざらないよう、別プロセスで動かす
+    """
+
+    def __init__(self, args):
+        command = [
+            sys.executable, "-u", str(MOCK_SERVER), "--port", "0",
+            "--latency", str(args.latency), "--jitter", str(args.jitter),
+            "--payload-kb", str(args.payload_kb), "--rate-429", str(args.rate_429),
+            "--rate-500", str(args.rate_500), "--rate-text", str(args.rate_text),
+            "--rate-truncate", str(args.rate_truncate),
+            "--seed", str(args.seed),
+        ]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        self.url = None
+        for line in self.process.stdout:
+            if line.startswith("URL: "):
+                self.url = line[len("URL: "):].strip()
+                break
+        if self.url is None:
+            self.process.kill()
+            raise RuntimeError("mock server failed to start")
+
+    def stats(self):
+        with urllib.request.urlopen(f"{self.url}/_mock/stats", timeout=10) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def reset(self):
+        request = urllib.request.Request(f"{self.url}/_mock/reset", data=b"", method="POST")
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+def percentile(values, pct):
+    """
+    最近傍順位法によるパーセンタイル
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.4999)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def expand_items(items, count):
+    """
+    定義リストを count 件になるまで繰り返す（ファイル名は重複しないよう連番を付与）
+    """
+    expanded = []
+    for n in range(count):
+        item = dict(items[n % len(items)])
+        if n >= len(items):
+            stem, _, ext = item["filename"].rpartition(".")
+            item["filename"] = f"{stem}-{n // len(items)}.{ext}"
+        expanded.append(item)
+    return expanded
+
+
+def load_targets(server_url):
+    """
+    計測対象のスクリプトを模擬サーバー向けに読み込む
+    """
+    os.environ["GEMINI_API_BASE"] = server_url
+    os.environ["UNSPLASH_BASE_URL"] = server_url
+    os.environ.setdefault("GEMINI_API", "benchmark")
+
+    generate_images = importlib.import_module("generate_images")
+    download_images = importlib.import_module("download_images_unsplash")
+    return {
+        "gemini": (generate_images, generate_images.image_prompts(), generate_images.generate_image),
+        "unsplash": (download_images, download_images.image_downloads(), download_images.download_image),
+    }
+
+
+def run_mode(server, module, func, items, concurrency, breaker_cooldown):
+    """
+    1つの実行モードを計測
+    """
+    server.reset()
+    client = HTTPClient(pool_size=concurrency)
+    policy = RetryPolicy(breaker=CircuitBreaker(cooldown=breaker_cooldown))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        module.IMAGES_DIR = Path(tmp_dir)
+
+        def timed(item):
+            started = time.perf_counter()
+            ok = func(item, client=client, policy=policy)
+            return ok, time.perf_counter() - started
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        # スクリプトの進捗表示は計測結果に含めない
+        with contextlib.redirect_stdout(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(timed, items))
+        elapsed = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    client.close()
+    stats = server.stats()
+    latencies = [latency for _, latency in results]
+    succeeded = sum(1 for ok, _ in results if ok)
+
+    return {
+        "concurrency": concurrency,
+        "images": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "elapsed_sec": round(elapsed, 3),
+        "images_per_sec": round(succeeded / elapsed, 3) if elapsed else 0.0,
+        "latency_p50_sec": round(percentile(latencies, 50), 3),
+        "latency_p95_sec": round(percentile(latencies, 95), 3),
+        "retries": max(0, stats.get("attempt", 0) - len(items)),
+        "peak_memory_mb": round(peak_memory / (1024 * 1024), 2),
+        "server": stats,
+    }
+
+
+def print_table(target, rows):
+    """
+    計測結果を表形式で表示
+    """
+    print(f"\n[{target}]")
+    print(f"{'mode':>10} {'ok/total':>10} {'img/s':>8} {'p50(s)':>8} {'p95(s)':>8} "
+          f"{'retries':>8} {'peak MB':>8}")
+    for row in rows:
+        mode = f"x{row['concurrency']}"
+        print(f"{mode:>10} {row['succeeded']:>4}/{row['images']:<5} {row['images_per_sec']:>8.2f} "
+              f"{row['latency_p50_sec']:>8.3f} {row['latency_p95_sec']:>8.3f} "
+              f"{row['retries']:>8} {row['peak_memory_mb']:>8.2f}")
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Benchmark image pipelines against the mock server")
+    parser.add_argument("--target", choices=["gemini", "unsplash", "all"], default="all")
+    parser.add_argument("--modes", default="1,4,8", help="計測する同時実行数（カンマ区切り）")
+    parser.add_argument("--count", type=int, default=None, help="1モードあたりの画像数（既定: 全画像）")
+    parser.add_argument("--latency", type=float, default=0.2, help="模擬サーバーの応答遅延秒数")
+    parser.add_argument("--jitter", type=float, default=0.1, help="応答遅延に加える最大ランダム秒数")
+    parser.add_argument("--payload-kb", type=int, default=1024, help="画像サイズ（KB）")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--rate-text", type=float, default=0.0)
+    parser.add_argument("--rate-truncate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--breaker-cooldown", type=float, default=2.0,
+                        help="サーキットブレーカーの停止秒数（計測用に短めの既定値）")
+    parser.add_argument("--json", dest="json_path", default=None, help="結果をJSONで書き出すパス")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    modes = [max(1, int(mode)) for mode in args.modes.split(",") if mode.strip()]
+    report = {"settings": vars(args), "results": {}}
+
+    with MockProcess(args) as server:
+        targets = load_targets(server.url)
+        selected = ["gemini", "unsplash"] if args.target == "all" else [args.target]
+
+        print("="*80)
+        print("Image Pipeline Benchmark")
+        print(f"Mock server: {server.url}")
+        print(f"Latency: {args.latency}s (+{args.jitter}s), Payload: {args.payload_kb} KB")
+        print("="*80)
+
+        for target in selected:
+            module, items, func = targets[target]
+            items = expand_items(items, args.count or len(items))
+            rows = [run_mode(server, module, func, items, concurrency, args.breaker_cooldown)
+                    for concurrency in modes]
+            report["results"][target] = rows
+            print_table(target, rows)
+
+    # プロセス全体の最大RSS（Linux は KB、macOS はバイト単位）
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    report["max_rss_kb"] = max_rss
+    print(f"\nProcess max RSS: {max_rss} (ru_maxrss)")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✓ Report written: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+サイト間で共有するコンテンツアドレス型のファイルストア
+画像を SHA-256 をキーに1つだけ保存し（objects/）、各サイトの images/ にはハードリンク
+（できなければ reflink、最後にコピー）で配置する。生成キー・取得元 URL・最適化条件などの
+名前 → 内容ハッシュの対応は refs/ に記録し、0章/ と docs/ のどちらで作った結果も再利用する
+既定の保存先はリポジトリ直下の .asset-store/（ASSET_STORE_DIR で変更可）
+依存ライブラリ不要
+
+使い方:
+    python blob_store.py stats
+    python blob_store.py adopt images ../docs/images
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+
+from file_utils import atomic_copy, atomic_write_bytes, atomic_write_json, file_sha256
+
+try:
+    import fcntl
+except ImportError:  # Windows では reflink を使わない
+    fcntl = None
+
+# 共有ストアの保存先（0章/ と docs/ の両方から同じ場所を指す）
+STORE_DIR = Path(os.environ.get("ASSET_STORE_DIR") or Path(__file__).resolve().parent.parent / ".asset-store")
+
+# Linux の FICLONE（reflink）ioctl 番号
+FICLONE = 0x40049409
+
+
+def _reflink(source, target):
+    if fcntl is None:
+        raise OSError("reflink is not supported on this platform")
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def place(source, target):
+    """
+    source を target に配置する（ハードリンク → reflink → コピーの順に試す）
+    一時名で作ってから rename するため、target が途中の状態で見えることはない
+    戻り値は使った方法（"existing" / "hardlink" / "reflink" / "copy"）
+    """
+    source, target = Path(source), Path(target)
+    with contextlib.suppress(FileNotFoundError):
+        if os.path.samefile(source, target):
+            return "existing"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_name = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    for method, operation in (("hardlink", os.link), ("reflink", _reflink)):
+        try:
+            operation(source, tmp_name)
+        except OSError:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_name)
+            continue
+        os.replace(tmp_name, target)
+        return method
+    atomic_copy(source, target)
+    return "copy"
+
+
+class BlobStore:
+    """
+    objects/{ハッシュ先頭2文字}/{ハッシュ}{拡張子} と refs/{名前空間}/{キー}.json
+    サイト側のファイルはストアと同じ inode を共有するため、書き換えは必ず
+    一時ファイル + rename（file_utils.atomic_write）で行うこと
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.refs_dir = self.root / "refs"
+
+    def object_path(self, sha256, suffix=""):
+        return self.objects_dir / sha256[:2] / f"{sha256}{suffix}"
+
+    def find(self, sha256):
+        """
+        sha256 の保存先（拡張子は問わない）。無ければ None
+        """
+        directory = self.objects_dir / sha256[:2]
+        if not directory.is_dir():
+            return None
+        for path in directory.glob(f"{sha256}*"):
+            return path
+        return None
+
+    def has(self, sha256):
+        return self.find(sha256) is not None
+
+    def put_file(self, path):
+        """
+        path をストアに取り込み、内容ハッシュを返す
+        同じ内容が既にあれば path をそのオブジェクトへのリンクに置き換え、ディスク上は1つにまとめる
+        """
+        path = Path(path)
+        sha256 = file_sha256(path)
+        existing = self.find(sha256)
+        if existing is None:
+            place(path, self.object_path(sha256, path.suffix.lower()))
+        else:
+            place(existing, path)
+        return sha256
+
+    def put_bytes(self, data, suffix=""):
+        sha256 = hashlib.sha256(data).hexdigest()
+        if not self.has(sha256):
+            atomic_write_bytes(self.object_path(sha256, suffix), data)
+        return sha256
+
+    def link(self, sha256, target):
+        """
+        オブジェクトを target に配置し、使った方法を返す（無ければ KeyError）
+        """
+        source = self.find(sha256)
+        if source is None:
+            raise KeyError(sha256)
+        return place(source, target)
+
+    def _ref_path(self, namespace, key):
+        return self.refs_dir / namespace / key[:2] / f"{key}.json"
+
+    def get_ref(self, namespace, key):
+        """
+        名前 → 内容の記録（{"sha256", ...}）。無い、または対象のオブジェクトが消えていれば None
+        """
+        try:
+            with open(self._ref_path(namespace, key), encoding="utf-8") as f:
+                ref = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return ref if self.has(ref.get("sha256", "")) else None
+
+    def set_ref(self, namespace, key, sha256, **meta):
+        atomic_write_json(self._ref_path(namespace, key), dict(meta, sha256=sha256), sort_keys=True)
+
+    def stats(self):
+        objects = [path for path in self.objects_dir.glob("*/*") if not path.name.startswith(".")]
+        return {
+            "objects": len(objects),
+            "bytes": sum(path.stat().st_size for path in objects),
+            "linked": sum(1 for path in objects if path.stat().st_nlink > 1),
+            "refs": sum(1 for _ in self.refs_dir.glob("*/*/*.json")),
+        }
+
+
+def ref_key(*parts):
+    """
+    任意の値の組から refs のキー（SHA-256）を作る
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Shared content-addressed asset store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="保存数・容量を表示")
+    adopt = subparsers.add_parser("adopt", help="既存の画像をストアに取り込み、リンクに置き換える")
+    adopt.add_argument("dirs", nargs="+", help="images ディレクトリ")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    store = BlobStore()
+
+    print("="*80)
+    print("Asset Store")
+    print(f"Directory: {store.root}")
+    print("="*80)
+
+    if args.command == "adopt":
+        for directory in args.dirs:
+            paths = [path for path in sorted(Path(directory).iterdir())
+                     if path.is_file() and not path.name.startswith(".")]
+            for path in paths:
+                store.put_file(path)
+            print(f"✓ {directory}: {len(paths)} file(s)")
+
+    stats = store.stats()
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Objects: {stats['objects']}")
+    print(f"Size: {stats['bytes'] / 1024:.1f} KB")
+    print(f"Linked from sites: {stats['linked']}")
+    print(f"Refs: {stats['refs']}")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+サイト用アセットのビルド（パイプラインを DAG として実行）
+source（Gemini / Unsplash、取得できなければプレースホルダーで代用）→ validate → optimize →
+lqip / variants（srcset 用の幅違い）→ html → site（ハッシュ付きの公開用 dist/）の各ステージを
+依存関係に従って実行する。依存の無いステージ（SVG プレースホルダーなど）は並列に動かし、
+入力ファイルのハッシュが前回成功時と同じステージはスキップする
+各ステージの実体は既存のスクリプトで、出力は .cache/build/logs/ に残す
+ビルドはこのスクリプトのあるサイト（0章/ など）単位。--all-sites を付けると、同じパイプラインを持つ
+他のサイト（docs/ など）も続けてビルドする（共有ストアにより2つ目以降のエンコードはほぼ省ける）。
+サイト間でスクリプトや assets.json が食い違っていれば警告する
+依存ライブラリ不要（各ステージが必要とするものを除く）
+
+使い方:
+    python build.py
+    python build.py --source unsplash --jobs 2
+    python build.py --force --dry-run
+    python build.py --all-sites
+"""
+
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from asset_manifest import MANIFEST_PATH, load_manifest
+from file_utils import atomic_write_bytes, atomic_write_json, file_sha256
+from generate_placeholder_images import is_placeholder, load_placeholder_manifest, remove_placeholders
+
+SCRIPT_DIR = Path(__file__).parent
+
+# 画像保存先ディレクトリ
+IMAGES_DIR = SCRIPT_DIR / "images"
+
+# 書き換える HTML
+HTML_PATH = SCRIPT_DIR / "index.html"
+
+# ステージごとの入力ハッシュ（前回成功時）とログの保存先
+BUILD_STATE_PATH = SCRIPT_DIR / ".cache" / "build" / "state.json"
+BUILD_LOG_DIR = SCRIPT_DIR / ".cache" / "build" / "logs"
+
+SOURCES = ("auto", "gemini", "unsplash", "placeholder")
+SOURCE_SCRIPTS = {"gemini": "generate_images.py", "unsplash": "download_images_unsplash.py"}
+
+
+class Stage:
+    """
+    DAG の1ノード
+    inputs() が返すファイル（と command）のハッシュが前回と同じで、outputs() が揃っていればスキップする
+    run() は完了したかどうかを返す（False なら次回も実行する。例: プレースホルダーで代用した）
+    """
+
+    def __init__(self, name, deps, inputs, run, outputs=None, command=()):
+        self.name = name
+        self.deps = tuple(deps)
+        self.inputs = inputs
+        self.run = run
+        self.outputs = outputs or (lambda: [])
+        self.command = tuple(command)
+
+    def digest(self):
+        h = hashlib.sha256(json.dumps(self.command).encode("utf-8"))
+        for path in sorted(set(self.inputs())):
+            path = Path(path)
+            h.update(str(path.relative_to(SCRIPT_DIR) if path.is_absolute() else path).encode("utf-8"))
+            h.update(file_sha256(path).encode("ascii") if path.exists() else b"-")
+        return h.hexdigest()
+
+    def is_current(self, state):
+        return state.get(self.name) == self.digest() and all(Path(p).exists() for p in self.outputs())
+
+
+def run_script(stage_name, script, *args):
+    """
+    スクリプトをサブプロセスで実行し、出力をステージのログに保存する（失敗時は例外）
+    """
+    BUILD_LOG_DIR.mkdir(parents=True, exist_ok=True)
+    log_path = BUILD_LOG_DIR / f"{stage_name}.log"
+    with open(log_path, "ab") as log:
+        log.write(f"\n$ {script} {' '.join(args)}\n".encode("utf-8"))
+        log.flush()
+        result = subprocess.run([sys.executable, str(SCRIPT_DIR / script), *args], cwd=SCRIPT_DIR,
+                                stdout=log, stderr=subprocess.STDOUT, check=False)
+    if result.returncode != 0:
+        tail = log_path.read_text(encoding="utf-8", errors="replace").splitlines()[-5:]
+        raise RuntimeError(f"{script} exited with {result.returncode}: " + " / ".join(tail))
+
+
+def asset_paths():
+    return [IMAGES_DIR / asset["filename"] for asset in load_manifest().assets]
+
+
+def resolve_source(source):
+    if source != "auto":
+        return source
+    from generate_images import get_api_key
+    try:
+        get_api_key()
+    except ValueError:
+        return "unsplash"
+    return "gemini"
+
+
+def run_source(source):
+    """
+    本画像を取得する。取得できなかったものが残れば未完了とし、次回のビルドで取得し直す
+    """
+    def run():
+        if source == "placeholder":
+            return True
+        # 前回代用したプレースホルダーは消して（記録も外して）、取得し直す
+        remove_placeholders(asset_paths())
+        try:
+            run_script("source", SOURCE_SCRIPTS[source])
+        except RuntimeError as e:
+            print(f"⚠ source: {e}")
+        return all(path.exists() for path in asset_paths())
+    return run
+
+
+def run_fallback():
+    """
+    取得できなかった画像を定義サイズのラスタープレースホルダーで代用する
+    （.placeholder-manifest.json を書くため、placeholders ステージの後に実行する）
+    """
+    missing = [path.name for path in asset_paths() if not path.exists()]
+    if missing:
+        run_script("fallback", "generate_placeholder_images.py", "--raster", "jpeg", "--only", ",".join(missing))
+    return True
+
+
+def referenced_images():
+    from responsive_images import referenced_images as find_referenced
+    return [IMAGES_DIR / name for name in find_referenced(HTML_PATH.read_text(encoding="utf-8"))]
+
+
+def run_html():
+    """
+    index.html の <img> を srcset.json の <picture> に書き換え、lqip.json のプレビューを埋め込む
+    （変わったときだけ書き込む）
+    """
+    from lqip import embed_lqip, load_lqip_manifest
+    from responsive_images import load_srcset_manifest, rewrite_html
+    html = HTML_PATH.read_text(encoding="utf-8")
+    updated = rewrite_html(html, load_srcset_manifest(IMAGES_DIR))
+    updated = embed_lqip(updated, load_lqip_manifest(IMAGES_DIR))
+    if updated != html:
+        atomic_write_bytes(HTML_PATH, updated.encode("utf-8"))
+    return True
+
+
+def build_stages(source):
+    """
+    ステージの定義（依存関係の順に並べる）
+    """
+    def scripts(*names):
+        return [SCRIPT_DIR / name for name in names]
+
+    def image_files(*suffixes):
+        return [path for path in IMAGES_DIR.iterdir() if path.suffix.lower() in suffixes]
+
+    def optimized_paths():
+        # プレースホルダーからは作らない
+        placeholders = load_placeholder_manifest()
+        return [path.with_suffix(".webp") for path in asset_paths()
+                if path.exists() and not is_placeholder(path, placeholders)]
+
+    def script_stage(name, script, *args):
+        def run():
+            run_script(name, script, *args)
+            return True
+        return run
+
+    return [
+        Stage("placeholders", [],
+              lambda: [MANIFEST_PATH, *scripts("generate_placeholder_images.py", "svg_optimize.py")],
+              script_stage("placeholders", "generate_placeholder_images.py"),
+              outputs=lambda: [IMAGES_DIR / "placeholders-sprite.svg"]),
+        Stage("source", [],
+              lambda: [MANIFEST_PATH, *scripts(*SOURCE_SCRIPTS.values())],
+              run_source(source), outputs=asset_paths, command=[source]),
+        Stage("fallback", ["source", "placeholders"],
+              lambda: [MANIFEST_PATH, *scripts("generate_placeholder_images.py")],
+              run_fallback, outputs=asset_paths),
+        # 期待するサイズは assets.json から読むため、定義が変わっても検証し直す
+        Stage("validate", ["fallback"],
+              lambda: [MANIFEST_PATH, *asset_paths(), *scripts("validate_images.py")],
+              script_stage("validate", "validate_images.py", "--quarantine")),
+        Stage("optimize", ["validate"],
+              lambda: [MANIFEST_PATH, *asset_paths(), *scripts("optimize_images.py")],
+              script_stage("optimize", "optimize_images.py"), outputs=optimized_paths),
+        Stage("lqip", ["optimize"],
+              lambda: [*image_files(".jpg", ".jpeg", ".png", ".webp", ".avif"), *scripts("lqip.py")],
+              script_stage("lqip", "lqip.py"),
+              outputs=lambda: [IMAGES_DIR / "lqip.json"]),
+        # HTML が参照する画像だけが入力（html ステージが index.html を書き換えても再実行しない）
+        Stage("variants", ["optimize"],
+              lambda: [*referenced_images(), *scripts("responsive_images.py", "optimize_images.py")],
+              script_stage("variants", "responsive_images.py"),
+              outputs=lambda: [IMAGES_DIR / "srcset.json"]),
+        Stage("html", ["lqip", "variants"],
+              lambda: [HTML_PATH, IMAGES_DIR / "lqip.json", IMAGES_DIR / "srcset.json",
+                       *scripts("lqip.py", "responsive_images.py")],
+              run_html),
+        # 公開用の dist/（ファイル名に内容ハッシュを付けたもの）
+        Stage("site", ["html"],
+              lambda: [HTML_PATH, SCRIPT_DIR / "style.css", SCRIPT_DIR / "script.js", *referenced_images(),
+                       *sorted((IMAGES_DIR / "responsive").glob("*")),
+                       *scripts("site_build.py", "blob_store.py", "svg_optimize.py")],
+              script_stage("site", "site_build.py"),
+              outputs=lambda: [SCRIPT_DIR / "dist" / "index.html", SCRIPT_DIR / "dist" / "asset-manifest.json"]),
+    ]
+
+
+def load_state():
+    try:
+        with open(BUILD_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def run_dag(stages, state, jobs=None, force=False, dry_run=False):
+    """
+    依存が満たされたステージから並列に実行する
+    戻り値は {ステージ名: "built" / "skipped" / "incomplete" / "failed" / "blocked"}
+    """
+    by_name = {stage.name: stage for stage in stages}
+    results = {}
+    running = {}
+    ok = ("built", "skipped", "incomplete")
+
+    with ThreadPoolExecutor(max_workers=jobs or len(stages)) as executor:
+        while len(results) < len(stages):
+            progressed = False
+            for stage in stages:
+                if stage.name in results or stage.name in running.values():
+                    continue
+                statuses = [results.get(dep) for dep in stage.deps]
+                if any(status in ("failed", "blocked") for status in statuses):
+                    # 依存先が失敗したステージは実行しない
+                    results[stage.name] = "blocked"
+                    print(f"✗ {stage.name}: blocked by a failed dependency")
+                elif not all(status in ok for status in statuses):
+                    continue
+                elif not force and stage.is_current(state):
+                    results[stage.name] = "skipped"
+                    print(f"= {stage.name}: unchanged, skipped")
+                elif dry_run:
+                    results[stage.name] = "built"
+                    print(f"→ {stage.name}: would run")
+                else:
+                    print(f"→ {stage.name}: running")
+                    running[executor.submit(_timed, stage.run)] = stage.name
+                progressed = True
+            if progressed and not running:
+                continue
+            if not running:
+                raise RuntimeError("dependency cycle or unknown dependency among stages")
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    complete, elapsed = future.result()
+                except Exception as e:
+                    # --force で実行して失敗した場合も、次回スキップしないよう記録を消す
+                    state.pop(name, None)
+                    atomic_write_json(BUILD_STATE_PATH, state, sort_keys=True)
+                    results[name] = "failed"
+                    print(f"✗ {name}: {e}")
+                    continue
+                if complete:
+                    state[name] = by_name[name].digest()
+                    results[name] = "built"
+                    print(f"✓ {name}: done in {elapsed:.2f}s")
+                else:
+                    state.pop(name, None)
+                    results[name] = "incomplete"
+                    print(f"⚠ {name}: done in {elapsed:.2f}s with fallbacks (will run again next build)")
+                atomic_write_json(BUILD_STATE_PATH, state, sort_keys=True)
+    return results
+
+
+def sibling_sites():
+    """
+    同じパイプラインを持つ他のサイト（リポジトリ直下の別ディレクトリにある build.py と assets.json の写し）
+    """
+    here = SCRIPT_DIR.resolve()
+    return [path.parent for path in sorted(here.parent.glob(f"*/{Path(__file__).name}"))
+            if path.parent != here and (path.parent / MANIFEST_PATH.name).exists()]
+
+
+def out_of_sync(site):
+    """
+    このサイトと site で内容の違うスクリプト・assets.json の名前（片方にしか無いものを含む）
+    テスト（test_*.py）は 0章/ にだけ置くため比べない
+    """
+    names = {path.name for directory in (SCRIPT_DIR, Path(site)) for path in directory.glob("*.py")
+             if not path.name.startswith("test_")}
+    names.add(MANIFEST_PATH.name)
+    differs = []
+    for name in sorted(names):
+        ours, theirs = SCRIPT_DIR / name, Path(site) / name
+        if not ours.exists() or not theirs.exists() or file_sha256(ours) != file_sha256(theirs):
+            differs.append(name)
+    return differs
+
+
+def _timed(run):
+    started = time.perf_counter()
+    complete = run()
+    return complete, time.perf_counter() - started
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Build site assets as a dependency graph")
+    parser.add_argument("--source", choices=SOURCES, default="auto",
+                        help="画像の取得元（auto: GEMINI_API があれば Gemini、なければ Unsplash）")
+    parser.add_argument("--jobs", type=int, default=None, help="同時に実行するステージ数 (default: 制限なし)")
+    parser.add_argument("--force", action="store_true", help="入力が変わっていなくても全ステージを実行する")
+    parser.add_argument("--dry-run", action="store_true", help="実行するステージを表示するだけ")
+    parser.add_argument("--all-sites", action="store_true",
+                        help="同じパイプラインを持つ他のサイト（docs/ など）も続けてビルドする")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    source = resolve_source(args.source)
+    stages = build_stages(source)
+    sites = sibling_sites() if args.all_sites else []
+
+    print("="*80)
+    print("Site Asset Build")
+    print(f"Source: {source}")
+    print(f"Stages: {' → '.join(stage.name for stage in stages)}")
+    print(f"State: {BUILD_STATE_PATH}")
+    if sites:
+        print(f"Then: {', '.join(site.name + '/' for site in sites)}")
+    print("="*80)
+    for site in sites:
+        differs = out_of_sync(site)
+        if differs:
+            print(f"⚠ {site.name}/ differs from {SCRIPT_DIR.resolve().name}/: {', '.join(differs)}")
+
+    started = time.perf_counter()
+    results = run_dag(stages, load_state(), args.jobs, args.force, args.dry_run)
+    counts = {status: sum(1 for value in results.values() if value == status)
+              for status in ("built", "skipped", "incomplete", "failed", "blocked")}
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    for status, count in counts.items():
+        print(f"{status.capitalize()}: {count}")
+    print(f"Elapsed: {time.perf_counter() - started:.2f}s")
+    print(f"Logs: {BUILD_LOG_DIR}")
+    print("="*80)
+
+    failed = bool(counts["failed"] or counts["blocked"])
+    for site in sites:
+        print(f"\n→ {site.name}/")
+        command = [sys.executable, str(site / Path(__file__).name), "--source", args.source]
+        command += [flag for flag, enabled in (("--force", args.force), ("--dry-run", args.dry_run)) if enabled]
+        if args.jobs:
+            command += ["--jobs", str(args.jobs)]
+        failed |= subprocess.run(command, cwd=site, check=False).returncode != 0
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
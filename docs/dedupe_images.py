@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+知覚ハッシュ（dHash / pHash）による重複画像の検出
+images/ の各画像から 64bit の dHash・pHash を NumPy で計算し（プロセスプールで並列）、
+.cache/perceptual-hashes.json に保存する。サイズと更新時刻が変わっていない画像は再計算しない。
+ハミング距離が閾値以下の組を重複として報告し、--refetch で2枚目以降を別の画像に取り直す
+プレースホルダーのまま（generate_placeholder_images.py が書いた内容のまま）の画像は対象にしない
+依存ライブラリ: Pillow, NumPy
+
+使い方:
+    python dedupe_images.py
+    python dedupe_images.py --threshold 8 --refetch
+"""
+
+import argparse
+import functools
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from asset_manifest import bump_variant, load_manifest, split_only
+from file_utils import atomic_write_json
+from generate_placeholder_images import is_placeholder, load_placeholder_manifest
+from generation_cache import MANIFEST_NAME
+from metrics import REPORTS_DIR
+from validate_images import quarantine
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:  # 未インストールでも import 自体は失敗させない
+    np = None
+    Image = None
+
+# 画像保存先ディレクトリ
+IMAGES_DIR = Path(__file__).parent / "images"
+
+# ハッシュの保存先
+HASH_INDEX_PATH = Path(__file__).parent / ".cache" / "perceptual-hashes.json"
+
+# 重複とみなすハミング距離（dHash・pHash の両方がこの値以下）
+DEFAULT_THRESHOLD = 10
+
+# pHash の DCT をかける縮小サイズと、使う低周波成分の大きさ
+PHASH_SIZE = 32
+PHASH_LOW = 8
+
+SCRIPT_DIR = Path(__file__).parent
+
+
+def require_dependencies():
+    if np is None or Image is None:
+        raise RuntimeError("Pillow and NumPy are required for perceptual hashing: pip install Pillow numpy")
+
+
+@functools.lru_cache(maxsize=None)
+def _dct_matrix(n):
+    """
+    n 点の DCT-II 行列（正規直交）
+    """
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+def _bits_to_hex(bits):
+    return np.packbits(bits.ravel()).tobytes().hex()
+
+
+def dhash(gray):
+    """
+    9x8 に縮小し、横に隣り合う画素の大小で 64bit を作る
+    """
+    small = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_hex(small[:, 1:] > small[:, :-1])
+
+
+def phash(gray):
+    """
+    32x32 に縮小して2次元 DCT をとり、左上 8x8（直流成分を除く）の中央値との大小で 64bit を作る
+    """
+    pixels = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(PHASH_SIZE)
+    low = (dct @ pixels @ dct.T)[:PHASH_LOW, :PHASH_LOW]
+    median = np.median(low.ravel()[1:])
+    return _bits_to_hex(low > median)
+
+
+def hash_file(path):
+    """
+    1枚分の (dHash, pHash) を16進文字列で返す（プロセスプールから呼ばれる）
+    """
+    require_dependencies()
+    with Image.open(path) as image:
+        # JPEG は縮小デコードできるため、全画素を展開しない
+        image.draft("L", (PHASH_SIZE * 2, PHASH_SIZE * 2))
+        gray = image.convert("L")
+    return dhash(gray), phash(gray)
+
+
+class HashIndex:
+    """
+    ファイル名 → [サイズ, 更新時刻(ns), dHash, pHash]
+    """
+
+    def __init__(self, path=HASH_INDEX_PATH):
+        self.path = Path(path)
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get("hashes", {}) if data.get("version") == 1 else {}
+
+    def is_current(self, filename, stat):
+        entry = self.entries.get(filename)
+        return bool(entry) and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns
+
+    def update(self, filename, stat, hashes):
+        self.entries[filename] = [stat.st_size, stat.st_mtime_ns, *hashes]
+
+    def prune(self, filenames):
+        """
+        存在しなくなったファイルの記録を消す
+        """
+        for filename in set(self.entries) - set(filenames):
+            del self.entries[filename]
+
+    def hashes(self, filename):
+        entry = self.entries.get(filename)
+        return (entry[2], entry[3]) if entry else None
+
+    def save(self):
+        atomic_write_json(self.path, {"version": 1, "hashes": self.entries},
+                          indent=None, separators=(",", ":"), sort_keys=True)
+
+
+def update_index(index, paths, workers=None):
+    """
+    変更のあった画像だけハッシュを計算して index を更新する
+    プレースホルダーは同じ配色のグラデーションどうしが重複と判定されるため、ハッシュせず記録も消す
+    戻り値は (計算した件数, 読めなかった画像と理由のリスト)
+    """
+    require_dependencies()
+    placeholders = load_placeholder_manifest()
+    stats = {path.name: path.stat() for path in paths
+             if path.exists() and not is_placeholder(path, placeholders)}
+    index.prune(stats)
+    stale = [path for path in paths if path.name in stats and not index.is_current(path.name, stats[path.name])]
+
+    failures = []
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [(path, executor.submit(hash_file, str(path))) for path in stale]
+            for path, future in futures:
+                try:
+                    index.update(path.name, stats[path.name], future.result())
+                except Exception as e:
+                    failures.append((path.name, str(e)))
+    index.save()
+    return len(stale) - len(failures), failures
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def candidate_pairs(values, threshold):
+    """
+    ハミング距離が threshold 以下になり得る組 (i, j)（i < j）
+    64bit を threshold + 1 個の区間に分けると、距離 threshold 以下の2つはどれかの区間が完全に一致する
+    （鳩の巣原理）ため、区間の値が同じものどうしだけを候補にする（全組の距離行列は作らない）
+    """
+    if threshold >= 64:
+        return list(itertools.combinations(range(len(values)), 2))
+    blocks = threshold + 1
+    bounds = [round(64 * k / blocks) for k in range(blocks + 1)]
+    pairs = set()
+    for low, high in zip(bounds, bounds[1:]):
+        mask = (1 << (high - low)) - 1
+        buckets = {}
+        for i, value in enumerate(values):
+            buckets.setdefault((value >> low) & mask, []).append(i)
+        for members in buckets.values():
+            pairs.update(itertools.combinations(members, 2))
+    return sorted(pairs)
+
+
+def find_duplicates(index, filenames, threshold=DEFAULT_THRESHOLD):
+    """
+    重複グループのリストを返す。各グループの先頭（定義順で最初の画像）を残す側とする
+    [{"keep": ファイル名, "duplicates": [{"filename", "dhash_distance", "phash_distance"}, ...]}, ...]
+    """
+    names = [name for name in filenames if index.hashes(name)]
+    if len(names) < 2:
+        return []
+    dhashes, phashes = ([int(value, 16) for value in values]
+                        for values in zip(*(index.hashes(name) for name in names)))
+
+    # 近い組を Union-Find でまとめる（残す側は定義順で先の画像）
+    parent = list(range(len(names)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in candidate_pairs(dhashes, threshold):
+        if hamming(dhashes[i], dhashes[j]) > threshold or hamming(phashes[i], phashes[j]) > threshold:
+            continue
+        a, b = root(i), root(j)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for i in range(len(names)):
+        groups.setdefault(root(i), []).append(i)
+
+    duplicates = []
+    for keep, members in sorted(groups.items()):
+        if len(members) < 2:
+            continue
+        duplicates.append({
+            "keep": names[keep],
+            "duplicates": [
+                {"filename": names[i], "dhash_distance": hamming(dhashes[keep], dhashes[i]),
+                 "phash_distance": hamming(phashes[keep], phashes[i])}
+                for i in members if i != keep
+            ],
+        })
+    return duplicates
+
+
+def source_script(filename, images_dir=IMAGES_DIR):
+    """
+    画像の取得元スクリプト（生成キャッシュのマニフェストにあれば Gemini、なければ Unsplash）
+    """
+    try:
+        with open(Path(images_dir) / MANIFEST_NAME, encoding="utf-8") as f:
+            generated = json.load(f)
+    except (OSError, ValueError):
+        generated = {}
+    return "generate_images.py" if filename in generated else "download_images_unsplash.py"
+
+
+def refetch_duplicates(duplicates, images_dir=IMAGES_DIR):
+    """
+    重複の2枚目以降を隔離し、variant を進めて取得元スクリプトで取り直す
+    プレースホルダーのままの画像は隔離も variant の変更もしない
+    戻り値は取り直したファイル名のリスト
+    """
+    placeholders = load_placeholder_manifest()
+    by_script = {}
+    for group in duplicates:
+        for item in group["duplicates"]:
+            filename = item["filename"]
+            path = Path(images_dir) / filename
+            if is_placeholder(path, placeholders):
+                print(f"- {filename}: placeholder, not refetched")
+                continue
+            script = source_script(filename, images_dir)
+            if path.exists():
+                quarantine(path, [f"near-duplicate of {group['keep']} "
+                                  f"(dHash {item['dhash_distance']}, pHash {item['phash_distance']})"])
+            # 0章/ と docs/ の assets.json をそろえて進める（サイト間で生成キーがずれない）
+            variant = bump_variant(filename)
+            print(f"↻ {filename}: variant {variant} via {script}")
+            by_script.setdefault(script, []).append(filename)
+
+    # キャッシュ・ジャーナル・検証は各スクリプトの通常の処理に任せる
+    for script, filenames in by_script.items():
+        subprocess.run([sys.executable, str(SCRIPT_DIR / script), "--only", ",".join(filenames)],
+                       cwd=SCRIPT_DIR, check=False)
+    return [filename for filenames in by_script.values() for filename in filenames]
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Find near-duplicate images with perceptual hashes")
+    parser.add_argument("--only", action="append", default=None, metavar="NAME",
+                        help="対象を id かファイル名で絞り込む（複数回・カンマ区切り可）")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"重複とみなすハミング距離 (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数 (default: CPU数)")
+    parser.add_argument("--refetch", action="store_true",
+                        help="重複の2枚目以降を隔離し、別の画像を取得し直す")
+    parser.add_argument("--report", default=None,
+                        help="重複レポート(JSON)の保存先 (default: .cache/reports/ 以下)")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    require_dependencies()
+    try:
+        assets = load_manifest().select(split_only(args.only))
+    except KeyError as e:
+        raise SystemExit(f"✗ {e.args[0]}")
+    filenames = [asset["filename"] for asset in assets]
+    paths = [IMAGES_DIR / filename for filename in filenames]
+    placeholders = load_placeholder_manifest()
+
+    print("="*80)
+    print("Perceptual Hash Deduplication")
+    print(f"Images found: {sum(1 for path in paths if path.exists())}/{len(paths)}")
+    print(f"Placeholders skipped: {sum(1 for path in paths if is_placeholder(path, placeholders))}")
+    print(f"Index: {HASH_INDEX_PATH}")
+    print(f"Threshold: {args.threshold} bits")
+    print("="*80)
+
+    index = HashIndex()
+    started = time.perf_counter()
+    hashed, failures = update_index(index, paths, args.workers)
+    print(f"Hashed {hashed} new or changed image(s) in {time.perf_counter() - started:.2f}s")
+    for filename, reason in failures:
+        print(f"✗ Could not hash {filename}: {reason}")
+
+    duplicates = find_duplicates(index, filenames, args.threshold)
+    for group in duplicates:
+        print(f"\n≈ {group['keep']}")
+        for item in group["duplicates"]:
+            print(f"  - {item['filename']} (dHash {item['dhash_distance']}, pHash {item['phash_distance']})")
+
+    refetched = []
+    if args.refetch and duplicates:
+        print("\n" + "="*80)
+        print("Refetching duplicates")
+        print("="*80)
+        refetched = refetch_duplicates(duplicates)
+        update_index(index, paths, args.workers)
+        duplicates = find_duplicates(index, filenames, args.threshold)
+
+    report_path = Path(args.report) if args.report else \
+        REPORTS_DIR / f"duplicates-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    atomic_write_json(report_path, {"threshold": args.threshold, "groups": duplicates,
+                                    "refetched": refetched,
+                                    "unreadable": [{"filename": f, "reason": r} for f, r in failures]})
+
+    # 結果サマリー
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Duplicate groups: {len(duplicates)}")
+    print(f"Refetched: {len(refetched)}")
+    print(f"Unreadable: {len(failures)}")
+    print(f"\nReport: {report_path}")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()
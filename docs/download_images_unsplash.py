@@ -4,144 +4,77 @@ Unsplash APIを使用して画像をダウンロードするスクリプト
 API不要、高品質なフリー素材
 """
 
+import argparse
 import os
 import time
-import urllib.request
+import urllib.error
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+from asset_manifest import load_manifest, split_only
+from blob_store import BlobStore, ref_key
+from generate_placeholder_images import forget_placeholders, is_placeholder, load_placeholder_manifest
+from http_cache import HTTPCache
+from http_client import (
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, configure_client, get_client
+)
+from metrics import ImageMetrics, MetricsRecorder
+from optimize_images import optimize_batch, print_results
+from rate_limiter import TokenBucket
+from resumable_download import download_to_file
+from retry_policy import (
+    DEFAULT_BREAKER_COOLDOWN, DEFAULT_BREAKER_THRESHOLD, CircuitBreaker, RetryPolicy,
+    parse_retry_after
+)
+from validate_images import InvalidImage, check_or_quarantine
+
 # 画像保存先ディレクトリ
 IMAGES_DIR = Path(__file__).parent / "images"
-IMAGES_DIR.mkdir(exist_ok=True)
 
 # Unsplash Source API（APIキー不要）
 # https://source.unsplash.com/
+# UNSPLASH_BASE_URL で接続先を差し替え可能（mock_server.py での計測用）
+UNSPLASH_BASE_URL = os.environ.get("UNSPLASH_BASE_URL", "https://source.unsplash.com")
+
+# 並列実行の既定値（同時実行数と1分あたりのリクエスト上限）
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 120
+
+# ダウンロードのタイムアウト（秒）
+REQUEST_TIMEOUT = 30
+
+
+def image_downloads(only=None):
+    """
+    ダウンロード対象のリスト（assets.json から読み込む）
+    """
+    return load_manifest().image_downloads(only)
+
 
-# 画像ダウンロードリスト
-IMAGE_DOWNLOADS = [
-    {
-        "filename": "hero-bg.jpg",
-        "query": "acupuncture treatment room warm light",
-        "size": "1920x1080"
-    },
-    {
-        "filename": "problem-therapist.jpg",
-        "query": "stressed therapist doctor worried desk",
-        "size": "1200x800"
-    },
-    {
-        "filename": "profile-toyoda.jpg",
-        "query": "japanese male doctor portrait professional smile",
-        "size": "800x800"
-    },
-    {
-        "filename": "story-sunset.jpg",
-        "query": "silhouette window sunset contemplation",
-        "size": "1200x800"
-    },
-    {
-        "filename": "5-layers-diagram.jpg",
-        "query": "pyramid diagram infographic layers",
-        "size": "1000x800"
-    },
-    {
-        "filename": "mind-flow-diagram.jpg",
-        "query": "flowchart diagram process workflow",
-        "size": "1000x600"
-    },
-    {
-        "filename": "counseling-illustration.jpg",
-        "query": "therapist patient conversation empathy counseling",
-        "size": "1000x800"
-    },
-    {
-        "filename": "before-after-comparison.jpg",
-        "query": "transformation change before after comparison",
-        "size": "1200x600"
-    },
-    {
-        "filename": "case1-stage1.jpg",
-        "query": "woman smile forced happy tense expression",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage2.jpg",
-        "query": "sad child dark emotional past memory",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage3.jpg",
-        "query": "woman emotional expression crying tears",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage4.jpg",
-        "query": "woman talking therapist support tears liberation",
-        "size": "800x600"
-    },
-    {
-        "filename": "case1-stage5.jpg",
-        "query": "woman walking forward hope bright future",
-        "size": "800x600"
-    },
-    {
-        "filename": "case2-symptoms.jpg",
-        "query": "woman anxiety stress symptoms pain distress",
-        "size": "800x600"
-    },
-    {
-        "filename": "case2-assessment.jpg",
-        "query": "mind map mental health diagram structure",
-        "size": "800x600"
-    },
-    {
-        "filename": "case2-future.jpg",
-        "query": "woman studying learning bright hopeful future",
-        "size": "800x600"
-    },
-    {
-        "filename": "course-materials.jpg",
-        "query": "laptop tablet textbook study materials desk flatlay",
-        "size": "1200x800"
-    },
-    {
-        "filename": "online-learning.jpg",
-        "query": "online learning laptop studying course notebook",
-        "size": "1200x800"
-    },
-    {
-        "filename": "diverse-therapists.jpg",
-        "query": "diverse healthcare professionals group medical team",
-        "size": "1200x600"
-    },
-    {
-        "filename": "toyoda-message.jpg",
-        "query": "male doctor portrait professional trust warmth",
-        "size": "800x1000"
-    },
-    {
-        "filename": "therapist-patient-handshake.jpg",
-        "query": "doctor patient handshake trust medical care",
-        "size": "1200x800"
-    },
-    {
-        "filename": "bright-future.jpg",
-        "query": "bright clinic medical room sunlight hope patient",
-        "size": "1200x800"
-    },
-    {
-        "filename": "final-message-bg.jpg",
-        "query": "warm light medical room hope silhouette forward",
-        "size": "1920x1080"
-    }
-]
-
-
-def download_image(image_data, retry=3):
+def source_url(image_data):
+    """
+    Unsplash Source API URL
+    https://source.unsplash.com/{size}/?{query}
+    """
+    size = image_data.get("size", "1024x1024")
+    url = f"{UNSPLASH_BASE_URL}/{size}/?{urllib.parse.quote(image_data['query'])}"
+    # variant があれば sig を付けて別の写真を選ばせる
+    if image_data.get("variant"):
+        url += f"&sig={image_data['variant']}"
+    return url
+
+
+def download_image(image_data, retry=3, client=None, policy=None, metrics=None, http_cache=None, store=None):
     """
     Unsplash APIから画像をダウンロード
+    http_cache に前回の検証子があれば条件付きリクエストにし、変更がなければ 304 で済ませる
+    store（共有ストア）があれば取得した画像を取り込み、取得元 URL との対応を記録する
     """
     filename = image_data["filename"]
+    client = client or get_client()
+    policy = policy or RetryPolicy()
+    metrics = metrics or ImageMetrics(filename)
     query = image_data["query"]
     size = image_data.get("size", "1024x1024")
 
@@ -150,84 +83,236 @@ def download_image(image_data, retry=3):
     print(f"Query: {query}")
     print(f"Size: {size}")
 
-    # Unsplash Source API URL
-    # https://source.unsplash.com/{size}/?{query}
-    encoded_query = urllib.parse.quote(query)
-    url = f"https://source.unsplash.com/{size}/?{encoded_query}"
+    url = source_url(image_data)
 
     for attempt in range(retry):
+        error = None
+        retry_after = None
+        policy.before_attempt()
+        metrics.attempts += 1
         try:
             print(f"Attempt {attempt + 1}/{retry}...")
             print(f"URL: {url}")
 
-            # 画像をダウンロード
-            with urllib.request.urlopen(url, timeout=30) as response:
-                image_bytes = response.read()
-
-                # 画像を保存
-                output_path = IMAGES_DIR / filename
-                with open(output_path, "wb") as f:
-                    f.write(image_bytes)
+            # 画像をディスクへ直接ストリーミング（リダイレクト先も含め接続は再利用される）
+            # 前回途中で切れていれば Range で続きから取得する
+            output_path = IMAGES_DIR / filename
+            cached = http_cache.lookup(filename, url, output_path) if http_cache else None
+            result = download_to_file(client, url, output_path, metrics=metrics, cached=cached)
 
-                file_size = len(image_bytes) / 1024  # KB
-                print(f"✓ Successfully downloaded: {output_path} ({file_size:.1f} KB)")
+            if result.not_modified:
+                policy.record(None)
+                metrics.not_modified = True
+                http_cache.touch(filename)
+                print(f"⊘ Not modified: {output_path} (304)")
                 return True
 
+            # HTML のエラーページや途中で切れたファイルは隔離して取り直す
+            info, warnings = check_or_quarantine(output_path, size)
+            policy.record(None)
+            for warning in warnings:
+                print(f"⚠ {filename}: {warning}")
+            if http_cache is not None:
+                http_cache.record(filename, url, result)
+            if store is not None:
+                store.set_ref("downloads", ref_key(url), store.put_file(output_path), filename=filename)
+            file_size = result.bytes_total / 1024  # KB
+            resumed = f", resumed at {result.resumed_from / 1024:.1f} KB" if result.resumed_from else ""
+            print(f"✓ Successfully downloaded: {output_path} ({info.format} {info.size}, "
+                  f"{file_size:.1f} KB{resumed})")
+            return True
+
+        except InvalidImage as e:
+            print(f"✗ Invalid image quarantined: {'; '.join(e.problems)}")
+            error = e
         except urllib.error.HTTPError as e:
             print(f"✗ HTTP Error {e.code}: {e.reason}")
+            error = e
+            retry_after = parse_retry_after(e.headers)
         except urllib.error.URLError as e:
             print(f"✗ URL Error: {e.reason}")
+            error = e
         except Exception as e:
             print(f"✗ Exception occurred: {str(e)}")
+            error = e
+
+        # 404 などはリトライしても結果が変わらないため打ち切る
+        if not policy.is_retryable(error):
+            print(f"✗ Not retrying {filename}: error is not retryable")
+            return False
+
+        pause = policy.record(error, retry_after)
+        if pause:
+            print(f"⏸ Server saturated, pausing all requests for {pause:.1f} seconds")
 
         if attempt < retry - 1:
-            wait_time = (attempt + 1) * 2
-            print(f"Waiting {wait_time} seconds before retry...")
+            wait_time = policy.backoff(attempt, retry_after)
+            print(f"Waiting {wait_time:.1f} seconds before retry...")
             time.sleep(wait_time)
 
     print(f"✗ Failed to download {filename} after {retry} attempts")
     return False
 
 
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Unsplash Image Download Script")
+    parser.add_argument("--only", action="append", default=None, metavar="NAME",
+                        help="対象を id かファイル名で絞り込む（複数回・カンマ区切り可）")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"同時に実行するダウンロード数 (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"1分あたりの最大リクエスト数 (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument("--refresh", action="store_true",
+                        help="既存の画像も ETag / Last-Modified で更新を確認する（変更がなければ 304）")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help=f"ホストごとの最大コネクション数 (default: {DEFAULT_POOL_SIZE})")
+    parser.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT,
+                        help=f"接続タイムアウト秒数 (default: {DEFAULT_CONNECT_TIMEOUT})")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT,
+                        help=f"レスポンス待ちのタイムアウト秒数 (default: {REQUEST_TIMEOUT})")
+    parser.add_argument("--breaker-threshold", type=int, default=DEFAULT_BREAKER_THRESHOLD,
+                        help=f"全体を一時停止するまでの連続 429/503 回数 (default: {DEFAULT_BREAKER_THRESHOLD})")
+    parser.add_argument("--breaker-cooldown", type=float, default=DEFAULT_BREAKER_COOLDOWN,
+                        help=f"一時停止する秒数 (default: {DEFAULT_BREAKER_COOLDOWN:g})")
+    parser.add_argument("--metrics-report", default=None,
+                        help="計測レポート(JSON)の保存先 (default: .cache/reports/ 以下)")
+    parser.add_argument("--optimize", action="store_true",
+                        help="取得後に定義サイズへリサイズし WebP/AVIF を書き出す（要 Pillow）")
+    parser.add_argument("--optimize-workers", type=int, default=None,
+                        help="最適化のプロセス数 (default: CPU数)")
+    return parser.parse_args()
+
+
 def main():
     """
     メイン処理
     """
+    args = parse_args()
+    try:
+        downloads = image_downloads(split_only(args.only))
+    except KeyError as e:
+        raise SystemExit(f"✗ {e.args[0]}")
+    IMAGES_DIR.mkdir(exist_ok=True)
+    concurrency = max(1, args.concurrency)
+    client = configure_client(pool_size=max(1, args.pool_size),
+                              connect_timeout=args.connect_timeout, read_timeout=args.timeout)
+    policy = RetryPolicy(breaker=CircuitBreaker(args.breaker_threshold, args.breaker_cooldown))
+
     print("="*80)
     print("Unsplash Image Download Script")
-    print(f"Total images to download: {len(IMAGE_DOWNLOADS)}")
+    print(f"Total images to download: {len(downloads)}")
     print(f"Output directory: {IMAGES_DIR}")
+    print(f"Concurrency: {concurrency}, Per-host connections: {max(1, args.pool_size)}, "
+          f"Rate limit: {args.rpm:g} requests/min")
     print("="*80)
 
     success_count = 0
     failed_list = []
+    pending = []
+    recorder = MetricsRecorder("download-images-unsplash")
+    http_cache = HTTPCache()
+    store = BlobStore()
+    placeholders = load_placeholder_manifest()
 
-    for i, image_data in enumerate(IMAGE_DOWNLOADS, 1):
-        print(f"\n[{i}/{len(IMAGE_DOWNLOADS)}]")
-
-        # 既に画像が存在する場合はスキップ
+    for i, image_data in enumerate(downloads, 1):
+        # 既に画像が存在する場合はスキップ（--refresh なら条件付きリクエストで更新を確認）
         output_path = IMAGES_DIR / image_data["filename"]
         if output_path.exists():
+            # 空ファイル・HTML などは隔離して取り直す（ヘッダーだけを読む）
+            try:
+                check_or_quarantine(output_path, image_data.get("size"))
+            except InvalidImage as e:
+                print(f"\n[{i}/{len(downloads)}]")
+                print(f"✗ Quarantined {image_data['filename']}: {'; '.join(e.problems)}")
+        # 取得できなかったときに代用したプレースホルダーは取り直す
+        if output_path.exists() and not args.refresh and not is_placeholder(output_path, placeholders):
+            print(f"\n[{i}/{len(downloads)}]")
             print(f"⊘ Skipping {image_data['filename']} (already exists)")
+            recorder.skip(image_data["filename"], "exists")
             success_count += 1
             continue
 
-        # 画像ダウンロード
-        if download_image(image_data):
-            success_count += 1
-        else:
-            failed_list.append(image_data["filename"])
+        # 他のサイト（0章/ と docs/）で同じ URL から取得済みなら、共有ストアからリンクする
+        ref = None if args.refresh else store.get_ref("downloads", ref_key(source_url(image_data)))
+        if ref:
+            store.link(ref["sha256"], output_path)
+            try:
+                check_or_quarantine(output_path, image_data.get("size"))
+            except InvalidImage as e:
+                print(f"\n[{i}/{len(downloads)}]")
+                print(f"✗ Quarantined stored {image_data['filename']}: {'; '.join(e.problems)}")
+            else:
+                print(f"\n[{i}/{len(downloads)}]")
+                print(f"↺ Linked {image_data['filename']} from the shared store")
+                recorder.skip(image_data["filename"], "store")
+                success_count += 1
+                continue
+        pending.append((i, image_data))
+
+    # 間隔は固定の待機ではなくトークンバケットで制御し、
+    # ホストごとの同時接続数は HTTP クライアントのプールで制限する
+    limiter = TokenBucket(args.rpm, burst=concurrency)
+
+    def worker(index, image_data, metrics):
+        metrics.start()
+        metrics.throttle_wait = limiter.acquire()
+        print(f"\n[{index}/{len(downloads)}]")
+        ok = download_image(image_data, client=client, policy=policy, metrics=metrics,
+                            http_cache=http_cache, store=store)
+        metrics.finish(ok)
+        return ok
+
+    # 画像ダウンロード
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(worker, index, image_data, recorder.new(image_data["filename"])):
+                image_data["filename"]
+            for index, image_data in pending
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                ok = future.result()
+            except Exception as e:
+                print(f"✗ Unexpected error for {filename}: {str(e)}")
+                ok = False
+            if ok:
+                success_count += 1
+            else:
+                failed_list.append(filename)
+
+    # 本画像に置き換わったプレースホルダーの記録を外す
+    forget_placeholders(IMAGES_DIR / d["filename"] for d in downloads)
+
+    # 失敗リストは定義順に並べる
+    order = {d["filename"]: n for n, d in enumerate(downloads)}
+    failed_list.sort(key=order.get)
+
+    # 定義サイズへのリサイズとWebP/AVIFへの再エンコード
+    if args.optimize:
+        print("\n" + "="*80)
+        print("Optimizing images (WebP/AVIF)")
+        print("="*80)
+        entries = [(IMAGES_DIR / item["filename"], item["size"]) for item in downloads]
+        try:
+            print_results(*optimize_batch(entries, workers=args.optimize_workers))
+        except RuntimeError as e:
+            print(f"✗ Optimization skipped: {str(e)}")
 
-        # API制限を避けるため、少し待機
-        if i < len(IMAGE_DOWNLOADS):
-            time.sleep(1)
+    client.close()
+    report_path = recorder.write_report(args.metrics_report, concurrency=concurrency, rpm=args.rpm)
 
     # 結果サマリー
     print("\n" + "="*80)
     print("SUMMARY")
     print("="*80)
-    print(f"Total: {len(IMAGE_DOWNLOADS)}")
+    print(f"Total: {len(downloads)}")
     print(f"Success: {success_count}")
+    if args.refresh:
+        print(f"Not modified (304): {sum(1 for m in recorder.items if m.not_modified)}")
     print(f"Failed: {len(failed_list)}")
 
     if failed_list:
@@ -237,6 +322,7 @@ def main():
     else:
         print("\n✓ All images downloaded successfully!")
 
+    print(f"\nMetrics report: {report_path}")
     print("="*80)
 
 
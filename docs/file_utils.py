@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+ファイル書き込み・ハッシュ計算の共通処理
+書き込みは同じディレクトリの一時ファイルに行い、完了後に rename で置き換えるため、
+途中で中断されても書きかけのファイルが残らない
+依存ライブラリ不要
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+# mkstemp は 0600 で作成するため、通常の open() と同じ権限（umask 適用後）に戻す
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+DEFAULT_FILE_MODE = 0o666 & ~_UMASK
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="wb", encoding=None):
+    """
+    一時ファイルに書き込み、ブロックを正常に抜けたときだけ path に置き換える
+    例外で抜けた場合は一時ファイルを削除し、既存の path には触れない
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        try:
+            mode_bits = path.stat().st_mode & 0o777
+        except FileNotFoundError:
+            mode_bits = DEFAULT_FILE_MODE
+        os.chmod(tmp_name, mode_bits)
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+
+def atomic_write_bytes(path, data):
+    with atomic_write(path, "wb") as f:
+        f.write(data)
+
+
+def atomic_write_json(path, data, **kwargs):
+    kwargs.setdefault("ensure_ascii", False)
+    kwargs.setdefault("indent", 2)
+    with atomic_write(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **kwargs)
+
+
+def atomic_copy(source, path):
+    """
+    source を path にコピーする（コピー途中の path は外から見えない）
+    """
+    with open(source, "rb") as src, atomic_write(path, "wb") as dst:
+        for chunk in iter(lambda: src.read(1024 * 1024), b""):
+            dst.write(chunk)
+
+
+def file_sha256(path):
+    """
+    ファイル内容の SHA-256 を計算
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remove_stale_temp_files(directory):
+    """
+    強制終了などで残った atomic_write の一時ファイルを削除し、削除件数を返す
+    """
+    removed = 0
+    for tmp_path in Path(directory).glob(".*.tmp"):
+        with contextlib.suppress(OSError):
+            tmp_path.unlink()
+            removed += 1
+    return removed
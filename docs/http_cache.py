@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+ダウンロード済み画像の HTTP 検証子キャッシュ
+画像ごとに ETag / Last-Modified / リダイレクト後の最終URL を保存し、
+再取得時に If-None-Match / If-Modified-Since を送って変更がなければ 304 で済ませる
+依存ライブラリ不要
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+from file_utils import atomic_write_json, file_sha256
+
+# 検証子の保存先
+HTTP_CACHE_PATH = Path(__file__).parent / ".cache" / "http" / "download-validators.json"
+
+
+def conditional_headers(entry):
+    """
+    保存済みの検証子から条件付きリクエストのヘッダーを作る
+    """
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class HTTPCache:
+    """
+    ファイル名 → 取得元URL・最終URL・検証子・内容ハッシュ
+    """
+
+    def __init__(self, path=HTTP_CACHE_PATH):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, filename, source_url, output_path):
+        """
+        output_path が source_url から取得したときのまま残っていれば記録を返す
+        取得元が変わった・ファイルが差し替えられた場合は None（通常どおり全体を取得する）
+        """
+        entry = self.entries.get(filename)
+        if not entry or entry.get("source") != source_url:
+            return None
+        if not (entry.get("etag") or entry.get("last_modified")):
+            return None
+        output_path = Path(output_path)
+        if not output_path.exists() or output_path.stat().st_size != entry.get("size"):
+            return None
+        if file_sha256(output_path) != entry.get("sha256"):
+            return None
+        return entry
+
+    def record(self, filename, source_url, result):
+        """
+        ダウンロード結果（resumable_download.DownloadResult）の検証子を保存
+        """
+        with self.lock:
+            self.entries[filename] = {
+                "source": source_url,
+                "url": result.url,
+                "etag": result.etag,
+                "last_modified": result.last_modified,
+                "size": result.bytes_total,
+                "sha256": result.sha256,
+                "checked_at": int(time.time()),
+            }
+            atomic_write_json(self.path, self.entries, sort_keys=True)
+
+    def touch(self, filename):
+        """
+        304 で変更なしを確認した時刻を記録
+        """
+        with self.lock:
+            if filename in self.entries:
+                self.entries[filename]["checked_at"] = int(time.time())
+                atomic_write_json(self.path, self.entries, sort_keys=True)
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Gemini API / Unsplash 共通の HTTP クライアント
+ホストごとのコネクションプールと Keep-Alive で、リトライや画像ごとの
+DNS + TCP + TLS ハンドシェイクを省略する
+urllib.request.urlopen と同じく HTTP_PROXY / HTTPS_PROXY / NO_PROXY 環境変数に従う
+（https は CONNECT でトンネルを張り、その上の接続をプールする）
+依存ライブラリ不要
+"""
+
+import base64
+import http.client
+import io
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# 既定値（プールサイズはホストごとの最大同時接続数）
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+MAX_REDIRECTS = 5
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# 再利用した接続がサーバー側で既に切断されていた場合に発生する例外
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class HostPool:
+    """
+    1ホスト分のコネクションプール
+    """
+
+    def __init__(self, scheme, host, port, size, connect_timeout, proxy=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        # プロキシ（urlsplit の結果）。None なら直接つなぐ
+        self.proxy = proxy
+        self.idle = []
+        self.lock = threading.Lock()
+        # 同時に貸し出す接続数の上限
+        self.slots = threading.BoundedSemaphore(size)
+
+    def proxy_headers(self):
+        """
+        プロキシの URL に user:password があれば Proxy-Authorization ヘッダー
+        """
+        if self.proxy is None or self.proxy.username is None:
+            return {}
+        username, password = self.proxy.username, self.proxy.password or ""
+        credentials = f"{urllib.parse.unquote(username)}:{urllib.parse.unquote(password)}"
+        return {"Proxy-Authorization": "Basic " + base64.b64encode(credentials.encode("utf-8")).decode("ascii")}
+
+    def _new_connection(self):
+        host, port = self.host, self.port
+        if self.proxy is not None:
+            host, port = self.proxy.hostname, self.proxy.port or 8080
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=self.connect_timeout)
+            if self.proxy is not None:
+                conn.set_tunnel(self.host, self.port, headers=self.proxy_headers())
+            return conn
+        return http.client.HTTPConnection(host, port, timeout=self.connect_timeout)
+
+    def acquire(self):
+        """
+        接続を借りる。戻り値は (接続, 再利用かどうか)
+        """
+        self.slots.acquire()
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self._new_connection(), False
+
+    def release(self, conn, reusable):
+        """
+        接続を返却する。再利用できない接続は閉じる
+        """
+        if reusable:
+            with self.lock:
+                self.idle.append(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+
+class PooledResponse:
+    """
+    プールされた接続上のレスポンス
+    読み終えて close() するとプールに接続が返却される
+
+    timings には接続時間（connect）と最初のバイトまでの時間（ttfb）を秒で記録する
+    """
+
+    def __init__(self, url, response, conn, pool, timings):
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.timings = timings
+        self.bytes_read = 0
+        self._response = response
+        self._conn = conn
+        self._pool = pool
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        self.bytes_read += len(data)
+        return data
+
+    def iter_chunks(self, chunk_size=64 * 1024):
+        """
+        レスポンスボディを chunk_size バイトずつ返す
+        """
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if self._conn is None:
+            return
+        # ボディを最後まで読んでいれば接続を再利用できる
+        reusable = self._response.isclosed() and not self._response.will_close
+        if not reusable:
+            self._response.close()
+        self._pool.release(self._conn, reusable)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HTTPClient:
+    """
+    ホストごとにコネクションプールを持つスレッドセーフな HTTP クライアント
+
+    4xx/5xx は urllib.error.HTTPError、接続エラーは urllib.error.URLError として
+    送出するため、urllib.request.urlopen と同じ例外処理がそのまま使える
+    proxies を省略すると urllib.request.getproxies()（環境変数）のプロキシを使う
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, max_redirects=MAX_REDIRECTS, proxies=None):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_redirects = max_redirects
+        self.proxies = urllib.request.getproxies() if proxies is None else proxies
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def _proxy_for(self, scheme, host):
+        proxy = self.proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass_environment(host, self.proxies):
+            return None
+        # "proxy:3128" のようにスキームが無い指定も受け付ける
+        return urllib.parse.urlsplit(proxy if "://" in proxy else "http://" + proxy)
+
+    def _pool_for(self, parsed):
+        scheme = parsed.scheme.lower()
+        port = parsed.port or (443 if scheme == "https" else 80)
+        key = (scheme, parsed.hostname, port)
+        with self.lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = HostPool(scheme, parsed.hostname, port, self.pool_size, self.connect_timeout,
+                                self._proxy_for(scheme, parsed.hostname))
+                self.pools[key] = pool
+        return pool
+
+    def _send(self, url, method, body, headers, timeout):
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme not in ("http", "https"):
+            raise urllib.error.URLError(f"unsupported URL scheme: {url}")
+        pool = self._pool_for(parsed)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+
+        request_headers = {"Connection": "keep-alive"}
+        if pool.proxy is not None and pool.scheme == "http":
+            # http はプロキシに絶対 URL で送る（https はトンネル内なのでそのまま）
+            path = urllib.parse.urlunsplit((parsed.scheme, parsed.netloc, parsed.path or "/", parsed.query, ""))
+            request_headers.update(pool.proxy_headers())
+        request_headers.update(headers or {})
+
+        # 再利用した接続が切れていた場合のみ、新しい接続で1回だけ送り直す
+        for attempt in range(2):
+            conn, reused = pool.acquire()
+            timings = {"connect": 0.0, "ttfb": 0.0}
+            try:
+                if conn.sock is None:
+                    started = time.perf_counter()
+                    conn.connect()
+                    timings["connect"] = time.perf_counter() - started
+                conn.sock.settimeout(timeout)
+                started = time.perf_counter()
+                conn.request(method, path, body=body, headers=request_headers)
+                response = conn.getresponse()
+                timings["ttfb"] = time.perf_counter() - started
+            except STALE_CONNECTION_ERRORS as e:
+                pool.release(conn, False)
+                if reused and attempt == 0:
+                    continue
+                raise urllib.error.URLError(e)
+            except OSError as e:
+                pool.release(conn, False)
+                raise urllib.error.URLError(e)
+            except BaseException:
+                pool.release(conn, False)
+                raise
+            return PooledResponse(url, response, conn, pool, timings)
+
+    def request(self, method, url, body=None, headers=None, timeout=None):
+        """
+        リクエストを送信し、リダイレクトを辿った最終レスポンスを返す
+        """
+        timeout = self.read_timeout if timeout is None else timeout
+        # リダイレクトを辿った分の接続時間・TTFBも合算する
+        elapsed = {"connect": 0.0, "ttfb": 0.0}
+
+        for _ in range(self.max_redirects + 1):
+            response = self._send(url, method, body, headers, timeout)
+            for key in elapsed:
+                elapsed[key] += response.timings[key]
+            response.timings = dict(elapsed)
+
+            if response.status in REDIRECT_CODES and response.headers.get("Location"):
+                response.read()
+                response.close()
+                url = urllib.parse.urljoin(url, response.headers["Location"])
+                if response.status == 303:
+                    method, body = "GET", None
+                continue
+
+            if response.status >= 400:
+                error_body = response.read()
+                response.close()
+                raise urllib.error.HTTPError(
+                    url, response.status, response.reason, response.headers, io.BytesIO(error_body)
+                )
+
+            return response
+
+        raise urllib.error.URLError(f"too many redirects: {url}")
+
+    def get(self, url, headers=None, timeout=None):
+        return self.request("GET", url, headers=headers, timeout=timeout)
+
+    def post(self, url, body, headers=None, timeout=None):
+        return self.request("POST", url, body=body, headers=headers, timeout=timeout)
+
+    def close(self):
+        with self.lock:
+            pools, self.pools = list(self.pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_client():
+    """
+    プロセス共通の HTTPClient を返す（初回呼び出し時に生成）
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = HTTPClient()
+        return _default_client
+
+
+def configure_client(pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                     read_timeout=DEFAULT_READ_TIMEOUT):
+    """
+    プロセス共通の HTTPClient を指定の設定で作り直す
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is not None:
+            _default_client.close()
+        _default_client = HTTPClient(pool_size=pool_size, connect_timeout=connect_timeout,
+                                     read_timeout=read_timeout)
+        return _default_client
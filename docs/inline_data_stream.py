@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Gemini API レスポンスのストリーミング解析
+JSON を逐次走査して inlineData.data の Base64 文字列を見つけ、
+チャンク単位でデコードしながらファイルへ直接書き出す。
+レスポンス全体や画像全体をメモリに載せないため、画像サイズに関係なく
+ピークメモリはほぼ一定になる
+依存ライブラリ不要
+"""
+
+import binascii
+import time
+
+# レスポンスボディを読み込む単位（バイト）
+CHUNK_SIZE = 64 * 1024
+
+# 画像以外に保持する文字列の最大長（テキストレスポンスの表示用）
+MAX_CAPTURE = 2048
+
+_BASE64_ESCAPES = {ord("/"): b"/", ord("n"): b"", ord("r"): b"", ord("t"): b""}
+
+
+class Base64Writer:
+    """
+    Base64 文字列を4文字単位でデコードしてファイルに書き込む
+    デコードと書き込みそれぞれの所要時間（秒）を累積する
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.pending = b""
+        self.bytes_written = 0
+        self.decode_time = 0.0
+        self.write_time = 0.0
+
+    def feed(self, data):
+        data = self.pending + data
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        if usable:
+            started = time.perf_counter()
+            decoded = binascii.a2b_base64(data[:usable])
+            decoded_at = time.perf_counter()
+            self.out.write(decoded)
+            self.decode_time += decoded_at - started
+            self.write_time += time.perf_counter() - decoded_at
+            self.bytes_written += len(decoded)
+
+    def close(self):
+        if self.pending.strip(b"="):
+            raise ValueError("truncated base64 data in inlineData")
+        self.pending = b""
+
+
+class InlineDataResult:
+    """
+    ストリーミング解析の結果
+    """
+
+    def __init__(self):
+        self.bytes_written = 0
+        self.decode_time = 0.0
+        self.write_time = 0.0
+        self.mime_type = None
+        self.texts = []
+        self.top_level_keys = []
+
+    @property
+    def found(self):
+        return self.bytes_written > 0
+
+
+class NoImageData(Exception):
+    """
+    レスポンスに画像データが含まれていなかった（テキストのみの応答など）
+    """
+
+    def __init__(self, result):
+        super().__init__("no inlineData in response")
+        self.result = result
+
+
+class InlineDataScanner:
+    """
+    JSON を逐次走査する状態機械
+
+    candidates[].content.parts[].inlineData.data の最初の文字列だけを
+    Base64Writer に流し、mimeType・text・トップレベルのキーは小さな文字列として保持する。
+    それ以外の文字列は bytes.find で読み飛ばすため、巨大な文字列があっても高速に走査できる
+    """
+
+    def __init__(self, out):
+        self.result = InlineDataResult()
+        self.writer = Base64Writer(out)
+        self.image_done = False
+        # 書き出した画像の inlineData オブジェクト（mimeType はこのオブジェクトのものだけを採る）
+        self.image_frame = None
+        # コンテナのスタック: [種類("{" or "["), 現在のキー, キー待ちかどうか]
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_role = None
+        self.captured = bytearray()
+
+    def _path(self):
+        return [frame[1] for frame in self.stack if frame[0] == "{"]
+
+    def _begin_string(self):
+        self.in_string = True
+        self.escape = False
+        self.captured = bytearray()
+        frame = self.stack[-1] if self.stack else None
+
+        if frame is not None and frame[0] == "{" and frame[2]:
+            self.string_role = "key"
+            return
+
+        path = self._path()
+        if path[-2:] == ["inlineData", "data"] and not self.image_done:
+            self.string_role = "data"
+            self.image_frame = frame
+        elif path[-2:] == ["inlineData", "mimeType"] and (not self.image_done or frame is self.image_frame):
+            self.string_role = "mime"
+        elif path[-1:] == ["text"]:
+            self.string_role = "text"
+        else:
+            self.string_role = None
+
+    def _end_string(self):
+        self.in_string = False
+        role = self.string_role
+        text = bytes(self.captured).decode("utf-8", errors="replace")
+        frame = self.stack[-1] if self.stack else None
+
+        if role == "key":
+            frame[1] = text
+            frame[2] = False
+            if len(self.stack) == 1:
+                self.result.top_level_keys.append(text)
+        elif role == "data":
+            self.writer.close()
+            self.result.bytes_written = self.writer.bytes_written
+            self.image_done = True
+        elif role == "mime":
+            self.result.mime_type = text
+        elif role == "text":
+            self.result.texts.append(text)
+
+    def _feed_string(self, segment):
+        if self.string_role == "data":
+            self.writer.feed(segment)
+        elif self.string_role is not None and len(self.captured) < MAX_CAPTURE:
+            self.captured += segment[:MAX_CAPTURE - len(self.captured)]
+
+    def _feed_escape(self, char):
+        if self.string_role == "data":
+            replacement = _BASE64_ESCAPES.get(char)
+            if replacement is None:
+                raise ValueError(f"unexpected escape in base64 data: \\{chr(char)}")
+            if replacement:
+                self.writer.feed(replacement)
+        elif char in (ord('"'), ord("\\"), ord("/")):
+            self._feed_string(bytes([char]))
+        elif char == ord("n"):
+            self._feed_string(b"\n")
+        # その他のエスケープ（\uXXXX など）は表示用途のため省略する
+
+    def feed(self, chunk):
+        """
+        レスポンスボディのチャンクを1つ処理
+        """
+        pos = 0
+        length = len(chunk)
+        while pos < length:
+            if self.in_string:
+                if self.escape:
+                    self._feed_escape(chunk[pos])
+                    self.escape = False
+                    pos += 1
+                    continue
+                quote = chunk.find(b'"', pos)
+                backslash = chunk.find(b"\\", pos, quote if quote != -1 else length)
+                if backslash != -1:
+                    self._feed_string(chunk[pos:backslash])
+                    self.escape = True
+                    pos = backslash + 1
+                elif quote != -1:
+                    self._feed_string(chunk[pos:quote])
+                    self._end_string()
+                    pos = quote + 1
+                else:
+                    self._feed_string(chunk[pos:])
+                    pos = length
+                continue
+
+            char = chunk[pos]
+            pos += 1
+            if char == ord('"'):
+                self._begin_string()
+            elif char == ord("{"):
+                self.stack.append(["{", None, True])
+            elif char == ord("["):
+                self.stack.append(["[", None, False])
+            elif char in (ord("}"), ord("]")):
+                if not self.stack:
+                    raise ValueError("unbalanced JSON in response")
+                self.stack.pop()
+            elif char == ord(","):
+                if self.stack and self.stack[-1][0] == "{":
+                    self.stack[-1][2] = True
+            # それ以外（: や空白、数値・true/false/null）は読み飛ばす
+
+    def finish(self):
+        if self.in_string or self.stack:
+            raise ValueError("incomplete JSON in response")
+        self.result.decode_time = self.writer.decode_time
+        self.result.write_time = self.writer.write_time
+        return self.result
+
+
+def stream_inline_data(chunks, out):
+    """
+    レスポンスボディのチャンク列を解析し、最初の画像データを out に書き込む
+    """
+    scanner = InlineDataScanner(out)
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner.finish()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+画像生成ジョブの追記型ジャーナル
+pending / in-flight / done / failed の状態遷移を JSON Lines で1行ずつ追記し、
+中断された実行を次回起動時にそのまま再開できるようにする
+依存ライブラリ不要
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from file_utils import atomic_write, file_sha256
+
+# ジャーナルの既定保存先
+JOURNAL_DIR = Path(__file__).parent / ".cache" / "jobs"
+
+PENDING = "pending"
+IN_FLIGHT = "in-flight"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobJournal:
+    """
+    ファイル名ごとの最新状態を保持する追記型ジャーナル（スレッドセーフ）
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.entries = self._replay()
+        self._compact()
+
+    def _replay(self):
+        """
+        ジャーナルを先頭から読み、ファイル名ごとの最新レコードを復元する
+        強制終了で途中までしか書かれなかった最終行は無視する
+        """
+        entries = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and "filename" in record:
+                    entries[record["filename"]] = record
+        return entries
+
+    def _compact(self):
+        # 起動時に最新状態だけを書き直し、ジャーナルが際限なく伸びないようにする
+        if not self.entries:
+            return
+        with atomic_write(self.path, "w", encoding="utf-8") as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def state(self, filename):
+        record = self.entries.get(filename)
+        return record["state"] if record else None
+
+    def record(self, filename, state, **fields):
+        """
+        状態遷移を1行追記し、ディスクに同期する
+        """
+        record = dict(fields, filename=filename, state=state, at=round(time.time(), 3))
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.entries[filename] = record
+
+    def interrupted(self):
+        """
+        前回の実行で in-flight のまま終わったファイル名
+        """
+        return [name for name, record in self.entries.items() if record["state"] == IN_FLIGHT]
+
+    def is_done(self, filename, output_path, key=None):
+        """
+        filename が done として記録され、出力ファイルの内容ハッシュが記録と一致するか
+        key を指定した場合は生成条件のキーも一致する必要がある
+        """
+        record = self.entries.get(filename)
+        if not record or record["state"] != DONE:
+            return False
+        if key is not None and record.get("key") != key:
+            return False
+        output_path = Path(output_path)
+        return output_path.exists() and file_sha256(output_path) == record.get("sha256")
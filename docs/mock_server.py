@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Gemini API / Unsplash Source のローカル模擬サーバー
+本番サービスに接続せずに generate_images.py / download_images_unsplash.py を
+計測・検証するために使用する
+依存ライブラリ不要
+
+使い方:
+    python mock_server.py --port 8765 --latency 0.5 --payload-kb 1500 --rate-429 0.1
+    GEMINI_API_BASE=http://127.0.0.1:8765 GEMINI_API=dummy python generate_images.py
+    UNSPLASH_BASE_URL=http://127.0.0.1:8765 python download_images_unsplash.py
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GENERATE_PATH = re.compile(r"^/v1beta/models/(?P<model>[^/:]+):generateContent$")
+UNSPLASH_PATH = re.compile(r"^/(?P<width>\d+)x(?P<height>\d+)/?$")
+PHOTO_PATH = re.compile(r"^/photo/(?P<name>[0-9a-f]+)-(?P<width>\d+)x(?P<height>\d+)\.jpg$")
+RESOLUTION = re.compile(r"(\d{2,5})x(\d{2,5})")
+RANGE_HEADER = re.compile(r"^bytes=(\d+)-$")
+
+# 模擬画像の更新日時（内容はパラメーターから決まるため固定）
+PHOTO_LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+def fake_jpeg(width, height, size, seed=b""):
+    """
+    指定サイズのJPEGヘッダー（SOF0）を持つダミー画像バイト列を生成
+    ピクセルデータは擬似乱数で埋める
+    """
+    header = b"\xff\xd8"
+    header += b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    header += b"\xff\xc0" + struct.pack(">HBHHB", 17, 8, height, width, 3)
+    header += b"\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    header += b"\xff\xda" + struct.pack(">HB", 12, 3) + b"\x01\x00\x02\x11\x03\x11\x00\x3f\x00"
+    body_size = max(0, size - len(header) - 2)
+    block = hashlib.sha256(seed).digest() * 64
+    body = (block * (body_size // len(block) + 1))[:body_size].replace(b"\xff", b"\xfe")
+    return header + body + b"\xff\xd9"
+
+
+class MockConfig:
+    """
+    模擬サーバーの挙動設定
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, payload_kb=512, rate_429=0.0, rate_500=0.0,
+                 rate_text=0.0, rate_truncate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.payload_kb = payload_kb
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_text = rate_text
+        self.rate_truncate = rate_truncate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self):
+        """
+        1リクエスト分の結果（"429" / "500" / "text" / "ok"）と遅延秒数を決める
+        """
+        with self.lock:
+            value = self.random.random()
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        if value < self.rate_429:
+            return "429", delay
+        value -= self.rate_429
+        if value < self.rate_500:
+            return "500", delay
+        value -= self.rate_500
+        if value < self.rate_text:
+            return "text", delay
+        return "ok", delay
+
+    def truncate(self):
+        """
+        画像の送信を途中で打ち切るかどうか
+        """
+        with self.lock:
+            return self.random.random() < self.rate_truncate
+
+
+class MockStats:
+    """
+    リクエスト数の集計（スレッドセーフ）
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockGemini/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode("utf-8"), headers=headers)
+
+    def _send_error_outcome(self, outcome):
+        config = self.server.config
+        if outcome == "429":
+            self.server.stats.add("429")
+            self._send_json(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED",
+                                            "message": "Quota exceeded (mock)"}},
+                            headers={"Retry-After": str(config.retry_after)})
+        else:
+            self.server.stats.add("500")
+            self._send_json(500, {"error": {"code": 500, "status": "INTERNAL",
+                                            "message": "Internal error (mock)"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        # 集計のリセット（benchmark.py から使用）
+        if self.path == "/_mock/reset":
+            self.server.stats.reset()
+            self._send_json(200, {})
+            return
+
+        if not GENERATE_PATH.match(urllib.parse.urlsplit(self.path).path):
+            self.server.stats.add("404")
+            self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+
+        try:
+            request_body = json.loads(raw.decode("utf-8"))
+            prompt = request_body["contents"][0]["parts"][0]["text"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            self.server.stats.add("400")
+            self._send_json(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT",
+                                            "message": "Invalid request body (mock)"}})
+            return
+
+        self.server.stats.add("attempt")
+        outcome, delay = self.server.config.roll()
+        time.sleep(delay)
+
+        if outcome in ("429", "500"):
+            self._send_error_outcome(outcome)
+            return
+
+        if outcome == "text":
+            self.server.stats.add("text")
+            self._send_json(200, {
+                "candidates": [{"content": {"parts": [{"text": "I can't generate that image (mock)."}],
+                                            "role": "model"}, "finishReason": "STOP"}],
+                "modelVersion": "mock",
+            })
+            return
+
+        match = RESOLUTION.search(prompt)
+        width, height = (int(match.group(1)), int(match.group(2))) if match else (1024, 1024)
+        # generationConfig.seed が違えば別の画像を返す
+        seed = str((request_body.get("generationConfig") or {}).get("seed", ""))
+        image = fake_jpeg(width, height, self.server.config.payload_kb * 1024,
+                          (prompt + seed).encode("utf-8"))
+        self.server.stats.add("image")
+        self._send_json(200, {
+            "candidates": [{"content": {"parts": [
+                {"text": "Here is the image (mock)."},
+                {"inlineData": {"mimeType": "image/jpeg", "data": base64.b64encode(image).decode("ascii")}},
+            ], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": len(prompt.split()), "totalTokenCount": 1290},
+            "modelVersion": "mock",
+        })
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+
+        # 集計の取得（benchmark.py から使用）
+        if parsed.path == "/_mock/stats":
+            self._send_json(200, self.server.stats.snapshot())
+            return
+
+        # Unsplash Source: /{width}x{height}/?{query} → 画像URLへリダイレクト
+        match = UNSPLASH_PATH.match(parsed.path)
+        if match:
+            self.server.stats.add("attempt")
+            outcome, delay = self.server.config.roll()
+            time.sleep(delay)
+            if outcome in ("429", "500"):
+                self._send_error_outcome(outcome)
+                return
+            name = hashlib.sha1(parsed.query.encode("utf-8")).hexdigest()[:16]
+            self.server.stats.add("redirect")
+            self._send(302, b"", content_type="text/html", headers={
+                "Location": f"/photo/{name}-{match.group('width')}x{match.group('height')}.jpg"
+            })
+            return
+
+        match = PHOTO_PATH.match(parsed.path)
+        if match:
+            width, height = int(match.group("width")), int(match.group("height"))
+            image = fake_jpeg(width, height, self.server.config.payload_kb * 1024,
+                              match.group("name").encode("ascii"))
+            self._send_photo(image)
+            return
+
+        self.server.stats.add("404")
+        self._send(404, b"Not found", content_type="text/plain")
+
+    do_HEAD = do_GET
+
+    def _send_photo(self, image):
+        """
+        画像を返す（ETag / Last-Modified / Repr-Digest 付き、Range: bytes=N- と条件付きリクエストに対応）
+        """
+        etag = '"%s"' % hashlib.sha1(image).hexdigest()[:16]
+        if self.headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in self.headers
+                and self.headers.get("If-Modified-Since") == PHOTO_LAST_MODIFIED):
+            self.server.stats.add("304")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", PHOTO_LAST_MODIFIED)
+            self.end_headers()
+            return
+        headers = {
+            "ETag": etag,
+            "Last-Modified": PHOTO_LAST_MODIFIED,
+            "Accept-Ranges": "bytes",
+            "Repr-Digest": "sha-256=:%s:" % base64.b64encode(hashlib.sha256(image).digest()).decode("ascii"),
+        }
+        status, start = 200, 0
+        match = RANGE_HEADER.match(self.headers.get("Range") or "")
+        if match and self.headers.get("If-Range", etag) == etag:
+            start = int(match.group(1))
+            if start >= len(image):
+                self.server.stats.add("416")
+                self._send(416, b"", content_type="text/plain",
+                           headers={"Content-Range": f"bytes */{len(image)}"})
+                return
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{len(image) - 1}/{len(image)}"
+            self.server.stats.add("partial")
+        else:
+            self.server.stats.add("image")
+        body = image[start:]
+
+        if self.command == "GET" and self.server.config.truncate():
+            # Content-Length は全体のまま、半分だけ送って接続を切る
+            self.server.stats.add("truncated")
+            self.send_response(status)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self._send(status, body, content_type="image/jpeg", headers=headers)
+
+
+class MockServer:
+    """
+    別スレッドで動作する模擬サーバー
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, config=None, verbose=False):
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or MockConfig()
+        self.httpd.stats = MockStats()
+        self.httpd.verbose = verbose
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def config(self):
+        return self.httpd.config
+
+    @property
+    def stats(self):
+        return self.httpd.stats
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Mock Gemini / Unsplash server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 を指定すると空きポートを使用")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答までの基本遅延秒数")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える最大ランダム秒数")
+    parser.add_argument("--payload-kb", type=int, default=512, help="画像サイズ（KB）")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429 を返す確率")
+    parser.add_argument("--rate-500", type=float, default=0.0, help="500 を返す確率")
+    parser.add_argument("--rate-text", type=float, default=0.0, help="テキストのみの応答を返す確率")
+    parser.add_argument("--rate-truncate", type=float, default=0.0, help="画像の送信を途中で切る確率")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 の Retry-After 秒数")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="アクセスログを表示")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    config = MockConfig(latency=args.latency, jitter=args.jitter, payload_kb=args.payload_kb,
+                        rate_429=args.rate_429, rate_500=args.rate_500, rate_text=args.rate_text,
+                        rate_truncate=args.rate_truncate, retry_after=args.retry_after, seed=args.seed)
+    server = MockServer(args.host, args.port, config, verbose=args.verbose)
+
+    print("="*80)
+    print("Mock Gemini / Unsplash Server")
+    print(f"URL: {server.url}")
+    print(f"Gemini:   GEMINI_API_BASE={server.url}")
+    print(f"Unsplash: UNSPLASH_BASE_URL={server.url}")
+    print("="*80)
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"\nRequests: {server.stats.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
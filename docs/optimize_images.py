@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+生成・ダウンロードした画像の最適化
+定義サイズ（例: 1920x1080）に合わせて中央基準でリサイズ・トリミングし、
+WebP / AVIF に再エンコードする。画像ごとにプロセスプールで並列処理する
+結果は (元画像の内容, サイズ, 形式, 品質) をキーに共有ストア（blob_store.py）に記録し、
+0章/ と docs/ で同じ画像を2回エンコードしない。出力ごとのキーは .optimize-manifest.json に残し、
+キー（条件）が同じで内容も記録どおりの出力だけを作り直さない。
+プレースホルダーのままの画像は最適化せず、以前に書き出した出力も消す
+依存ライブラリ: Pillow（AVIF は libavif 対応の Pillow 11.2 以降、または pillow-avif-plugin）
+
+使い方:
+    python optimize_images.py
+    python optimize_images.py --formats webp --quality-webp 75 --workers 4
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from asset_manifest import load_manifest, parse_size, split_only
+from blob_store import BlobStore, ref_key
+from file_utils import atomic_write, atomic_write_json, file_sha256
+from generate_placeholder_images import is_placeholder, load_placeholder_manifest
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 未インストールでも import 自体は失敗させない
+    Image = None
+    ImageOps = None
+else:
+    try:
+        import pillow_avif  # noqa: F401  AVIF プラグイン（Pillow 本体が未対応の場合）
+    except ImportError:
+        pass
+
+# 画像保存先ディレクトリ
+IMAGES_DIR = Path(__file__).parent / "images"
+
+# 出力ごとのエンコード条件（キー）と内容ハッシュの記録（出力先ディレクトリに置く）
+MANIFEST_NAME = ".optimize-manifest.json"
+
+# 共有ストアのキーの版（出力の更新日時だけで判断していた頃の記録は、別の条件の
+# エンコード結果を指していることがあるため使わない）
+OPTIMIZED_KEY_VERSION = 2
+
+# 出力形式ごとの既定品質とエンコード設定
+DEFAULT_FORMATS = ("webp", "avif")
+DEFAULT_QUALITY = {"webp": 80, "avif": 50}
+ENCODER_OPTIONS = {
+    "webp": {"format": "WEBP", "method": 6},
+    "avif": {"format": "AVIF", "speed": 6},
+}
+
+
+def require_pillow():
+    if Image is None:
+        raise RuntimeError("Pillow is required for image optimization: pip install Pillow")
+
+
+def supported_formats(formats):
+    """
+    インストール済みの Pillow でエンコードできる形式だけを返す
+    """
+    require_pillow()
+    Image.init()
+    available = set(Image.SAVE)
+    return [fmt for fmt in formats if ENCODER_OPTIONS[fmt]["format"] in available]
+
+
+def output_path_for(source_path, fmt, output_dir=None):
+    source_path = Path(source_path)
+    return Path(output_dir or source_path.parent) / f"{source_path.stem}.{fmt}"
+
+
+def optimize_image(task):
+    """
+    1枚の画像をリサイズ・トリミングし、指定形式で書き出す
+    プロセスプールから呼ばれるため引数は辞書1つにまとめている
+    """
+    require_pillow()
+    source_path = Path(task["source"])
+    width, height = parse_size(task["size"])
+    results = []
+    targets = [(fmt, output_path_for(source_path, fmt, task.get("output_dir"))) for fmt in task["formats"]]
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        fitted = ImageOps.fit(image, (width, height), method=Image.LANCZOS, centering=(0.5, 0.5))
+
+    for fmt, output_path in targets:
+        options = dict(ENCODER_OPTIONS[fmt])
+        options["quality"] = task["quality"].get(fmt, DEFAULT_QUALITY[fmt])
+        with atomic_write(output_path) as f:
+            fitted.save(f, **options)
+        results.append({"path": str(output_path), "format": fmt, "bytes": output_path.stat().st_size,
+                        "skipped": False})
+
+    return {"source": str(source_path), "outputs": results}
+
+
+def optimized_key(source_sha256, size, fmt, quality):
+    """
+    最適化結果を共有ストアで引くためのキー（エンコーダーの設定と Pillow のバージョンを含む）
+    """
+    return ref_key("optimize", OPTIMIZED_KEY_VERSION, source_sha256, size, fmt, quality, ENCODER_OPTIONS[fmt],
+                   Image.__version__)
+
+
+def load_optimize_manifest(directory):
+    try:
+        with open(Path(directory) / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_current(manifest, output_path, key):
+    """
+    output_path が key の条件でエンコードしたときの内容のまま残っているかどうか
+    """
+    entry = manifest.get(Path(output_path).name)
+    if not entry or entry.get("key") != key or not Path(output_path).exists():
+        return False
+    return file_sha256(output_path) == entry.get("sha256")
+
+
+def optimize_batch(entries, formats=DEFAULT_FORMATS, quality=None, workers=None, output_dir=None,
+                   force=False, store=None):
+    """
+    (元画像パス, "幅x高さ") のリストをプロセスプールで最適化する
+    同じ条件（サイズ・品質・エンコーダー設定）でエンコード済みの出力はそのまま使い、
+    共有ストアに同じ条件の結果があればリンクするだけで、エンコードしない
+    条件が変わった出力は --force なしでも作り直す
+    プレースホルダーのままの元画像はエンコードせず、記録のある出力（以前の元画像や
+    プレースホルダーから作ったもの）を消す。グラデーションを本画像として配信しないため
+    戻り値は (成功結果のリスト, 失敗した元画像と理由のリスト)
+    """
+    formats = supported_formats(formats)
+    if not formats:
+        raise RuntimeError("None of the requested formats can be encoded by this Pillow build")
+    store = store or BlobStore()
+    quality = dict(quality or {})
+
+    tasks, results = [], []
+    manifests = {}
+    placeholders = load_placeholder_manifest()
+    for path, size in entries:
+        if not Path(path).exists():
+            continue
+        if is_placeholder(path, placeholders):
+            for fmt in ENCODER_OPTIONS:
+                output_path = output_path_for(path, fmt, output_dir)
+                manifest = manifests.setdefault(output_path.parent, load_optimize_manifest(output_path.parent))
+                if manifest.pop(output_path.name, None) is not None:
+                    output_path.unlink(missing_ok=True)
+            continue
+        source_sha256 = file_sha256(path)
+        linked, remaining, keys = [], [], {}
+        for fmt in formats:
+            key = optimized_key(source_sha256, size, fmt, quality.get(fmt, DEFAULT_QUALITY[fmt]))
+            output_path = output_path_for(path, fmt, output_dir)
+            manifest = manifests.setdefault(output_path.parent, load_optimize_manifest(output_path.parent))
+            if not force and is_current(manifest, output_path, key):
+                linked.append({"path": str(output_path), "format": fmt, "bytes": output_path.stat().st_size,
+                               "skipped": True})
+                continue
+            ref = None if force else store.get_ref("optimized", key)
+            if ref is None:
+                keys[fmt] = key
+                remaining.append(fmt)
+                continue
+            store.link(ref["sha256"], output_path)
+            manifest[output_path.name] = {"key": key, "sha256": ref["sha256"]}
+            linked.append({"path": str(output_path), "format": fmt, "bytes": output_path.stat().st_size,
+                           "skipped": True})
+        if remaining:
+            tasks.append({"source": str(path), "size": size, "formats": remaining, "quality": quality,
+                          "output_dir": str(output_dir) if output_dir else None, "keys": keys, "linked": linked})
+        else:
+            results.append({"source": str(path), "outputs": linked})
+
+    failures = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [(task, executor.submit(optimize_image, task)) for task in tasks]
+            for task, future in futures:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failures.append((task["source"], str(e)))
+                    continue
+                # 新しく作った出力をストアに取り込み、次からは（別のサイトでも）リンクで済ませる
+                # ref はこのタスクの条件でエンコードしたバイト列にだけ付ける
+                for output in result["outputs"]:
+                    key = task["keys"][output["format"]]
+                    sha256 = store.put_file(output["path"])
+                    store.set_ref("optimized", key, sha256, format=output["format"])
+                    output_path = Path(output["path"])
+                    manifests[output_path.parent][output_path.name] = {"key": key, "sha256": sha256}
+                result["outputs"] = task["linked"] + result["outputs"]
+                results.append(result)
+
+    for directory, manifest in manifests.items():
+        if manifest != load_optimize_manifest(directory):
+            atomic_write_json(Path(directory) / MANIFEST_NAME, manifest, sort_keys=True)
+    return results, failures
+
+
+def print_results(results, failures):
+    """
+    最適化結果を表示
+    """
+    for result in results:
+        source = Path(result["source"])
+        source_kb = source.stat().st_size / 1024
+        parts = []
+        for output in result["outputs"]:
+            mark = "=" if output["skipped"] else "→"
+            parts.append(f"{output['format']} {mark} {output['bytes'] / 1024:.1f} KB")
+        print(f"✓ {source.name} ({source_kb:.1f} KB): " + ", ".join(parts))
+    for source, reason in failures:
+        print(f"✗ Failed to optimize {Path(source).name}: {reason}")
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Resize and re-encode images to WebP/AVIF")
+    parser.add_argument("--only", action="append", default=None, metavar="NAME",
+                        help="対象を id かファイル名で絞り込む（複数回・カンマ区切り可）")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"出力形式（カンマ区切り, default: {','.join(DEFAULT_FORMATS)}）")
+    parser.add_argument("--quality-webp", type=int, default=DEFAULT_QUALITY["webp"])
+    parser.add_argument("--quality-avif", type=int, default=DEFAULT_QUALITY["avif"])
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数 (default: CPU数)")
+    parser.add_argument("--force", action="store_true", help="同じ条件でエンコード済みでも作り直す")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    try:
+        assets = load_manifest().select(split_only(args.only))
+    except KeyError as e:
+        raise SystemExit(f"✗ {e.args[0]}")
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip() in ENCODER_OPTIONS]
+    quality = {"webp": args.quality_webp, "avif": args.quality_avif}
+    entries = [(IMAGES_DIR / asset["filename"], asset["size"]) for asset in assets]
+
+    print("="*80)
+    print("Image Optimizer")
+    print(f"Formats: {', '.join(supported_formats(formats)) or '(none available)'}")
+    print(f"Source images found: {sum(1 for path, _ in entries if path.exists())}/{len(entries)}")
+    print(f"Placeholders skipped: {sum(1 for path, _ in entries if is_placeholder(path))}")
+    print(f"Output directory: {IMAGES_DIR}")
+    print("="*80)
+
+    results, failures = optimize_batch(entries, formats, quality, args.workers, force=args.force)
+    print_results(results, failures)
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Optimized: {len(results)}")
+    print(f"Failed: {len(failures)}")
+    print("="*80)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+APIリクエストのレート制御（トークンバケット）
+依存ライブラリ不要
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    スレッドセーフなトークンバケット
+
+    rate_per_minute 件/分のペースでトークンを補充し、最大 burst 件まで貯められる。
+    acquire() はトークンが得られるまでブロックする。
+    """
+
+    def __init__(self, rate_per_minute, burst=1):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate = rate_per_minute / 60.0  # トークン/秒
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def acquire(self, tokens=1):
+        """
+        トークンを消費する。足りない場合は補充されるまで待機し、待機秒数を返す
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait_time = (tokens - self.tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
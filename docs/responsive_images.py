@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+レスポンシブ画像（srcset）の生成と <picture> への書き換え
+index.html が参照する images/ の画像ごとに、幅 480 / 768 / 1280 / 1920 の AVIF・WebP を
+images/responsive/ に書き出し（元画像より大きい幅は作らない）、images/srcset.json にまとめる。
+幅の指定が変わって使われなくなった画像（前回の srcset.json にあって今回無いもの）は消す。
+--rewrite で <img> を <picture> + srcset に書き換え、幅・高さと読み込みの優先度を付ける
+（先頭の画像は eager + fetchpriority="high"、それ以降は lazy）
+エンコード結果は共有ストア（blob_store.py）に記録し、0章/ と docs/ で同じ作業を繰り返さない
+プレースホルダーのままの画像は幅違いを作らない（<img> もそのまま）
+依存ライブラリ: Pillow（AVIF は libavif 対応の Pillow 11.2 以降、または pillow-avif-plugin）
+
+使い方:
+    python responsive_images.py
+    python responsive_images.py --widths 640,1280 --rewrite
+"""
+
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from blob_store import BlobStore, ref_key
+from file_utils import atomic_write, atomic_write_bytes, atomic_write_json, file_sha256
+from generate_placeholder_images import is_placeholder, load_placeholder_manifest
+from optimize_images import DEFAULT_QUALITY, ENCODER_OPTIONS, require_pillow, supported_formats
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow 未インストールでも import 自体は失敗させない
+    Image = None
+    ImageOps = None
+
+# 画像保存先ディレクトリと、幅違いの画像の書き出し先
+IMAGES_DIR = Path(__file__).parent / "images"
+RESPONSIVE_DIR = IMAGES_DIR / "responsive"
+
+# 書き換える HTML
+HTML_PATH = Path(__file__).parent / "index.html"
+
+# 幅違いの画像の一覧（HTML の書き換えが読む）
+SRCSET_MANIFEST_NAME = "srcset.json"
+
+DEFAULT_WIDTHS = (480, 768, 1280, 1920)
+
+# <source> に並べる順（ブラウザは先に書いた対応形式を使う）
+DEFAULT_FORMATS = ("avif", "webp")
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+# 画面幅に対する表示幅（ヒーローなど全幅の画像を想定）
+DEFAULT_SIZES = "100vw"
+
+# eager で読み込む先頭の画像数（ファーストビュー）
+DEFAULT_EAGER = 1
+
+# images/ 以下を参照する <img>、または以前に書き換えた <picture data-responsive>
+PICTURE_OR_IMG = re.compile(
+    r'<picture data-responsive>.*?(<img\b[^>]*>)\s*</picture>|(<img\b[^>]*\bsrc="images/[^"]+"[^>]*>)', re.S)
+SRC_ATTRIBUTE = re.compile(r'\bsrc="images/([^"]+)"')
+# 書き換えで付ける属性（付け直す前に消す）
+HINT_ATTRIBUTES = re.compile(r'\s+(?:width|height|loading|fetchpriority|decoding)="[^"]*"')
+
+
+def ladder_widths(source_width, widths=DEFAULT_WIDTHS):
+    """
+    元画像より大きい幅は作らない（元画像の方が小さければ元の幅だけ）
+    """
+    ladder = [width for width in sorted(widths) if width <= source_width]
+    return ladder or [source_width]
+
+
+def variant_path(source_name, width, fmt, output_dir=RESPONSIVE_DIR):
+    return Path(output_dir) / f"{Path(source_name).stem}-{width}.{fmt}"
+
+
+def encode_width(task):
+    """
+    1枚の画像を1つの幅に縮小し、指定形式すべてで書き出す（プロセスプールから呼ばれる）
+    """
+    require_pillow()
+    with Image.open(task["source"]) as image:
+        # JPEG は縮小デコードし、全画素を展開しない（回転後の向きが分からないため縦横とも幅以上）
+        image.draft("RGB", (task["width"], task["width"]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        height = round(image.height * task["width"] / image.width)
+        resized = image.resize((task["width"], height), Image.LANCZOS)
+
+    outputs = []
+    for fmt, output_path in task["outputs"]:
+        options = dict(ENCODER_OPTIONS[fmt], quality=task["quality"].get(fmt, DEFAULT_QUALITY[fmt]))
+        with atomic_write(output_path) as f:
+            resized.save(f, **options)
+        outputs.append(output_path)
+    return outputs
+
+
+def build_ladders(filenames, widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS, quality=None, workers=None,
+                  images_dir=IMAGES_DIR, output_dir=RESPONSIVE_DIR, store=None):
+    """
+    filenames（images/ 内の画像）ごとに幅違いの画像を作り、
+    ({ファイル名: {"width", "height", "sources": {形式: [[幅, パス], ...]}}}, エンコードした件数,
+    失敗したファイル名と理由のリスト) を返す。失敗した画像は結果に含めない
+    共有ストアに同じ条件の結果があればリンクするだけで、エンコードしない
+    """
+    formats = supported_formats(formats)
+    store = store or BlobStore()
+    quality = dict(quality or {})
+    ladders, tasks, keys, failures = {}, [], {}, []
+    placeholders = load_placeholder_manifest()
+
+    for filename in filenames:
+        source = Path(images_dir) / filename
+        if not source.exists() or is_placeholder(source, placeholders):
+            continue
+        try:
+            with Image.open(source) as image:
+                width, height = image.size
+                # EXIF の向きが 90° 回転なら縦横を入れ替える（ピクセルはデコードしない）
+                if image.getexif().get(0x0112) in (5, 6, 7, 8):
+                    width, height = height, width
+        except Exception as e:
+            failures.append((filename, str(e)))
+            continue
+        source_sha256 = file_sha256(source)
+        entry = {"width": width, "height": height, "sources": {fmt: [] for fmt in formats}}
+        for ladder_width in ladder_widths(width, widths):
+            pending = []
+            for fmt in formats:
+                output_path = variant_path(filename, ladder_width, fmt, output_dir)
+                entry["sources"][fmt].append([ladder_width, output_path.relative_to(Path(images_dir).parent).as_posix()])
+                key = ref_key("responsive", source_sha256, ladder_width, fmt,
+                              quality.get(fmt, DEFAULT_QUALITY[fmt]), ENCODER_OPTIONS[fmt], Image.__version__)
+                ref = store.get_ref("optimized", key)
+                if ref is not None:
+                    store.link(ref["sha256"], output_path)
+                    continue
+                keys[str(output_path)] = key
+                pending.append((fmt, str(output_path)))
+            if pending:
+                tasks.append({"filename": filename, "source": str(source), "width": ladder_width,
+                              "outputs": pending, "quality": quality})
+        ladders[filename] = entry
+
+    failed = {}
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [(task, executor.submit(encode_width, task)) for task in tasks]
+            for task, future in futures:
+                try:
+                    outputs = future.result()
+                except Exception as e:
+                    failed.setdefault(task["filename"], f"{task['width']}w: {e}")
+                    continue
+                for output_path in outputs:
+                    store.set_ref("optimized", keys[output_path], store.put_file(output_path))
+    for filename, reason in failed.items():
+        del ladders[filename]
+        failures.append((filename, reason))
+    return ladders, len(tasks) - sum(1 for task in tasks if task["filename"] in failed), failures
+
+
+def prune_variants(previous, ladders, images_dir=IMAGES_DIR):
+    """
+    前回の srcset.json（previous）にあって今回の ladders に無い幅違いの画像を消す
+    （このスクリプトが書いたものだけが対象）。消したパスのリストを返す
+    """
+    def paths(manifest):
+        return {path for entry in manifest.values() for variants in entry["sources"].values()
+                for _, path in variants}
+
+    removed = []
+    for path in sorted(paths(previous) - paths(ladders)):
+        target = Path(images_dir).parent / path
+        if target.is_file():
+            target.unlink()
+            removed.append(target)
+    return removed
+
+
+def referenced_images(html):
+    """
+    HTML が <img src="images/..."> で参照している画像のファイル名（出現順）
+    """
+    names = []
+    for match in PICTURE_OR_IMG.finditer(html):
+        name = SRC_ATTRIBUTE.search(match.group(1) or match.group(2)).group(1)
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def picture_markup(img_tag, entry, eager, sizes=DEFAULT_SIZES, indent=""):
+    """
+    <img> を <picture> で包み、<source srcset> と幅・高さ・読み込みの優先度を付ける
+    indent は元の <img> の行のインデント（子要素は1段深くする）
+    """
+    hints = f' width="{entry["width"]}" height="{entry["height"]}"'
+    if eager:
+        hints += ' loading="eager" fetchpriority="high"'
+    else:
+        hints += ' loading="lazy" decoding="async"'
+    img_tag = HINT_ATTRIBUTES.sub("", img_tag)
+    img_tag = img_tag[:-1].rstrip().rstrip("/").rstrip() + hints + ">"
+
+    children = [
+        f'<source type="{MIME_TYPES[fmt]}" srcset="{", ".join(f"{path} {width}w" for width, path in variants)}"'
+        f' sizes="{sizes}">'
+        for fmt, variants in entry["sources"].items()
+    ] + [img_tag]
+    inner = "".join(f"\n{indent}    {child}" for child in children)
+    return f"<picture data-responsive>{inner}\n{indent}</picture>"
+
+
+def rewrite_html(html, ladders, eager=DEFAULT_EAGER, sizes=DEFAULT_SIZES):
+    """
+    srcset.json の内容で <img> を <picture> に書き換える（何度実行しても結果は同じ）
+    先頭から eager 枚はファーストビューとして優先的に読み込み、それ以降は遅延読み込みにする
+    """
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        img_tag = match.group(1) or match.group(2)
+        entry = ladders.get(SRC_ATTRIBUTE.search(img_tag).group(1))
+        if entry is None:
+            return match.group(0)
+        count += 1
+        line_start = html.rfind("\n", 0, match.start()) + 1
+        indent = html[line_start:match.start()]
+        return picture_markup(img_tag, entry, count <= eager, sizes, indent if not indent.strip() else "")
+
+    return PICTURE_OR_IMG.sub(replace, html)
+
+
+def load_srcset_manifest(images_dir=IMAGES_DIR):
+    try:
+        with open(Path(images_dir) / SRCSET_MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Generate srcset width ladders and <picture> markup")
+    parser.add_argument("--widths", default=",".join(map(str, DEFAULT_WIDTHS)),
+                        help=f"書き出す幅（カンマ区切り, default: {','.join(map(str, DEFAULT_WIDTHS))}）")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"出力形式（カンマ区切り, default: {','.join(DEFAULT_FORMATS)}）")
+    parser.add_argument("--quality-webp", type=int, default=DEFAULT_QUALITY["webp"])
+    parser.add_argument("--quality-avif", type=int, default=DEFAULT_QUALITY["avif"])
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数 (default: CPU数)")
+    parser.add_argument("--rewrite", action="store_true", help="index.html の <img> を <picture> に書き換える")
+    parser.add_argument("--eager", type=int, default=DEFAULT_EAGER,
+                        help=f"優先して読み込む先頭の画像数 (default: {DEFAULT_EAGER})")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"sizes 属性 (default: {DEFAULT_SIZES})")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    widths = [int(width) for width in args.widths.split(",") if width.strip()]
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip() in MIME_TYPES]
+    quality = {"webp": args.quality_webp, "avif": args.quality_avif}
+    html = HTML_PATH.read_text(encoding="utf-8")
+    filenames = referenced_images(html)
+
+    print("="*80)
+    print("Responsive Images")
+    print(f"Referenced images: {len(filenames)}")
+    print(f"Widths: {', '.join(map(str, widths))}")
+    print(f"Formats: {', '.join(supported_formats(formats)) or '(none available)'}")
+    print("="*80)
+
+    previous = load_srcset_manifest()
+    ladders, encoded, failures = build_ladders(filenames, widths, formats, quality, args.workers)
+    # 失敗した画像は前回の結果を残す（次回やり直す）
+    for filename, _ in failures:
+        if filename in previous:
+            ladders[filename] = previous[filename]
+    ladders = {filename: ladders[filename] for filename in filenames if filename in ladders}
+    for filename, entry in ladders.items():
+        parts = []
+        for fmt, variants in entry["sources"].items():
+            total = sum((IMAGES_DIR.parent / path).stat().st_size for _, path in variants)
+            parts.append(f"{fmt} {len(variants)} widths, {total / 1024:.1f} KB")
+        print(f"✓ {filename} ({entry['width']}x{entry['height']}): " + ", ".join(parts))
+    for filename, reason in failures:
+        print(f"✗ Failed: {filename}: {reason}")
+    removed = prune_variants(previous, ladders)
+    for path in removed:
+        print(f"- Removed unused {path.relative_to(IMAGES_DIR.parent).as_posix()}")
+    if ladders != previous:
+        atomic_write_json(IMAGES_DIR / SRCSET_MANIFEST_NAME, ladders)
+
+    rewritten = False
+    if args.rewrite:
+        updated = rewrite_html(html, ladders, args.eager, args.sizes)
+        rewritten = updated != html
+        if rewritten:
+            atomic_write_bytes(HTML_PATH, updated.encode("utf-8"))
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Images: {len(ladders)}")
+    print(f"Encoded widths: {encoded}")
+    print(f"Removed: {len(removed)}")
+    print(f"Failed: {len(failures)}")
+    print(f"Manifest: {IMAGES_DIR / SRCSET_MANIFEST_NAME}")
+    if args.rewrite:
+        print(f"HTML: {HTML_PATH} ({'updated' if rewritten else 'unchanged'})")
+    print("="*80)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+SVG の最小化と事前圧縮
+インデント・空白の除去、style 属性の展開と既定値の削除、数値の丸め、色の短縮、
+同一グラデーション定義のまとめ、共通属性の <g> へのくくり出しを行い、
+静的ホスティング向けに .svg.gz / .svg.br を書き出す
+依存ライブラリ不要（.svg.br は brotli がインストールされている場合のみ）
+
+使い方:
+    python svg_optimize.py images/*.svg
+"""
+
+import argparse
+import gzip
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from file_utils import atomic_write_bytes
+
+try:
+    import brotli
+except ImportError:  # brotli 未インストールなら .svg.br は作らない
+    brotli = None
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+# 小数点以下の桁数
+PRECISION = 2
+
+# 数値として丸める属性
+NUMERIC_ATTRIBUTES = {
+    "x", "y", "x1", "y1", "x2", "y2", "cx", "cy", "r", "rx", "ry", "width", "height",
+    "font-size", "opacity", "fill-opacity", "stop-opacity", "stroke-width", "offset",
+}
+
+# 省略できる既定値（要素名, 属性名） → 値
+DEFAULT_VALUES = {
+    ("linearGradient", "x1"): {"0", "0%"},
+    ("linearGradient", "y1"): {"0", "0%"},
+    ("linearGradient", "x2"): {"1", "100%"},
+    ("linearGradient", "y2"): {"0", "0%"},
+    ("stop", "stop-opacity"): {"1"},
+    (None, "opacity"): {"1"},
+    (None, "fill-opacity"): {"1"},
+}
+
+# 子要素に継承されるため <g> にくくり出せる属性
+INHERITED_ATTRIBUTES = ("font-family", "font-size", "font-weight", "fill", "text-anchor")
+
+NUMBER = re.compile(r"^(-?\d+(?:\.\d+)?)(%?)$")
+LONG_HEX = re.compile(r"^#([0-9a-fA-F])\1([0-9a-fA-F])\2([0-9a-fA-F])\3$")
+URL_REF = re.compile(r"url\(#([^)]+)\)")
+COLOR_NAMES = {"white": "#fff", "black": "#000"}
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def format_number(value, precision=PRECISION):
+    """
+    960.0 → "960", 0.80 → ".8", -0.5 → "-.5"
+    """
+    text = f"{round(float(value), precision):.{precision}f}".rstrip("0").rstrip(".")
+    if text in ("-0", ""):
+        return "0"
+    if text.startswith("0."):
+        return text[1:]
+    if text.startswith("-0."):
+        return "-" + text[2:]
+    return text
+
+
+def _shorten_number(name, value):
+    match = NUMBER.match(value.strip())
+    if not match:
+        return value
+    number, percent = match.groups()
+    # グラデーションの offset は 0〜1 の比率で書ける
+    if percent and name == "offset":
+        return format_number(float(number) / 100, PRECISION + 2)
+    return format_number(number) + percent
+
+
+def shorten_color(value):
+    value = value.strip()
+    lowered = value.lower()
+    if lowered in COLOR_NAMES:
+        return COLOR_NAMES[lowered]
+    match = LONG_HEX.match(value)
+    if match:
+        return "#" + "".join(match.groups()).lower()
+    return lowered if lowered.startswith("#") else value
+
+
+def _expand_style(element):
+    """
+    style="stop-color:#fff;stop-opacity:1" → stop-color="#fff"（既定値は削除）
+    """
+    style = element.attrib.pop("style", None)
+    if not style:
+        return
+    for declaration in style.split(";"):
+        if ":" not in declaration:
+            continue
+        name, value = (part.strip() for part in declaration.split(":", 1))
+        if name and name not in element.attrib:
+            element.set(name, value)
+
+
+def _is_default(tag, name, value):
+    for key in ((tag, name), (None, name)):
+        if key in DEFAULT_VALUES and value in DEFAULT_VALUES[key]:
+            return True
+    return False
+
+
+def _clean_element(element):
+    tag = _local(element.tag)
+    _expand_style(element)
+    for name, value in list(element.attrib.items()):
+        if name in NUMERIC_ATTRIBUTES:
+            value = _shorten_number(name, value)
+        if name in ("fill", "stroke", "stop-color", "color"):
+            value = shorten_color(value)
+        if _is_default(tag, name, value):
+            del element.attrib[name]
+        else:
+            element.set(name, value)
+
+    # インデントのみの text / tail を削除（<text> の中身は前後の空白だけ除く）
+    if element.text is not None:
+        element.text = element.text.strip() or None
+    if element.tail is not None and not element.tail.strip():
+        element.tail = None
+    for child in element:
+        _clean_element(child)
+
+
+def _gradient_signature(gradient):
+    attributes = tuple(sorted((k, v) for k, v in gradient.attrib.items() if k != "id"))
+    stops = tuple(tuple(sorted(stop.attrib.items())) for stop in gradient)
+    return _local(gradient.tag), attributes, stops
+
+
+def dedupe_gradients(root, id_prefix="g"):
+    """
+    同じ内容の linearGradient / radialGradient を1つにまとめ、短い id に付け替える
+    戻り値は 旧id → 新id の対応
+    """
+    renamed, seen = {}, {}
+    for defs in root.iter(f"{{{SVG_NS}}}defs"):
+        for gradient in list(defs):
+            if _local(gradient.tag) not in ("linearGradient", "radialGradient"):
+                continue
+            signature = _gradient_signature(gradient)
+            old_id = gradient.get("id")
+            if signature in seen:
+                renamed[old_id] = seen[signature]
+                defs.remove(gradient)
+                continue
+            new_id = f"{id_prefix}{len(seen)}" if seen else id_prefix
+            seen[signature] = new_id
+            renamed[old_id] = new_id
+            gradient.set("id", new_id)
+
+    for element in root.iter():
+        for name, value in element.attrib.items():
+            if "url(#" in value:
+                element.set(name, URL_REF.sub(lambda m: f"url(#{renamed.get(m.group(1), m.group(1))})", value))
+    return renamed
+
+
+def hoist_common_attributes(parent):
+    """
+    連続する同じ要素（<text> など）に共通する継承属性を <g> にくくり出す
+    """
+    children = list(parent)
+    index = 0
+    while index < len(children):
+        run = [children[index]]
+        while index + len(run) < len(children) and children[index + len(run)].tag == run[0].tag:
+            run.append(children[index + len(run)])
+        if len(run) >= 2 and _local(run[0].tag) in ("text", "rect", "circle", "path"):
+            common = {name: run[0].get(name) for name in INHERITED_ATTRIBUTES
+                      if run[0].get(name) is not None and all(el.get(name) == run[0].get(name) for el in run)}
+            if common:
+                group = ET.Element(f"{{{SVG_NS}}}g", common)
+                position = list(parent).index(run[0])
+                for element in run:
+                    for name in common:
+                        del element.attrib[name]
+                    parent.remove(element)
+                    group.append(element)
+                parent.insert(position, group)
+        index += len(run)
+    for child in parent:
+        if _local(child.tag) != "text":
+            hoist_common_attributes(child)
+
+
+def optimize_svg(svg_text, id_prefix="g"):
+    """
+    SVG 文字列を最小化して返す（XML 宣言は省く）
+    """
+    if isinstance(svg_text, bytes):
+        svg_text = svg_text.decode("utf-8")
+    root = ET.fromstring(svg_text)
+    _clean_element(root)
+    dedupe_gradients(root, id_prefix)
+    hoist_common_attributes(root)
+    for defs in list(root.iter(f"{{{SVG_NS}}}defs")):
+        if len(defs) == 0:
+            root.remove(defs)
+    return ET.tostring(root, encoding="unicode", short_empty_elements=True).replace(" />", "/>")
+
+
+def build_sprite(documents):
+    """
+    [(symbol の id, SVG 文字列), ...] から <symbol> を並べたスプライトを作る
+    グラデーションは先頭の <defs> に集め、同じ内容のものは1つにまとめる
+    戻り値は (スプライトの文字列, {id: {"viewBox", "width", "height"}})
+    """
+    sprite = ET.Element(f"{{{SVG_NS}}}svg")
+    defs = ET.SubElement(sprite, f"{{{SVG_NS}}}defs")
+    symbols = {}
+
+    for index, (symbol_id, svg_text) in enumerate(documents):
+        root = ET.fromstring(optimize_svg(svg_text, id_prefix=f"s{index}-"))
+        width, height = root.get("width"), root.get("height")
+        view_box = root.get("viewBox") or f"0 0 {width} {height}"
+        symbol = ET.SubElement(sprite, f"{{{SVG_NS}}}symbol", {"id": symbol_id, "viewBox": view_box})
+        for child in root:
+            if _local(child.tag) == "defs":
+                defs.extend(list(child))
+            else:
+                symbol.append(child)
+        symbols[symbol_id] = {"viewBox": view_box, "width": width, "height": height}
+
+    # 文書ごとに付けた仮の id を、まとめた後の短い id に付け替える
+    dedupe_gradients(sprite)
+    if len(defs) == 0:
+        sprite.remove(defs)
+    text = ET.tostring(sprite, encoding="unicode", short_empty_elements=True).replace(" />", "/>")
+    return text, symbols
+
+
+def precompressed_paths(path, include_unavailable=False):
+    """
+    path の事前圧縮ファイル（.gz / .br）のパス。brotli が無ければ .gz のみ
+    include_unavailable なら brotli の有無にかかわらず .br も含める（消すとき用）
+    """
+    path = Path(path)
+    paths = [path.with_name(path.name + ".gz")]
+    if brotli is not None or include_unavailable:
+        paths.append(path.with_name(path.name + ".br"))
+    return paths
+
+
+def is_precompressed(path, content):
+    """
+    path の .gz / .br が揃っていて、どれも content（bytes）を圧縮したものかどうか
+    """
+    for compressed in precompressed_paths(path):
+        try:
+            data = compressed.read_bytes()
+        except FileNotFoundError:
+            return False
+        try:
+            decoded = gzip.decompress(data) if compressed.suffix == ".gz" else brotli.decompress(data)
+        except Exception:  # 途中で切れた・壊れた圧縮ファイル
+            return False
+        if decoded != content:
+            return False
+    return True
+
+
+def write_precompressed(path, content):
+    """
+    content（bytes）を圧縮して .gz / .br を書き出す
+    gzip は更新日時を 0 に固定し、同じ内容なら同じバイト列になるようにする
+    brotli が無ければ既存の .br を消す（古い内容の .br がコンテンツネゴシエーションで返らないように）
+    """
+    path = Path(path)
+    written = []
+    gz_path = path.with_name(path.name + ".gz")
+    atomic_write_bytes(gz_path, gzip.compress(content, compresslevel=9, mtime=0))
+    written.append(gz_path)
+    br_path = path.with_name(path.name + ".br")
+    if brotli is not None:
+        atomic_write_bytes(br_path, brotli.compress(content, quality=11, mode=brotli.MODE_TEXT))
+        written.append(br_path)
+    else:
+        br_path.unlink(missing_ok=True)
+    return written
+
+
+def parse_args():
+    """
+    コマンドライン引数を解析
+    """
+    parser = argparse.ArgumentParser(description="Minify SVG files and write .svg.gz / .svg.br")
+    parser.add_argument("paths", nargs="+", help="SVG ファイル")
+    parser.add_argument("--no-compress", action="store_true", help=".gz / .br を書き出さない")
+    return parser.parse_args()
+
+
+def main():
+    """
+    メイン処理
+    """
+    args = parse_args()
+    before_total = after_total = 0
+    for name in args.paths:
+        path = Path(name)
+        original = path.read_bytes()
+        optimized = optimize_svg(original).encode("utf-8")
+        if optimized != original:
+            atomic_write_bytes(path, optimized)
+        if not args.no_compress:
+            write_precompressed(path, optimized)
+        before_total += len(original)
+        after_total += len(optimized)
+        print(f"✓ {path.name}: {len(original)} → {len(optimized)} bytes")
+
+    print("\n" + "="*80)
+    print("SUMMARY")
+    print("="*80)
+    print(f"Files: {len(args.paths)}")
+    print(f"Total: {before_total} → {after_total} bytes")
+    if brotli is None and not args.no_compress:
+        print("(brotli not installed: .svg.br skipped, existing ones removed)")
+    print("="*80)
+
+
+if __name__ == "__main__":
+    main()